@@ -0,0 +1,86 @@
+"""Measure price-alert evaluation cost per tick as the number of alerts grows.
+
+Fills the AlertEngine with one-shot threshold alerts spread around the
+price plus VWAP-cross alerts, then replays a random-walk trade stream and
+reports the mean cost per tick and how many alerts fired. A linear scan
+over the same alerts is timed for comparison.
+
+Usage:
+    python benchmarks/bench_alert_ticks.py [--alerts 10000 100000 500000] [--ticks 200000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from services.alert_engine import ABOVE, BELOW, CROSS_VWAP, AlertEngine  # noqa: E402
+
+SYMBOL = "BTCUSD"
+PRICE = 30_000.0
+
+
+def make_alerts(count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    alerts = []
+    for i in range(count):
+        if i % 100 == 0:
+            alerts.append((i // 3, CROSS_VWAP, None))
+            continue
+        kind = ABOVE if i % 2 else BELOW
+        offset = rng.uniform(0.005, 0.3) * PRICE
+        alerts.append((i // 3, kind, round(PRICE + offset if kind == ABOVE else PRICE - offset, 2)))
+    return alerts
+
+
+def make_ticks(count: int, seed: int = 2) -> list:
+    rng = random.Random(seed)
+    price, ticks = PRICE, []
+    for i in range(count):
+        price *= 1 + rng.gauss(0, 0.0002)
+        ticks.append({"s": SYMBOL, "p": f"{price:.2f}", "t": 1_700_000_000_000 + i})
+    return ticks
+
+
+def bench_engine(alerts: list, ticks: list) -> tuple:
+    fired = []
+    engine = AlertEngine(None, notify=lambda chat_id, key, text: fired.append(chat_id),
+                         vwap_provider=lambda symbol: PRICE)
+    for chat_id, kind, price in alerts:
+        engine.add(chat_id, SYMBOL, kind, price)
+    start = time.perf_counter()
+    for tick in ticks:
+        engine.on_trade(tick)
+    return (time.perf_counter() - start) / len(ticks), len(fired)
+
+
+def bench_scan(alerts: list, ticks: list) -> float:
+    pending = [(kind, price) for _, kind, price in alerts if kind != CROSS_VWAP]
+    start = time.perf_counter()
+    for tick in ticks:
+        price = float(tick["p"])
+        pending = [(kind, threshold) for kind, threshold in pending
+                   if not (price >= threshold if kind == ABOVE else price <= threshold)]
+    return (time.perf_counter() - start) / len(ticks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--alerts", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--ticks", type=int, default=200_000)
+    parser.add_argument("--scan-ticks", type=int, default=200, help="Ticks for the linear-scan baseline")
+    args = parser.parse_args()
+
+    ticks = make_ticks(args.ticks)
+    print(f"{'alerts':>8} {'indexed/tick':>13} {'fired':>8} {'scan/tick':>11}")
+    for count in args.alerts:
+        alerts = make_alerts(count)
+        per_tick, fired = bench_engine(alerts, ticks)
+        scan = bench_scan(alerts, ticks[:args.scan_ticks])
+        print(f"{count:>8} {per_tick * 1e6:>11.2f}us {fired:>8} {scan * 1e6:>9.0f}us")
+
+
+if __name__ == "__main__":
+    main()
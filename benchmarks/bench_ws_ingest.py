@@ -0,0 +1,100 @@
+"""Measure WebSocket message ingestion throughput (messages/second).
+
+Compares the previous ingestion path (stdlib json, an f-string INFO log of
+every raw message and stored BBO dict on the unconfigured
+services.websocket_service logger, which discarded them) with the current
+WebSocketClient._on_message hot path, logging through utils.logger.
+
+Usage:
+    python benchmarks/bench_ws_ingest.py [--messages 200000] [--symbols 50]
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from services.websocket_service import WebSocketClient  # noqa: E402
+from utils import json_codec  # noqa: E402
+import utils.logger  # noqa: E402,F401  (routes services.* loggers through the log queue)
+
+
+def make_messages(count: int, symbols: int) -> list:
+    messages = []
+    for i in range(count):
+        messages.append(json.dumps({
+            "symbol": f"SYM{i % symbols}USDT",
+            "topic": "bbo",
+            "data": {
+                "s": f"SYM{i % symbols}USDT", "t": 1700000000000 + i,
+                "b": f"{30000 + i % 100}.5", "bz": "0.25",
+                "a": f"{30001 + i % 100}.5", "az": "1.5",
+            },
+            "sendTime": 1700000000000 + i,
+        }))
+    return messages
+
+
+class LegacyIngest:
+    """The ingestion path as it was before the hot-path rework."""
+
+    def __init__(self, logger):
+        self._logger = logger
+        self._bbo_data = {}
+
+    def _on_message(self, message):
+        self._logger.info(f"Received message: {message}")
+        data = json.loads(message)
+        if "pong" in data:
+            self._logger.info("Received pong message")
+        elif data.get("topic") == "bbo" and "data" in data:
+            bbo_data = data["data"]
+            symbol = bbo_data.get("s")
+            if symbol:
+                self._bbo_data[symbol] = {
+                    "bid_price": bbo_data.get("b"),
+                    "bid_quantity": bbo_data.get("bz"),
+                    "ask_price": bbo_data.get("a"),
+                    "ask_quantity": bbo_data.get("az"),
+                    "timestamp": bbo_data.get("t"),
+                }
+                self._logger.info(
+                    f"Stored BBO Data for {symbol}: {self._bbo_data[symbol]}")
+
+
+def legacy_logger() -> logging.Logger:
+    """The baseline module logger: no handlers or level of its own, so INFO
+    records were dropped by the root WARNING level after the f-strings were built."""
+    return logging.getLogger("bench_legacy")
+
+
+def run(on_message, messages) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        on_message(message)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--symbols", type=int, default=50)
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages, args.symbols)
+    before = run(LegacyIngest(legacy_logger())._on_message, messages)
+
+    client = WebSocketClient(subscriptions=())
+    after = run(client._on_message, messages)
+
+    print(f"JSON backend : {json_codec.BACKEND}")
+    print(f"before       : {before:>12,.0f} msg/s")
+    print(f"after        : {after:>12,.0f} msg/s")
+    print(f"speedup      : {after / before:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
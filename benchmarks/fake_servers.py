@@ -0,0 +1,171 @@
+"""Local stand-ins for the Hashkey REST/WebSocket API and the Telegram Bot API.
+
+Used by run_benchmarks.py so performance can be measured offline. The fake
+Hashkey server serves /quote/v1/klines, /quote/v1/ticker/24hr and the
+/quote/ws/v2 stream; the fake Telegram server answers getMe and sendMessage
+(and acknowledges every other method, e.g. setWebhook).
+Latency, tick rate and payload sizes are configurable.
+"""
+import asyncio
+import json
+import math
+import time
+from aiohttp import WSMsgType, web
+
+INTERVAL_MS = {"1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+               "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+               "8h": 28_800_000, "12h": 43_200_000, "1d": 86_400_000, "1w": 604_800_000}
+
+
+def price_at(open_time: float) -> float:
+    """Deterministic synthetic price path."""
+    return 30_000 + 500 * math.sin(open_time / 3.6e6) + 50 * math.sin(open_time / 1.7e5)
+
+
+def kline_row(open_time: int, interval_ms: int) -> list:
+    open_price = price_at(open_time)
+    close_price = price_at(open_time + interval_ms)
+    high = max(open_price, close_price) + 5
+    low = min(open_price, close_price) - 5
+    volume = 1 + (open_time // interval_ms) % 7
+    return [open_time, f"{open_price:.2f}", f"{high:.2f}", f"{low:.2f}", f"{close_price:.2f}",
+            f"{volume:.4f}", open_time + interval_ms - 1, f"{volume * close_price:.2f}", 10, "0", "0"]
+
+
+class FakeHashkey:
+    """Fake Hashkey exchange (REST + quote stream)."""
+
+    MAX_LIMIT = 1000
+
+    def __init__(self, latency_ms: float = 0.0, tick_rate: float = 1000.0):
+        self.latency = latency_ms / 1000
+        self.tick_rate = tick_rate  # messages/second per subscription
+        self.requests = 0
+        self.messages_sent = 0
+
+    async def _delay(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def klines(self, request: web.Request) -> web.Response:
+        await self._delay()
+        interval_ms = INTERVAL_MS[request.query.get("interval", "1m")]
+        limit = min(int(request.query.get("limit", 500)), self.MAX_LIMIT)
+        now_bar = int(time.time() * 1000) // interval_ms * interval_ms
+        start = request.query.get("startTime")
+        end = request.query.get("endTime")
+        last = min(now_bar, int(end) // interval_ms * interval_ms) if end else now_bar
+        if start:
+            first = -(-int(start) // interval_ms) * interval_ms
+            last = min(last, first + (limit - 1) * interval_ms)
+        else:
+            first = last - (limit - 1) * interval_ms
+        rows = [kline_row(t, interval_ms) for t in range(first, last + 1, interval_ms)]
+        return web.json_response(rows)
+
+    async def ticker(self, request: web.Request) -> web.Response:
+        await self._delay()
+        now = int(time.time() * 1000)
+        price = price_at(now)
+        return web.json_response([{
+            "t": now, "s": request.query.get("symbol", ""), "c": f"{price:.2f}",
+            "h": f"{price + 600:.2f}", "l": f"{price - 600:.2f}", "o": f"{price - 100:.2f}",
+            "b": f"{price - 0.5:.2f}", "a": f"{price + 0.5:.2f}", "v": "1234.5", "qv": "37000000",
+        }])
+
+    def _frame(self, topic: str, symbol: str, sequence: int) -> str:
+        now = int(time.time() * 1000)
+        price = price_at(now) + sequence % 10
+        if topic == "trade":
+            data = [{"v": str(sequence), "t": now, "p": f"{price:.2f}", "q": "0.01", "m": sequence % 2 == 0}]
+        else:
+            data = {"s": symbol, "t": now, "b": f"{price - 0.5:.2f}", "bz": "0.25",
+                    "a": f"{price + 0.5:.2f}", "az": "1.5"}
+        return json.dumps({"symbol": symbol, "topic": topic, "data": data, "sendTime": now})
+
+    async def _stream(self, ws, topic: str, symbol: str):
+        interval = 1 / self.tick_rate
+        batch = max(1, int(self.tick_rate / 1000))  # keep the sleep granularity sane
+        sequence = 0
+        while not ws.closed:
+            for _ in range(batch):
+                await ws.send_str(self._frame(topic, symbol, sequence))
+                sequence += 1
+                self.messages_sent += 1
+            await asyncio.sleep(interval * batch)
+
+    async def stream(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        streams = {}
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                if "ping" in data:
+                    await ws.send_str(json.dumps({"pong": data["ping"]}))
+                    continue
+                key = (data.get("topic"), data.get("params", {}).get("symbol"))
+                if data.get("event") == "sub" and key not in streams:
+                    streams[key] = asyncio.create_task(self._stream(ws, *key))
+                elif data.get("event") == "cancel" and key in streams:
+                    streams.pop(key).cancel()
+        finally:
+            for task in streams.values():
+                task.cancel()
+        return ws
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/quote/v1/klines", self.klines)
+        app.router.add_get("/quote/v1/ticker/24hr", self.ticker)
+        app.router.add_get("/quote/ws/v2", self.stream)
+        return app
+
+
+class FakeTelegram:
+    """Fake Telegram Bot API: POST /bot<token>/<method>."""
+
+    def __init__(self, latency_ms: float = 0.0, on_message=None):
+        self.latency = latency_ms / 1000
+        self.sent = 0
+        self.on_message = on_message  # called with (chat_id, text) for every sendMessage
+        self._message_id = 0
+
+    async def method(self, request: web.Request) -> web.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        name = request.match_info["method"]
+        if name == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot",
+                      "can_join_groups": False, "can_read_all_group_messages": False,
+                      "supports_inline_queries": False}
+        elif name == "sendMessage":
+            payload = await request.post() if request.content_type != "application/json" else await request.json()
+            self.sent += 1
+            self._message_id += 1
+            if self.on_message is not None:
+                self.on_message(int(payload.get("chat_id", 0)), payload.get("text", ""))
+            result = {"message_id": self._message_id, "date": int(time.time()),
+                      "chat": {"id": int(payload.get("chat_id", 0)), "type": "private"},
+                      "text": payload.get("text", "")}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.method)
+        return app
+
+
+async def start(app: web.Application, host: str = "127.0.0.1") -> tuple:
+    """Start an app on a free port; returns (runner, base URL)."""
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
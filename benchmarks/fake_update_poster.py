@@ -0,0 +1,131 @@
+"""Post fake Telegram updates to the bot's webhook and measure command-to-reply latency.
+
+Sends `--count` message updates (one chat per update, `--concurrency` in
+flight) to a bot running in webhook mode and reports how long the webhook
+took to accept them. With --fake-telegram-port the script also serves a
+fake Bot API on that port and times each reply; point the bot at it with
+"telegram_base_url": "http://127.0.0.1:<port>/bot" in the DEFAULT section
+of config/config.json. Posting starts once the bot's /readyz reports ready,
+so the poster can be started first and the bot second.
+
+Usage:
+    python benchmarks/fake_update_poster.py --secret <WEBHOOK.secret_token> \\
+        [--url http://127.0.0.1:8080/telegram] [--text "/vwap band BTCUSD"] \\
+        [--count 200] [--concurrency 20] [--fake-telegram-port 8081]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from urllib.parse import urljoin
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import FakeTelegram  # noqa: E402
+from run_benchmarks import percentiles  # noqa: E402
+
+FIRST_CHAT_ID = 900_000_000
+
+
+def make_update(update_id: int, chat_id: int, text: str) -> dict:
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "poster"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": update_id, "message": message}
+
+
+async def post_updates(args, replies: dict) -> dict:
+    accepted, statuses, reply_latency = [], {}, []
+    semaphore = asyncio.Semaphore(args.concurrency)
+    headers = {"Content-Type": "application/json"}
+    if args.secret:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = args.secret
+
+    async def post(session: aiohttp.ClientSession, index: int):
+        chat_id = FIRST_CHAT_ID + index
+        body = json.dumps(make_update(index + 1, chat_id, args.text))
+        async with semaphore:
+            replied = replies[chat_id] = asyncio.get_running_loop().create_future()
+            started = time.perf_counter()
+            async with session.post(args.url, data=body, headers=headers) as response:
+                await response.read()
+                accepted.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            if args.fake_telegram_port and response.status == 200:
+                try:
+                    await asyncio.wait_for(replied, args.reply_timeout)
+                    reply_latency.append(replied.result() - started)
+                except asyncio.TimeoutError:
+                    pass
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(post(session, index) for index in range(args.count)))
+    elapsed = time.perf_counter() - started
+    results = {"updates": args.count, "seconds": round(elapsed, 3),
+               "updates_per_second": round(args.count / elapsed, 1),
+               "status": statuses, "accept": percentiles(accepted)}
+    if args.fake_telegram_port:
+        results["reply"] = percentiles(reply_latency)
+        results["missing_replies"] = args.count - len(reply_latency)
+    return results
+
+
+async def wait_ready(url: str, timeout: float):
+    """Poll the bot's readiness probe until it answers 200."""
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+            await asyncio.sleep(0.25)
+
+
+async def main(args) -> dict:
+    replies = {}
+    runner = None
+
+    def on_message(chat_id: int, text: str):
+        replied = replies.get(chat_id)
+        if replied is not None and not replied.done():
+            replied.set_result(time.perf_counter())  # first reply counts
+
+    if args.fake_telegram_port:
+        runner = web.AppRunner(FakeTelegram(on_message=on_message).app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", args.fake_telegram_port).start()
+    try:
+        await wait_ready(urljoin(args.url, "/readyz"), args.ready_timeout)
+        return await post_updates(args, replies)
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080/telegram")
+    parser.add_argument("--secret", help="WEBHOOK.secret_token of the bot")
+    parser.add_argument("--text", default="/start", help="message text of every update")
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--fake-telegram-port", type=int, help="serve a fake Bot API here and time replies")
+    parser.add_argument("--reply-timeout", type=float, default=10.0)
+    parser.add_argument("--ready-timeout", type=float, default=60.0, help="seconds to wait for /readyz")
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
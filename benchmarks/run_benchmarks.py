@@ -0,0 +1,182 @@
+"""Offline benchmark suite: /vwap latency, WebSocket ingestion and fan-out.
+
+Starts the local stand-ins from fake_servers.py, points HashkeyAPI, the
+WebSocket client and a python-telegram-bot Bot at them, and reports:
+
+- /vwap latency (p50/p99) through handle_vwap, for a cold symbol (full
+  history backfill), a stale report (incremental refresh) and a cached report
+- WebSocket messages/second through WebSocketClient
+- fan-out throughput to N subscribers through Broadcaster
+
+Results are printed and written as JSON so runs can be compared over time.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--output results.json] [--rest-latency-ms 20]
+        [--subscribers 1000] [--ws-symbols 10] [--tick-rate 2000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from fake_servers import FakeHashkey, FakeTelegram, start  # noqa: E402
+from telegram import Bot  # noqa: E402
+from telegram.request import HTTPXRequest  # noqa: E402
+from handlers.vwap_handler import handle_vwap  # noqa: E402
+from services.broadcaster import Broadcaster  # noqa: E402
+from services.hashkey_api import HashkeyAPI  # noqa: E402
+from services.report_service import report_service  # noqa: E402
+from services.websocket_service import WebSocketClient  # noqa: E402
+
+TOKEN = "123456:bench"
+
+
+def percentiles(samples: list) -> dict:
+    ordered = sorted(samples)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000 if ordered else None
+
+    return {"n": len(ordered), "p50_ms": pick(0.50), "p99_ms": pick(0.99),
+            "max_ms": ordered[-1] * 1000 if ordered else None}
+
+
+class BenchMessage:
+    """The parts of telegram.Message that handle_vwap uses, replying through a real Bot."""
+
+    def __init__(self, bot: Bot, chat_id: int):
+        self.bot = bot
+        self.chat_id = chat_id
+
+    async def reply_text(self, text: str, **kwargs):
+        return await self.bot.send_message(chat_id=self.chat_id, text=text, **kwargs)
+
+
+class BenchContext:
+    def __init__(self, symbol: str):
+        self.args = [symbol]
+
+
+async def bench_vwap(bot: Bot, iterations: int) -> dict:
+    async def timed(symbol: str) -> float:
+        started = time.perf_counter()
+        await handle_vwap(BenchMessage(bot, 1), BenchContext(symbol))
+        return time.perf_counter() - started
+
+    # Cold: a new symbol each time, so the whole 30-day history is backfilled
+    cold = [await timed(f"COLD{i}USD") for i in range(max(1, iterations // 10))]
+    # Stale: the cached report is too old, so history is refreshed incrementally
+    report_service.max_age = 0
+    HashkeyAPI._coalescer.ttl = 0
+    stale = [await timed("COLD0USD") for _ in range(iterations)]
+    # Cached: answered from the report cache
+    report_service.max_age = 3600
+    cached = [await timed("COLD0USD") for _ in range(iterations)]
+    return {"cold": percentiles(cold), "stale": percentiles(stale), "cached": percentiles(cached)}
+
+
+async def bench_ws(ws_url: str, symbols: int, seconds: float) -> dict:
+    client = WebSocketClient(subscriptions=[("bbo", f"SYM{i}USDT") for i in range(symbols)],
+                             stream_url=ws_url)
+    received = 0
+
+    def count(_):
+        nonlocal received
+        received += 1
+
+    client.add_handler("bbo", count)
+    task = asyncio.create_task(client.connect())
+    while received == 0:
+        await asyncio.sleep(0.05)
+    start_count, started = received, time.perf_counter()
+    await asyncio.sleep(seconds)
+    rate = (received - start_count) / (time.perf_counter() - started)
+    await client.disconnect()
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return {"symbols": symbols, "seconds": seconds, "messages_per_second": rate}
+
+
+async def bench_fanout(bot: Bot, subscribers: int, global_rate: float) -> dict:
+    broadcaster = Broadcaster(bot, global_rate=global_rate, per_chat_rate=1)
+    summary = await broadcaster.broadcast(range(1, subscribers + 1), "benchmark notification")
+    metrics = broadcaster.metrics()
+    return {
+        "subscribers": subscribers,
+        "global_rate": global_rate,
+        "delivered": summary["delivered"],
+        "seconds": summary["seconds"],
+        "messages_per_second": summary["delivered"] / summary["seconds"] if summary["seconds"] else None,
+        "send_latency_p50_ms": metrics["send_latency_p50"] * 1000,
+        "send_latency_p99_ms": metrics["send_latency_p99"] * 1000,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def main(args) -> dict:
+    hashkey = FakeHashkey(latency_ms=args.rest_latency_ms, tick_rate=args.tick_rate)
+    telegram = FakeTelegram(latency_ms=args.telegram_latency_ms)
+    hashkey_runner, hashkey_url = await start(hashkey.app())
+    telegram_runner, telegram_url = await start(telegram.app())
+    HashkeyAPI.BASE_URL = hashkey_url
+    report_service.configure(symbols=[])
+
+    # Same connection pool size as the bot built by Application.builder()
+    bot = Bot(TOKEN, base_url=f"{telegram_url}/bot", request=HTTPXRequest(connection_pool_size=256))
+    await bot.initialize()
+    try:
+        results = {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "timestamp": int(time.time()),
+            "params": vars(args),
+            "vwap": await bench_vwap(bot, args.iterations),
+            "rest_requests": hashkey.requests,
+            "websocket": await bench_ws(hashkey_url.replace("http", "ws", 1) + "/quote/ws/v2",
+                                        args.ws_symbols, args.ws_seconds),
+            "fanout": await bench_fanout(bot, args.subscribers, args.global_rate),
+        }
+    finally:
+        await bot.shutdown()
+        await HashkeyAPI.close_session()
+        await hashkey_runner.cleanup()
+        await telegram_runner.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--iterations", type=int, default=100, help="/vwap calls per scenario")
+    parser.add_argument("--rest-latency-ms", type=float, default=20)
+    parser.add_argument("--telegram-latency-ms", type=float, default=20)
+    parser.add_argument("--ws-symbols", type=int, default=10)
+    parser.add_argument("--tick-rate", type=float, default=2000, help="messages/second per WS subscription")
+    parser.add_argument("--ws-seconds", type=float, default=5)
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--global-rate", type=float, default=1e6,
+                        help="fan-out messages/second cap (Telegram's real limit is about 30)")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's INFO logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("bot_logger").setLevel(logging.WARNING)
+    results = asyncio.run(main(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
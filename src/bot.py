@@ -1,69 +1,77 @@
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, ContextTypes
 from handlers.command_handler import handle_help
-from handlers.vwap_handler import handle_vwap
-from utils.logger import logger
+from handlers.vwap_handler import (
+    handle_vwap, handle_vwap_all, handle_vwap_anchor, handle_vwap_bands, handle_vwap_unanchor)
+from handlers.stats_handler import handle_stats
+from utils.logger import configure_levels, logger, log_queue
+from utils.metrics import metrics
 from services.websocket_service import WebSocketClient
+from services.hashkey_api import HashkeyAPI
+from services.kline_store import KlineStore
+from services.market_history import market_history
+from services.report_service import report_service
+from services.broadcaster import Broadcaster
+from services.subscription_store import SubscriptionStore
+from services.trade_vwap import trade_vwap
+from services.vwap_bands import vwap_bands
+from services.shm_feed import ShmFeedReader
+from services.metrics_server import MetricsServer
+from services.webhook_server import WebhookServer
+from services.request_scheduler import BACKGROUND, request_priority, request_scheduler
+from services.notification_service import (
+    MidMoveRule, NotificationService, VwapCrossRule, rule_from_dict)
+from services.alert_engine import CROSS_VWAP, OPERATORS, AlertEngine
 import json
 import asyncio
 import os
 import inspect
+import secrets
+import signal
 
 # Initialize the WebSocket client
 websocket_client = WebSocketClient()
+# In split mode (FEED.mode = "shared_memory") market data comes from the
+# ingestion process (ingest.py) through this reader instead of websocket_client
+shm_feed = None
 application = None
+# Trade streams subscribed only because a price alert needs them
+alert_streams = set()
 
+MAX_ALERTS_PER_CHAT = 20
 
-def save_bot_data(ctx_or_app):
-    """Persist only whitelisted, JSON-serializable bot_data keys."""
-    bot_data = getattr(ctx_or_app, "bot_data", None)
-    if not isinstance(bot_data, dict):
-        logger.error("save_bot_data: no bot_data found to save.")
-        return
 
-    # Whitelist keys that should be persisted
-    allowed_keys = ("subscribed_chat_ids",)  # add other plain-data keys here if needed
-    to_save = {k: bot_data[k] for k in allowed_keys if k in bot_data}
+def load_bot_data(application, store: SubscriptionStore):
+    """Load subscriptions from the journaled store into application.bot_data.
 
-    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../config/bot_data.json')
+    On first run with the journaled store (no snapshot or journal yet),
+    subscribers and notification rules from the legacy
+    ../config/bot_data.json are imported into it and the legacy file is
+    renamed to bot_data.json.imported, so it is never imported twice.
+    """
+    first_run = not store.exists()
     try:
-        with open(config_path, 'w') as f:
-            json.dump(to_save, f, indent=2)
-        logger.info("Bot data saved to ../config/bot_data.json.")
+        store.load()
     except Exception as e:
-        logger.error(f"Failed to save bot_data: {e}")
+        logger.error(f"Failed to load subscriptions: {e}")
 
-
-def load_bot_data(application):
-    """Load only whitelisted keys from bot_data.json into application.bot_data."""
     config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../config/bot_data.json')
-    try:
-        with open(config_path, 'r') as f:
-            data = json.load(f)
-
-        if not isinstance(data, dict):
-            logger.warning("Loaded bot_data is not a dict; ignoring.")
-            application.bot_data = {}
-            return
+    if first_run and os.path.exists(config_path):
+        try:
+            with open(config_path, 'r') as f:
+                data = json.load(f)
+            rules = data.get("notification_rules", {})
+            for chat_id in data.get("subscribed_chat_ids", []):
+                store.subscribe(chat_id, {"rules": rules.get(str(chat_id), [])})
+            store.flush_now()
+            os.replace(config_path, f"{config_path}.imported")
+            logger.info(f"Imported {len(store)} subscriptions from ../config/bot_data.json.")
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.error(f"Legacy bot data file is corrupted; not imported: {e}")
+        except Exception as e:
+            logger.error(f"Failed to import legacy bot_data: {e}")
 
-        if getattr(application, "bot_data", None) is None:
-            application.bot_data = {}
-
-        # Merge only whitelisted keys
-        for k in ("subscribed_chat_ids",):
-            if k in data:
-                application.bot_data[k] = data[k]
-
-        logger.info("Bot data loaded from ../config/bot_data.json.")
-    except FileNotFoundError:
-        application.bot_data = {}
-        logger.info("Bot data file not found. Starting with empty bot_data.")
-    except json.JSONDecodeError:
-        application.bot_data = {}
-        logger.error("Bot data file is corrupted. Starting with empty bot_data.")
-    except Exception as e:
-        application.bot_data = {}
-        logger.error(f"Failed to load bot_data: {e}")
+    application.bot_data["subscriptions"] = store
 
 
 async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -81,11 +89,31 @@ async def handle_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def show_vwap_options(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle the /vwap command and display options for BTCUSD, ETHUSD and ALL pairs."""
+    """Handle the /vwap command and display options for BTCUSD, ETHUSD and ALL pairs.
+
+    /vwap band [SYMBOL]                    - ±1σ/±2σ bands, anchors and volume profile
+    /vwap anchor <SYMBOL> <time> [label]   - add an anchored VWAP
+    /vwap unanchor <SYMBOL> <label>        - remove it
+    """
+    if context.args:
+        action, context.args = context.args[0].lower(), context.args[1:]
+        if action in ("band", "bands"):
+            await handle_vwap_bands(update.message, context)
+        elif action == "anchor":
+            await handle_vwap_anchor(update.message, context)
+        elif action == "unanchor":
+            await handle_vwap_unanchor(update.message, context)
+        else:
+            await update.message.reply_text(
+                "Usage: /vwap [band [SYMBOL] | anchor <SYMBOL> <time> [label] | unanchor <SYMBOL> <label>]")
+        return
+
     buttons = [
         [InlineKeyboardButton("BTCUSD", callback_data="vwap_BTCUSD")],
         [InlineKeyboardButton("ETHUSD", callback_data="vwap_ETHUSD")],
-        [InlineKeyboardButton("ALL", callback_data="vwap_ALL")]  # new button for all pairs
+        [InlineKeyboardButton("ALL", callback_data="vwap_ALL")],  # new button for all pairs
+        [InlineKeyboardButton("BTCUSD bands", callback_data="bands_BTCUSD"),
+         InlineKeyboardButton("ETHUSD bands", callback_data="bands_ETHUSD")]
     ]
     reply_markup = InlineKeyboardMarkup(buttons)
     await update.message.reply_text(
@@ -99,15 +127,17 @@ async def handle_vwap_selection(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
     await query.answer()  # Acknowledge the callback query
 
-    pair = query.data.split("_", 1)[1]  # Extract the pair from callback data
+    view, pair = query.data.split("_", 1)  # Extract the pair from callback data
 
-    if pair == "ALL":
-        # trigger VWAP for both pairs
-        pairs = ["BTCUSD", "ETHUSD"]
-        await query.edit_message_text("Calculating VWAP for all pairs...")
-        for p in pairs:
-            context.args = [p]
-            await handle_vwap(query.message, context)
+    if view == "bands":
+        await query.edit_message_text(f"Calculating VWAP bands for {pair}...")
+        context.args = [pair]
+        await handle_vwap_bands(query.message, context)
+    elif pair == "ALL":
+        # One concurrent batch for the whole watchlist, rendered as a table
+        await query.edit_message_text(
+            f"Calculating VWAP for {len(report_service.watchlist)} pairs...")
+        await handle_vwap_all(query.message, context)
     else:
         await query.edit_message_text(f"Calculating VWAP for {pair}...")
         context.args = [pair]
@@ -117,12 +147,11 @@ async def handle_vwap_selection(update: Update, context: ContextTypes.DEFAULT_TY
 async def handle_bbo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /latest command to fetch the latest data from the WebSocket."""
     try:
-        # get_bbo_data is blocking; run in thread to avoid blocking handler
-        if hasattr(asyncio, "to_thread"):
-            data = await asyncio.to_thread(websocket_client.get_bbo_data)
+        if shm_feed is not None:
+            data = {symbol: quote.as_dict() for symbol, quote in shm_feed.snapshot().items()}
         else:
-            loop = asyncio.get_running_loop()
-            data = await loop.run_in_executor(None, websocket_client.get_bbo_data)
+            # The WebSocket client runs on this event loop, so no thread hop is needed
+            data = websocket_client.get_bbo_data()
         await update.message.reply_text(f"Latest data: {data}")
     except Exception as e:
         logger.error(f"Error fetching latest data: {e}")
@@ -132,14 +161,15 @@ async def handle_bbo(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /subscribe command to add the user to the notification list."""
     chat_id = update.message.chat_id
-    if 'subscribed_chat_ids' not in context.bot_data:
-        context.bot_data['subscribed_chat_ids'] = []
+    subscriptions = context.bot_data["subscriptions"]
 
-    if chat_id not in context.bot_data['subscribed_chat_ids']:
-        context.bot_data['subscribed_chat_ids'].append(chat_id)
+    if subscriptions.subscribe(chat_id):
+        notifications = context.bot_data.get("notification_service")
+        if notifications is not None:
+            notifications.set_rules(chat_id, notifications.default_rules())
+            store_notification_rules(context.bot_data, chat_id)
         await update.message.reply_text("You have successfully subscribed to notifications!")
         logger.info(f"Chat ID {chat_id} subscribed.")
-        save_bot_data(context)  # Save bot_data to file
     else:
         await update.message.reply_text("You are already subscribed to notifications.")
 
@@ -147,60 +177,285 @@ async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /unsubscribe command to remove the user from the notification list."""
     chat_id = update.message.chat_id
-    if 'subscribed_chat_ids' in context.bot_data and chat_id in context.bot_data['subscribed_chat_ids']:
-        context.bot_data['subscribed_chat_ids'].remove(chat_id)
+    if context.bot_data["subscriptions"].unsubscribe(chat_id):
+        notifications = context.bot_data.get("notification_service")
+        if notifications is not None:
+            notifications.remove_chat(chat_id)
+        alerts = context.bot_data.get("alert_engine")
+        if alerts is not None:
+            alerts.remove_chat(chat_id)
+            release_alert_streams(alerts)
         await update.message.reply_text("You have successfully unsubscribed from notifications.")
         logger.info(f"Chat ID {chat_id} unsubscribed.")
-        save_bot_data(context)  # Save bot_data to file
     else:
         await update.message.reply_text("You are not subscribed to notifications.")
 
 
-# --- Replaced blocking/threaded monitor/connect with async-safe background tasks ---
-async def monitor_websocket_async(application):
-    """Run inside the application's event loop. Use to_thread or run_in_executor for blocking calls."""
-    loop = asyncio.get_running_loop()
+async def handle_quiet(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /quiet <start> <end> (UTC hours) or /quiet off for notification quiet hours."""
+    chat_id = update.message.chat_id
+    subscriptions = context.bot_data["subscriptions"]
+    if chat_id not in subscriptions:
+        await update.message.reply_text("Please /subscribe first.")
+        return
+    args = context.args or []
     try:
-        while True:
+        if len(args) == 1 and args[0].lower() == "off":
+            subscriptions.update_prefs(chat_id, quiet_hours=None)
+            await update.message.reply_text("Quiet hours disabled.")
+            return
+        start, end = int(args[0]), int(args[1])
+        if not (0 <= start < 24 and 0 <= end < 24):
+            raise ValueError
+    except (IndexError, ValueError):
+        await update.message.reply_text("Usage: /quiet <start hour> <end hour> (UTC) or /quiet off")
+        return
+    subscriptions.update_prefs(chat_id, quiet_hours=[start, end])
+    await update.message.reply_text(f"No notifications between {start:02d}:00 and {end:02d}:00 UTC.")
+
+
+def store_notification_rules(bot_data, chat_id):
+    """Persist a chat's notification rules in its subscription preferences."""
+    rules = bot_data["notification_service"].get_rules(chat_id)
+    bot_data["subscriptions"].update_prefs(chat_id, rules=[rule.to_dict() for rule in rules])
+
+
+async def handle_notify(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /notify: list or set this chat's notification rules.
+
+    /notify                  - show rules
+    /notify move 25 [SYMBOL] - mid moves more than 25 bps
+    /notify vwap [SYMBOL]    - mid crosses the 24h VWAP
+    /notify reset            - back to the default rule
+    """
+    chat_id = update.message.chat_id
+    notifications = context.bot_data.get("notification_service")
+    if notifications is None:
+        await update.message.reply_text("Notifications are not available right now.")
+        return
+    if chat_id not in context.bot_data["subscriptions"]:
+        await update.message.reply_text("Please /subscribe first.")
+        return
+
+    args = context.args or []
+    try:
+        if not args:
+            rules = notifications.get_rules(chat_id)
+            lines = [f"- {rule.describe()}" for rule in rules] or ["- none"]
+            await update.message.reply_text("Your notification rules:\n" + "\n".join(lines))
+            return
+        action = args[0].lower()
+        if action == "move":
+            rule = MidMoveRule(float(args[1]), args[2].upper() if len(args) > 2 else None)
+            notifications.add_rule(chat_id, rule)
+        elif action == "vwap":
+            rule = VwapCrossRule(args[1].upper() if len(args) > 1 else None)
+            notifications.add_rule(chat_id, rule)
+        elif action == "reset":
+            notifications.set_rules(chat_id, notifications.default_rules())
+        else:
+            raise ValueError(action)
+    except (IndexError, ValueError):
+        await update.message.reply_text(
+            "Usage: /notify [move <bps> [SYMBOL] | vwap [SYMBOL] | reset]")
+        return
+
+    store_notification_rules(context.bot_data, chat_id)
+    await update.message.reply_text("Notification rules updated.")
+
+
+def alert_symbol_error(symbol: str, kind: str):
+    """Return why alerts of `kind` on `symbol` could never fire, or None if they can."""
+    if not report_service.known_symbol(symbol):
+        return f"Alerts are available for {', '.join(report_service.watchlist)}."
+    if kind == CROSS_VWAP and symbol not in report_service.symbols:
+        # The 24h VWAP is a report figure, only built for the report symbols
+        return f"VWAP-cross alerts are available for {', '.join(report_service.symbols)}."
+    if shm_feed is not None and symbol not in shm_feed.symbols():
+        return f"{symbol} is not published by the market data feed."
+    return None
+
+
+async def open_alert_stream(symbol: str):
+    """Subscribe the trade stream of `symbol` for its alerts, unless it is already streamed."""
+    if shm_feed is None and ("trade", symbol) not in websocket_client.get_subscriptions():
+        alert_streams.add(symbol)
+        await websocket_client.subscribe("trade", symbol)
+
+
+def release_alert_streams(alerts: AlertEngine):
+    """Close the trade streams opened for alerts once no alert on the symbol is left."""
+    unused = [symbol for symbol in alert_streams if not alerts.has_alerts(symbol)]
+    if unused:
+        alert_streams.difference_update(unused)
+        asyncio.ensure_future(websocket_client.unsubscribe("trade", unused))
+
+
+def store_alerts(bot_data, chat_id):
+    """Persist a chat's price alerts in its subscription preferences."""
+    subscriptions = bot_data["subscriptions"]
+    if chat_id in subscriptions:
+        subscriptions.update_prefs(chat_id, alerts=bot_data["alert_engine"].export_alerts(chat_id) or None)
+    release_alert_streams(bot_data["alert_engine"])
+
+
+async def handle_alert(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /alert: list, add or remove this chat's price alerts.
+
+    /alert                    - show alerts
+    /alert BTCUSD > 70000     - once when the price is at or above 70000 (< for at or below)
+    /alert ETHUSD cross vwap  - whenever the price crosses the 24h VWAP
+    /alert del <id> | clear   - remove one or all alerts
+    """
+    chat_id = update.message.chat_id
+    alerts = context.bot_data.get("alert_engine")
+    if alerts is None:
+        await update.message.reply_text("Alerts are not available right now.")
+        return
+    if chat_id not in context.bot_data["subscriptions"]:
+        await update.message.reply_text("Please /subscribe first.")
+        return
+
+    args = context.args or []
+    try:
+        if not args:
+            lines = [f"- {alert.describe()}" for alert in alerts.get_alerts(chat_id)] or ["- none"]
+            await update.message.reply_text("Your alerts:\n" + "\n".join(lines))
+            return
+        action = args[0].lower()
+        if action == "clear":
+            count = alerts.remove_chat(chat_id)
+            reply = f"Removed {count} alerts."
+        elif action in ("del", "delete", "remove"):
+            if not alerts.remove(chat_id, int(args[1].lstrip("#"))):
+                raise ValueError(args[1])
+            reply = f"Removed alert {args[1]}."
+        elif len(args) == 3 and (args[1].lower() in OPERATORS or
+                                 (args[1].lower() == "cross" and args[2].lower() == "vwap")):
+            symbol = args[0].upper()
+            if args[1].lower() == "cross":
+                kind, price = CROSS_VWAP, None
+            else:
+                kind, price = OPERATORS[args[1].lower()], float(args[2].replace(",", ""))
+            error = alert_symbol_error(symbol, kind)
+            if error is None and alerts.count(chat_id) >= MAX_ALERTS_PER_CHAT:
+                error = f"At most {MAX_ALERTS_PER_CHAT} alerts per chat; remove one with /alert del <id>."
+            if error is not None:
+                await update.message.reply_text(error)
+                return
+            alert = alerts.add(chat_id, symbol, kind, price)
+            # Ticks only arrive for subscribed symbols
+            await open_alert_stream(symbol)
+            reply = f"Added alert {alert.describe()}."
+        else:
+            raise ValueError(action)
+    except (IndexError, ValueError):
+        await update.message.reply_text(
+            "Usage: /alert [SYMBOL > price | SYMBOL < price | SYMBOL cross vwap | del <id> | clear]")
+        return
+
+    store_alerts(context.bot_data, chat_id)
+    await update.message.reply_text(reply)
+
+
+def prune_subscriber(application, chat_id):
+    """Drop a chat that blocked the bot or no longer exists from the subscriber list."""
+    if application.bot_data["subscriptions"].unsubscribe(chat_id):
+        notifications = application.bot_data.get("notification_service")
+        if notifications is not None:
+            notifications.remove_chat(chat_id)
+        alerts = application.bot_data.get("alert_engine")
+        if alerts is not None:
+            alerts.remove_chat(chat_id)
+            release_alert_streams(alerts)
+        logger.info(f"Chat ID {chat_id} pruned from subscribers.")
+
+
+def get_broadcaster(application) -> Broadcaster:
+    """Return the application's Broadcaster, creating it on first use."""
+    broadcaster = application.bot_data.get("broadcaster")
+    if broadcaster is None:
+        broadcaster = Broadcaster(
+            application.bot, on_blocked=lambda chat_id: prune_subscriber(application, chat_id))
+        application.bot_data["broadcaster"] = broadcaster
+    return broadcaster
+
+
+def setup_notifications(application, settings: dict) -> NotificationService:
+    """Create the change-driven notification pipeline and feed it BBO updates."""
+    notifications = NotificationService(
+        shm_feed if shm_feed is not None else websocket_client.bbo_store,
+        send=lambda chat_id, text: get_broadcaster(application).send(chat_id, text),
+        vwap_provider=lambda symbol: report_service.latest_figure(symbol, "vwap_24h"),
+        is_quiet=application.bot_data["subscriptions"].is_quiet,
+        debounce_seconds=settings.get('debounce_seconds', 2.0),
+        default_move_bps=settings.get('default_move_bps', 50))
+
+    subscriptions = application.bot_data["subscriptions"]
+    for chat_id in subscriptions.chats():
+        rules = [rule_from_dict(rule) for rule in subscriptions.get_prefs(chat_id).get("rules", [])]
+        notifications.set_rules(chat_id, rules or notifications.default_rules())
+
+    application.bot_data["notification_service"] = notifications
+    if shm_feed is None:
+        websocket_client.add_handler("bbo", notifications.on_bbo)
+    return notifications
+
+
+def setup_alerts(application, notifications: NotificationService, settings: dict) -> AlertEngine:
+    """Create the price-alert index, restore stored alerts and feed it BBO and trade ticks."""
+    alerts = AlertEngine(
+        shm_feed if shm_feed is not None else websocket_client.bbo_store,
+        notify=notifications.notify,
+        vwap_provider=lambda symbol: report_service.latest_figure(symbol, "vwap_24h"),
+        on_fired=lambda chat_id: store_alerts(application.bot_data, chat_id),
+        hysteresis_bps=settings.get('vwap_cross_hysteresis_bps', 2.0))
+
+    subscriptions = application.bot_data["subscriptions"]
+    for chat_id in subscriptions.chats():
+        for stored in subscriptions.get_prefs(chat_id).get("alerts", []):
             try:
-                if hasattr(asyncio, "to_thread"):
-                    data = await asyncio.to_thread(websocket_client.get_bbo_data)
-                else:
-                    data = await loop.run_in_executor(None, websocket_client.get_bbo_data)
-
-                if not data:
-                    logger.warning("Received empty data from WebSocket.")
-                    await asyncio.sleep(10)
-                    continue
-
-                for chat_id in application.bot_data.get('subscribed_chat_ids', []):
-                    if application.bot is None:
-                        logger.error("Bot instance is not initialized!")
-                        continue
-                    try:
-                        await application.bot.send_message(chat_id=chat_id, text=f"{data}")
-                        logger.info(f"Message sent to chat_id {chat_id}")
-                    except Exception as send_error:
-                        logger.error(f"Failed to send message to chat_id {chat_id}: {send_error}")
-
-                await asyncio.sleep(10)
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Error in WebSocket monitoring loop: {e}")
-                await asyncio.sleep(5)
-    finally:
-        logger.info("monitor_websocket_async stopped.")
+                if not report_service.known_symbol(stored["symbol"]):
+                    raise ValueError("unknown symbol")
+                alert = alerts.add(chat_id, stored["symbol"], stored["kind"], stored.get("price"))
+            except (KeyError, ValueError) as e:
+                logger.error(f"Skipping stored alert {stored} for chat {chat_id}: {e}")
+                continue
+            if shm_feed is None and ("trade", alert.symbol) not in websocket_client.get_subscriptions():
+                # Sent with the other subscriptions when the WebSocket connects
+                alert_streams.add(alert.symbol)
+                websocket_client.add_subscriptions("trade", alert.symbol)
+
+    application.bot_data["alert_engine"] = alerts
+    if shm_feed is None:
+        websocket_client.add_handler("bbo", alerts.on_bbo)
+        websocket_client.add_handler("trade", alerts.on_trade)
+    metrics.gauge("alerts_active", "Price alerts waiting to fire", fn=lambda: len(alerts))
+    return alerts
 
 
 async def start_websocket_background(application):
-    """Run inside post_init: schedule connect and monitor using asyncio.create_task.
+    """Run inside post_init: schedule connect using asyncio.create_task.
     Handles both coroutine and blocking connect() implementations and prevents
     exceptions from escaping post_init.
     """
     application.bot_data.setdefault("ws_tasks", [])
     loop = asyncio.get_running_loop()
 
+    if shm_feed is not None:
+        # Split mode: the ingestion process owns the WebSocket; watch its feed
+        handlers = [service.on_bbo for service in (application.bot_data.get("notification_service"),
+                                                    application.bot_data.get("alert_engine"))
+                    if service is not None]
+
+        def callback(bbo_data):
+            for handler in handlers:
+                handler(bbo_data)
+
+        application.bot_data["ws_tasks"].append(
+            asyncio.create_task(shm_feed.watch(callback), name="shm_feed_watch"))
+        return
+
     try:
         # Helper to run blocking connect safely and log exceptions
         def _blocking_connect():
@@ -227,11 +482,8 @@ async def start_websocket_background(application):
                 connect_future = loop.run_in_executor(None, _blocking_connect)
                 connect_task = asyncio.ensure_future(connect_future, loop=loop)
 
-        # Start monitor (always a coroutine)
-        monitor_task = asyncio.create_task(monitor_websocket_async(application), name="ws_monitor")
-
         # Save tasks for shutdown cancellation/await
-        application.bot_data["ws_tasks"].extend([connect_task, monitor_task])
+        application.bot_data["ws_tasks"].append(connect_task)
 
     except Exception as e:
         # Log and do not re-raise — post_init must not raise otherwise run_until_complete fails
@@ -240,6 +492,9 @@ async def start_websocket_background(application):
 
 async def stop_websocket_background(application):
     """Cancel and await websocket tasks and ensure websocket disconnected."""
+    notifications = application.bot_data.get("notification_service")
+    if notifications is not None:
+        await notifications.stop()
     tasks = application.bot_data.get("ws_tasks", [])
     # cancel tasks
     for t in tasks:
@@ -257,17 +512,140 @@ async def stop_websocket_background(application):
         except Exception as e:
             logger.debug(f"ws task error during shutdown: {e}")
 
-    # ensure websocket is disconnected (run blocking disconnect in thread)
+    # ensure websocket is disconnected
     try:
-        if hasattr(asyncio, "to_thread"):
-            await asyncio.to_thread(websocket_client.disconnect)
-        else:
-            loop = asyncio.get_running_loop()
-            await loop.run_in_executor(None, websocket_client.disconnect)
+        await websocket_client.disconnect()
     except Exception as e:
         logger.error(f"Error while disconnecting websocket_client: {e}")
 
 
+def register_queue_gauges(application):
+    """Expose the depths of the bot's internal queues as a metrics gauge."""
+    def depths():
+        bot_data = application.bot_data
+        depth = {"log": log_queue.qsize()}
+        if "subscriptions" in bot_data:
+            depth["subscription_journal"] = bot_data["subscriptions"].buffered()
+        if "notification_service" in bot_data:
+            depth["notifications"] = bot_data["notification_service"].pending()
+        if "broadcaster" in bot_data:
+            depth["broadcast_waiting"] = bot_data["broadcaster"].waiting
+        if "webhook" in bot_data:
+            depth["telegram_updates"] = application.update_queue.qsize()
+        for lane, count in request_scheduler.waiting().items():
+            depth[f"rest_{lane}"] = count
+        return depth
+
+    metrics.gauge("queue_depth", "Items waiting in internal queues", "queue", fn=depths)
+
+
+async def restore_anchors(application):
+    """Re-create the anchored VWAPs stored in subscribers' preferences."""
+    request_priority.set(BACKGROUND)
+    subscriptions = application.bot_data["subscriptions"]
+    for chat_id in subscriptions.chats():
+        for anchor in subscriptions.get_prefs(chat_id).get("anchors", []):
+            try:
+                if not report_service.known_symbol(anchor["symbol"]):
+                    raise ValueError("unknown symbol")
+                await vwap_bands.add_anchor(anchor["symbol"], (chat_id, anchor["label"]),
+                                            anchor["time"], anchor["label"])
+            except Exception as e:
+                logger.error(f"Failed to restore anchor {anchor} for chat {chat_id}: {e}")
+
+
+async def start_background(application):
+    """post_init hook: start websocket tasks, the VWAP report scheduler and the journal flusher."""
+    application.bot_data["subscriptions"].start()
+    await start_websocket_background(application)
+    application.bot_data["anchor_restore"] = asyncio.create_task(
+        restore_anchors(application), name="anchor_restore")
+    try:
+        report_service.start()
+    except Exception as e:
+        logger.error(f"Failed to start report scheduler: {e}")
+    metrics_server = application.bot_data.get("metrics_server")
+    if metrics_server is not None:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logger.error(f"Failed to start metrics endpoint: {e}")
+
+
+async def shutdown_background(application):
+    """post_shutdown hook: stop background tasks and close pooled HTTP connections."""
+    await report_service.stop()
+    anchor_restore = application.bot_data.pop("anchor_restore", None)
+    if anchor_restore is not None:
+        anchor_restore.cancel()
+    metrics_server = application.bot_data.get("metrics_server")
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await stop_websocket_background(application)
+    try:
+        await application.bot_data["subscriptions"].stop()
+    except Exception as e:
+        logger.error(f"Failed to flush subscriptions on shutdown: {e}")
+    try:
+        await HashkeyAPI.close_session()
+    except Exception as e:
+        logger.error(f"Error while closing HashkeyAPI session: {e}")
+
+
+def setup_webhook(application, server: MetricsServer, settings: dict) -> WebhookServer:
+    """Mount the Telegram webhook and the health/readiness probes on `server`."""
+    secret_token = settings.get('secret_token')
+    if not secret_token:
+        # Fine for a single instance; replicas behind a balancer need a shared token
+        secret_token = secrets.token_urlsafe(32)
+        logger.warning("WEBHOOK.secret_token is not set; using a random token for this run.")
+    webhook = WebhookServer(application, settings.get('path', '/telegram'), secret_token)
+    webhook.register(server.app)
+    webhook.add_check("subscriptions", lambda: "subscriptions" in application.bot_data)
+    if shm_feed is not None:
+        webhook.add_check("market_feed", lambda: shm_feed.heartbeat_age() < 3 * shm_feed.stale_after)
+    application.bot_data["webhook"] = webhook
+    return webhook
+
+
+async def run_webhook(application, webhook: WebhookServer, settings: dict):
+    """Run the bot in webhook mode until SIGINT/SIGTERM.
+
+    The equivalent of run_polling() for the embedded server: initialize,
+    run the post_init hook (which also starts the shared HTTP server),
+    start dispatching, register the webhook with Telegram, and unwind in
+    reverse order on shutdown.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await application.initialize()
+    try:
+        await start_background(application)
+        if not application.bot_data["metrics_server"].running:
+            raise RuntimeError("Webhook server failed to start; see the error above")
+        await application.start()
+        if settings.get('url') and settings.get('set_webhook', True):
+            await application.bot.set_webhook(
+                settings['url'], secret_token=webhook.secret_token,
+                allowed_updates=Update.ALL_TYPES,
+                max_connections=settings.get('max_connections', 40),
+                drop_pending_updates=settings.get('drop_pending_updates', False))
+            logger.info(f"Webhook registered at {settings['url']}")
+        webhook.webhook_set = True
+        await stop.wait()
+    finally:
+        # Fail readiness first so the balancer stops routing here; the webhook
+        # itself stays registered for the other replicas
+        webhook.draining = True
+        if application.running:
+            await application.stop()
+        await shutdown_background(application)
+        await application.shutdown()
+
+
 def main():
     # Get the absolute path to the config file relative to this script
     config_path = os.path.join(os.path.dirname(
@@ -276,18 +654,101 @@ def main():
     with open(config_path, 'r') as config_file:
         config = json.load(config_file)
 
+    # Per-logger levels: {"levels": {"services.websocket_service": "DEBUG"}}
+    configure_levels(config.get('LOGGING', {}).get('levels'))
+
     bot_token = config['DEFAULT']['telegram_bot_token']
+
+    # Hashkey REST budget: {"rate": weight/second, "burst": ..., "weights": {path: weight}}
+    api_config = config.get('HASHKEY', {})
+    request_scheduler.configure(
+        rate=api_config.get('rate'), burst=api_config.get('burst'), weights=api_config.get('weights'))
+
+    # Persist kline history so restarts only backfill the gap since shutdown
+    kline_dir = config.get('DATA', {}).get('kline_dir') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '../data/klines')
+    try:
+        market_history.attach_store(KlineStore(kline_dir))
+    except OSError as e:
+        logger.error(f"Kline store unavailable, running without persistence: {e}")
+
+    # Split mode: read market data published by ingest.py through shared memory
+    global shm_feed
+    feed_config = config.get('FEED', {})
+    if feed_config.get('mode') == 'shared_memory':
+        shm_feed = ShmFeedReader(feed_config.get('name', 'hashkey_feed'))
+        report_service.live_vwap = shm_feed
+
+    # Market data streams: {"subscriptions": {"bbo": ["BTCUSD", ...], "trade": [...]}}
+    ws_config = config.get('WEBSOCKET', {})
+    if ws_config.get('url'):
+        websocket_client.stream_url = ws_config['url']
+    for topic, symbols in ws_config.get('subscriptions', {}).items():
+        websocket_client.add_subscriptions(topic, symbols)
+
+    # Hot symbols whose VWAP reports are prebuilt by the background scheduler
+    reports_config = config.get('REPORTS', {})
+    report_service.configure(
+        symbols=reports_config.get('symbols'),
+        refresh_seconds=reports_config.get('refresh_seconds'),
+        max_age=reports_config.get('max_age_seconds'),
+        watchlist=reports_config.get('watchlist'))
+
+    # Quotes default to the report symbols, so notification rules and alerts
+    # that compare the mid price with the report's 24h VWAP see the same pair
+    if shm_feed is None and not ws_config.get('subscriptions', {}).get('bbo'):
+        websocket_client.add_subscriptions("bbo", report_service.symbols)
+
+    # Exact intraday VWAPs from the public trade stream for the hot symbols
+    vwap_bands.session_hour = reports_config.get('session_hour_utc', 0)
+    if shm_feed is None:
+        trade_vwap.session_hour = reports_config.get('session_hour_utc', 0)
+        websocket_client.add_subscriptions("trade", report_service.symbols)
+        websocket_client.add_handler("trade", trade_vwap.on_trade)
+        websocket_client.add_handler("trade", vwap_bands.on_trade)
+        websocket_client.add_connect_handler(trade_vwap.reset_coverage)
+
+    # Update mode: long polling (default) or a webhook behind a TLS-terminating proxy
+    webhook_config = config.get('WEBHOOK', {})
+    use_webhook = webhook_config.get('enabled', False)
+
     # register both start and shutdown hooks so background tasks are created and cleaned up correctly
-    application = (
+    builder = (
         Application.builder()
         .token(bot_token)
-        .post_init(start_websocket_background)
-        .post_shutdown(stop_websocket_background)
-        .build()
+        .post_init(start_background)
+        .post_shutdown(shutdown_background)
     )
-
-    # Load bot_data from file
-    load_bot_data(application)
+    if config['DEFAULT'].get('telegram_base_url'):
+        builder = builder.base_url(config['DEFAULT']['telegram_base_url'])
+    if use_webhook:
+        # Updates arrive through WebhookServer; handlers run concurrently
+        builder = builder.updater(None).concurrent_updates(webhook_config.get('concurrent_updates', 64))
+    application = builder.build()
+
+    # Load subscriptions from the journaled store
+    subscriptions_dir = config.get('DATA', {}).get('subscriptions_dir') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '../config')
+    load_bot_data(application, SubscriptionStore(subscriptions_dir))
+
+    # Push notifications are driven by WebSocket updates, not polling
+    notifications = setup_notifications(application, config.get('NOTIFICATIONS', {}))
+    setup_alerts(application, notifications, config.get('NOTIFICATIONS', {}))
+
+    # Instrumentation: Prometheus text on a local port and the /stats command
+    application.bot_data["admin_chat_ids"] = set(config['DEFAULT'].get('admin_chat_ids', []))
+    if not application.bot_data["admin_chat_ids"]:
+        logger.warning("DEFAULT.admin_chat_ids is not set; /stats is disabled for every chat.")
+    register_queue_gauges(application)
+    metrics_config = config.get('METRICS', {})
+    if use_webhook:
+        # One server for updates, /metrics and the health/readiness probes
+        server = MetricsServer(webhook_config.get('listen', '127.0.0.1'), webhook_config.get('port', 8080))
+        webhook = setup_webhook(application, server, webhook_config)
+        application.bot_data["metrics_server"] = server
+    elif metrics_config.get('enabled', True):
+        application.bot_data["metrics_server"] = MetricsServer(
+            metrics_config.get('host', '127.0.0.1'), metrics_config.get('port', 9108))
 
     application.add_handler(CommandHandler("start", handle_start))
     application.add_handler(CommandHandler("help", handle_help))
@@ -298,19 +759,22 @@ def main():
         "subscribe", subscribe))  # Subscribe command
     application.add_handler(CommandHandler(
         "unsubscribe", unsubscribe))  # Unsubscribe command
+    application.add_handler(CommandHandler("notify", handle_notify))
+    application.add_handler(CommandHandler("quiet", handle_quiet))
+    application.add_handler(CommandHandler("alert", handle_alert))
+    application.add_handler(CommandHandler("stats", handle_stats))
 
     logger.info("Bot is starting...")
     try:
-        # run_polling starts the application's event loop and will execute post_init callbacks
-        application.run_polling()  # Start polling for Telegram updates
+        if use_webhook:
+            asyncio.run(run_webhook(application, webhook, webhook_config))
+        else:
+            # run_polling starts the application's event loop and will execute post_init callbacks
+            application.run_polling()  # Start polling for Telegram updates
     except KeyboardInterrupt:
         logger.info("Bot is shutting down...")
     finally:
-        logger.info("Cleaning up resources...")
-        try:
-            websocket_client.disconnect()  # Ensure WebSocket is terminated
-        except Exception as e:
-            logger.error(f"Error while disconnecting websocket_client: {e}")
+        # The WebSocket is closed by the post_shutdown hook while the loop is still running
         logger.info("Bot stopped.")
 
 
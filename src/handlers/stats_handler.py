@@ -0,0 +1,51 @@
+from telegram import Update
+from telegram.ext import ContextTypes
+from utils.logger import logger
+from utils.metrics import metrics
+
+
+def _ms(seconds) -> str:
+    if seconds is None:
+        return "-"
+    return ">10s" if seconds == float("inf") else f"{seconds * 1000:.0f}ms"
+
+
+def format_stats(summary: dict) -> str:
+    """Render the metrics registry summary as a compact text report."""
+    lines = []
+
+    def latency_block(title: str, name: str):
+        series = summary.get(name) or {}
+        if not series:
+            return
+        lines.append(title)
+        for label, stats in sorted(series.items(), key=lambda item: str(item[0])):
+            lines.append(f"  {label or 'all':<22} n={stats['count']:<7} "
+                         f"p50={_ms(stats['p50'])} p99={_ms(stats['p99'])}")
+
+    latency_block("Stages:", "stage_seconds")
+    latency_block("REST latency:", "rest_request_seconds")
+    latency_block("REST decode:", "rest_parse_seconds")
+    latency_block("WS lag:", "ws_lag_seconds")
+    latency_block("Telegram send:", "telegram_send_seconds")
+
+    for title, name in (("WS messages:", "ws_messages_total"), ("Telegram sends:", "telegram_sends_total"),
+                        ("REST errors:", "rest_errors_total"), ("Queues:", "queue_depth")):
+        series = summary.get(name) or {}
+        if series:
+            lines.append(title + " " + ", ".join(f"{label or 'all'}={value:g}"
+                                                 for label, value in sorted(series.items(), key=lambda item: str(item[0]))))
+    return "\n".join(lines) or "No metrics recorded yet."
+
+
+async def handle_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /stats: per-stage latency, REST/WS/Telegram counters and queue depths (admins only)."""
+    admins = context.bot_data.get("admin_chat_ids") or ()
+    if update.message.chat_id not in admins:
+        await update.message.reply_text("This command is restricted to administrators.")
+        return
+    try:
+        await update.message.reply_text(f"<pre>{format_stats(metrics.summary())}</pre>", parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Error in handle_stats: {e}")
+        await update.message.reply_text("Failed to collect stats.")
@@ -1,117 +1,169 @@
+import html
+import re
+import time
+from datetime import datetime, timezone
 from telegram import Update
 from telegram.ext import CommandHandler, ContextTypes
-from services.hashkey_api import HashkeyAPI
+from services.batch_report import build_batch_report
+from services.report_service import report_service
+from services.vwap_bands import vwap_bands
 from utils.logger import logger
+from utils.metrics import metrics
+
+STAGE_SECONDS = metrics.histogram("stage_seconds", "Time spent per processing stage", "stage")
+COMMANDS = metrics.counter("commands_total", "Bot commands handled", "command")
+COMMAND_ERRORS = metrics.counter("command_errors_total", "Bot commands that failed", "command")
+
+MAX_ANCHORS_PER_CHAT = 10
+RELATIVE_TIME = re.compile(r"^(\d+(?:\.\d+)?)([mhdw])$")
+RELATIVE_UNITS = {"m": 60, "h": 3_600, "d": 86_400, "w": 7 * 86_400}
+ANCHOR_LABEL = re.compile(r"^[\w.:-]{1,10}$")
 
 logger.info("Logger in vwap_handler.py is initialized")
 
 
 async def handle_vwap(message, context: ContextTypes.DEFAULT_TYPE):
     logger.info("Received /vwap command")
+    COMMANDS.inc("vwap")
 
     try:
-        symbol = context.args[0] if context.args else "BTCUSD"
-        logger.info(f"Fetching VWAP and market data for symbol: {symbol}")
-
-        # Fetch VWAP
-        vwap_24hr = HashkeyAPI.get_vwap(
-            symbol=symbol, interval="3m", limit=480)
-        vwap_rounded = round(vwap_24hr)
-
-        # Calculate VWAP for the last 7 days using 1-hour intervals
-        vwap_7d = HashkeyAPI.get_vwap(
-            symbol=symbol, interval="15m", limit=672)  # 15m * 672 = 7 days
-        vwap_7d_rounded = round(vwap_7d)
-
-        # Calculate TWAP for the last 7 days using 15-minute intervals
-        twap_7d = HashkeyAPI.get_twap(
-            symbol=symbol, interval="15m", limit=672)
-        twap_7d_rounded = round(twap_7d)
-
-        # Calculate VWAP for the last 30 days using 1-hour intervals
-        vwap_30d = HashkeyAPI.get_vwap(
-            symbol=symbol, interval="1h", limit=720)  # 1h * 720 = 30 days
-        vwap_30d_rounded = round(vwap_30d)
-
-        # Calculate TWAP for the last 30 days using 1-hour intervals
-        twap_30d = HashkeyAPI.get_twap(
-            symbol=symbol, interval="1h", limit=720)
-        twap_30d_rounded = round(twap_30d)
-
-       # Fetch 24-hour ticker price change data
-        price_change_data = HashkeyAPI.get_24hr_ticker_price_change(symbol)
-        timestamp = price_change_data["timestamp"]
-        last_price = round(price_change_data["last_price"])
-        high_price = round(price_change_data["high_price"])
-        low_price = round(price_change_data["low_price"])
-        opening_price = round(price_change_data["opening_price"])
-        bid_price = round(price_change_data["bid_price"])
-        ask_price = round(price_change_data["ask_price"])
-        base_volume = round(price_change_data["base_volume"])
-        quote_volume = round(price_change_data["quote_volume"])
-
-        # Calculate VWAP position within High and Low
-        vwap_within_range = ((vwap_24hr - low_price) / (high_price -
-                             low_price)) * 100 if high_price > low_price else 0
-        vwap_within_range_rounded = round(vwap_within_range, 2)
-
-        # Calculate Last Price position within High and Low
-        last_price_within_range = (
-            (last_price - low_price) / (high_price - low_price)) * 100 if high_price > low_price else 0
-        last_price_within_range_rounded = round(last_price_within_range, 2)
-
-        # Ensure bar_length is valid
-        bar_length = max(1, 20)  # Length of the progress bar
-
-        # Calculate VWAP and Last Price positions
-        vwap_filled_length = max(0, min(int((vwap_within_range / 100) * bar_length), bar_length - 1))
-        last_price_filled_length = max(0, min(int((last_price_within_range / 100) * bar_length), bar_length - 1))
-
-        # Initialize progress bar
-        progress_bar = ["-"] * bar_length
-
-        # Handle overlap
-        if vwap_filled_length == last_price_filled_length:
-            if vwap_within_range == last_price_within_range:
-                progress_bar[vwap_filled_length] = "VL"  # Equal position
-            elif vwap_within_range > last_price_within_range:
-                progress_bar[vwap_filled_length] = "LV"  # VWAP is larger
-            else:
-                progress_bar[vwap_filled_length] = "VL"  # Last Price is larger
-        else:
-            if vwap_filled_length < bar_length:
-                progress_bar[vwap_filled_length] = "V"  # Mark VWAP position
-            if last_price_filled_length < bar_length:
-                progress_bar[last_price_filled_length] = "L"  # Mark Last Price position
-
-        progress_bar = "".join(progress_bar)
-
-        logger.info(f"VWAP fetched and rounded: {vwap_rounded}")
-        logger.info(
-            f"24-hour ticker price change data fetched: {price_change_data}")
-
-        # Send response
-        await message.reply_text(
-            f"<pre>"
-            f"The 24-hour prices for {symbol}:\n"
-            f"{'VWAP':<10}: {vwap_rounded:>7,}\n"
-            f"{'Last':<10}: {last_price:>7,}\n"
-            f"{'High':<10}: {high_price:>7,}\n"
-            f"{'Low':<10}: {low_price:>7,}\n"
-            f"{'Opening':<10}: {opening_price:>7,}\n"
-            f"{'Bid':<10}: {bid_price:>7,}\n"
-            f"{'Ask':<10}: {ask_price:>7,}\n"
-            f"{'VWAP %':<10}: {vwap_within_range_rounded:>6,}%\n"
-            f"{'Last %':<10}: {last_price_within_range_rounded:>6,}%\n"
-            f"{'Position':<10}: [{progress_bar}]\n"
-            f"Other timeframes:\n"
-            f"{'VWAP 7d':<10}: {vwap_7d_rounded:>7,}\n"
-            f"{'TWAP 7d':<10}: {twap_7d_rounded:>7,} ({(((twap_7d - vwap_7d) / vwap_7d) * 100) if vwap_7d else 0:+.1f}%)\n"
-            f"{'VWAP 30d':<10}: {vwap_30d_rounded:>7,}\n"
-            f"{'TWAP 30d':<10}: {twap_30d_rounded:>7,} ({(((twap_30d - vwap_30d) / vwap_30d) * 100) if vwap_30d else 0:+.1f}%)\n"
-            f"</pre>",
-            parse_mode="HTML"
-        )
+        with STAGE_SECONDS.time("vwap_total"):
+            symbol = context.args[0] if context.args else "BTCUSD"
+            logger.info(f"Fetching VWAP report for symbol: {symbol}")
+
+            # Served from memory when the background scheduler keeps it fresh
+            with STAGE_SECONDS.time("vwap_report"):
+                report = await report_service.get_report(symbol)
+
+            # Send response
+            with STAGE_SECONDS.time("telegram_reply"):
+                await message.reply_text(report.render(), parse_mode="HTML")
     except Exception as e:
+        COMMAND_ERRORS.inc("vwap")
         logger.error(f"Error in handle_vwap: {str(e)}")
         await message.reply_text(f"Error fetching VWAP or market data: {str(e)}")
+
+
+async def handle_vwap_all(message, context: ContextTypes.DEFAULT_TYPE):
+    logger.info("Received VWAP ALL request")
+    COMMANDS.inc("vwap_all")
+
+    try:
+        with STAGE_SECONDS.time("vwap_all_total"):
+            pages = await build_batch_report(report_service.watchlist, report_service.live_vwap)
+            for page in pages:
+                await message.reply_text(page, parse_mode="HTML")
+    except Exception as e:
+        COMMAND_ERRORS.inc("vwap_all")
+        logger.error(f"Error in handle_vwap_all: {str(e)}")
+        await message.reply_text(f"Error fetching VWAP or market data: {str(e)}")
+
+
+def parse_anchor_time(text: str, now: float = None) -> float:
+    """
+    Parse an anchor time into epoch milliseconds.
+
+    Accepts a duration ago ("90m", "4h", "2d", "1w"), an ISO date or
+    date-time in UTC ("2024-11-05", "2024-11-05T14:30") or epoch seconds.
+
+    Raises:
+        ValueError: If the text is none of these.
+    """
+    now = now if now is not None else time.time()
+    match = RELATIVE_TIME.match(text.lower())
+    if match:
+        return (now - float(match.group(1)) * RELATIVE_UNITS[match.group(2)]) * 1000
+    if text.isdigit():
+        return float(text) * 1000
+    parsed = datetime.fromisoformat(text)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp() * 1000
+
+
+def _store_anchors(context: ContextTypes.DEFAULT_TYPE, chat_id, symbol: str, label: str, anchor: dict = None):
+    """Replace (or with anchor=None, remove) a chat's stored anchor; only subscribers' anchors persist."""
+    subscriptions = context.bot_data.get("subscriptions")
+    if subscriptions is None or chat_id not in subscriptions:
+        return
+    anchors = [stored for stored in subscriptions.get_prefs(chat_id).get("anchors", [])
+               if (stored["symbol"], stored["label"]) != (symbol, label)]
+    subscriptions.update_prefs(chat_id, anchors=anchors + ([anchor] if anchor else []))
+
+
+async def handle_vwap_bands(message, context: ContextTypes.DEFAULT_TYPE):
+    """Reply with the ±1σ/±2σ VWAP bands, the chat's anchored VWAPs and the 24h volume profile."""
+    logger.info("Received VWAP bands request")
+    COMMANDS.inc("vwap_bands")
+
+    try:
+        with STAGE_SECONDS.time("vwap_bands"):
+            symbol = context.args[0].upper() if context.args else "BTCUSD"
+            chat_id = message.chat_id
+            if not report_service.known_symbol(symbol):
+                await message.reply_text(f"VWAP bands are available for {', '.join(report_service.watchlist)}.")
+                return
+            await vwap_bands.sync(symbol)
+            text = vwap_bands.render(symbol, keys=lambda key: key[0] == chat_id)
+            await message.reply_text(f"<pre>{html.escape(text)}</pre>", parse_mode="HTML")
+    except Exception as e:
+        COMMAND_ERRORS.inc("vwap_bands")
+        logger.error(f"Error in handle_vwap_bands: {str(e)}")
+        await message.reply_text(f"Error fetching VWAP bands: {str(e)}")
+
+
+async def handle_vwap_anchor(message, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /vwap anchor <SYMBOL> <time> [label]: add an anchored VWAP for this chat."""
+    COMMANDS.inc("vwap_anchor")
+    chat_id = message.chat_id
+    args = context.args or []
+    try:
+        symbol = args[0].upper()
+        if not report_service.known_symbol(symbol):
+            raise ValueError(symbol)
+        anchor_ms = parse_anchor_time(args[1])
+        label = args[2][:10] if len(args) > 2 else args[1][:10]
+        if not ANCHOR_LABEL.match(label):
+            raise ValueError(label)
+    except (IndexError, ValueError):
+        await message.reply_text(
+            "Usage: /vwap anchor <SYMBOL> <time> [label]\n"
+            f"SYMBOL: one of {', '.join(report_service.watchlist)}\n"
+            "time: 4h, 2d (ago), 2024-11-05T14:30 (UTC) or epoch seconds\n"
+            "label: up to 10 letters, digits, '.', ':', '-' or '_'")
+        return
+
+    if (vwap_bands.count_anchors(lambda key: key[0] == chat_id) >= MAX_ANCHORS_PER_CHAT
+            and not vwap_bands.anchors(symbol, lambda key: key == (chat_id, label))):
+        await message.reply_text(f"At most {MAX_ANCHORS_PER_CHAT} anchors per chat; remove one with /vwap unanchor.")
+        return
+    try:
+        await vwap_bands.add_anchor(symbol, (chat_id, label), anchor_ms, label)
+    except ValueError as e:
+        await message.reply_text(str(e))
+        return
+    except Exception as e:
+        COMMAND_ERRORS.inc("vwap_anchor")
+        logger.error(f"Error in handle_vwap_anchor: {str(e)}")
+        await message.reply_text(f"Error anchoring VWAP: {str(e)}")
+        return
+
+    _store_anchors(context, chat_id, symbol, label, {"symbol": symbol, "label": label, "time": anchor_ms})
+    started = datetime.fromtimestamp(anchor_ms / 1000, timezone.utc).strftime("%Y-%m-%d %H:%M")
+    await message.reply_text(f"Anchored VWAP '{label}' for {symbol} from {started} UTC.")
+
+
+async def handle_vwap_unanchor(message, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /vwap unanchor <SYMBOL> <label>: remove one of this chat's anchors."""
+    COMMANDS.inc("vwap_unanchor")
+    chat_id = message.chat_id
+    args = context.args or []
+    if len(args) < 2:
+        await message.reply_text("Usage: /vwap unanchor <SYMBOL> <label>")
+        return
+    symbol, label = args[0].upper(), args[1][:10]
+    if not vwap_bands.remove_anchor(symbol, (chat_id, label)):
+        await message.reply_text(f"No anchor '{label}' for {symbol}.")
+        return
+    _store_anchors(context, chat_id, symbol, label)
+    await message.reply_text(f"Removed anchor '{label}' for {symbol}.")
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import signal
+from services.report_service import report_symbols
+from services.shm_feed import ShmFeedWriter
+from services.trade_vwap import TradeVwapEngine
+from services.websocket_service import WebSocketClient
+from utils.logger import configure_levels, logger
+
+# Standalone market-data ingestion for split mode:
+#   python src/ingest.py
+# runs the WebSocket client in its own process and publishes quotes and
+# trade-stream VWAPs into the shared-memory segment named by FEED.name in
+# config.json. The bot (FEED.mode = "shared_memory") reads that segment,
+# so either process can be restarted without stopping the other.
+
+AGGREGATE_INTERVAL = 1.0  # seconds between VWAP/heartbeat publications
+
+
+async def publish_aggregates(writer: ShmFeedWriter, engine: TradeVwapEngine, symbols):
+    while True:
+        for symbol in symbols:
+            writer.publish_vwaps(symbol, engine.stats(symbol))
+        writer.heartbeat()
+        await asyncio.sleep(AGGREGATE_INTERVAL)
+
+
+async def run(config: dict):
+    feed_config = config.get('FEED', {})
+    ws_config = config.get('WEBSOCKET', {})
+    reports_config = config.get('REPORTS', {})
+
+    client = WebSocketClient(stream_url=ws_config.get('url'))
+    for topic, symbols in ws_config.get('subscriptions', {}).items():
+        client.add_subscriptions(topic, symbols)
+    trade_symbols = report_symbols(reports_config.get('symbols'))
+    client.add_subscriptions("trade", trade_symbols)
+    if not ws_config.get('subscriptions', {}).get('bbo'):
+        # Quotes of the report symbols, matching the bot's 24h VWAP figures
+        client.add_subscriptions("bbo", trade_symbols)
+
+    engine = TradeVwapEngine(session_hour=reports_config.get('session_hour_utc', 0))
+    writer = ShmFeedWriter(feed_config.get('name', 'hashkey_feed'), slots=feed_config.get('slots', 64))
+    client.add_handler("trade", engine.on_trade)
+    client.add_handler("bbo", lambda bbo: writer.publish_quote(client.bbo_store.get(bbo["s"])))
+    client.add_connect_handler(engine.reset_coverage)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    tasks = [asyncio.create_task(client.connect(), name="ws_connect"),
+             asyncio.create_task(publish_aggregates(writer, engine, trade_symbols), name="feed_aggregates")]
+    logger.info(f"Ingestion running; publishing to shared memory {writer.name}")
+    try:
+        await stop.wait()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await client.disconnect()
+        writer.close()
+        logger.info("Ingestion stopped.")
+
+
+def main():
+    config_path = os.path.join(os.path.dirname(
+        os.path.abspath(__file__)), '../config/config.json')
+
+    with open(config_path, 'r') as config_file:
+        config = json.load(config_file)
+
+    configure_levels(config.get('LOGGING', {}).get('levels'))
+
+    asyncio.run(run(config))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import itertools
+import logging
+import math
+from bisect import bisect_left, bisect_right
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+ALERTS_FIRED = metrics.counter("alerts_fired_total", "Price alerts fired by kind", "kind")
+
+ABOVE = "above"  # fire once when the price rises to the threshold
+BELOW = "below"  # fire once when the price falls to the threshold
+CROSS_VWAP = "cross_vwap"  # fire whenever the price crosses the 24h VWAP
+
+# Thresholds are inclusive: "> 70000" fires once the price is at or above 70000
+OPERATORS = {">": ABOVE, "above": ABOVE, "<": BELOW, "below": BELOW}
+
+
+class Alert:
+    """One chat's alert on one symbol."""
+
+    __slots__ = ("alert_id", "chat_id", "symbol", "kind", "price")
+
+    def __init__(self, alert_id: int, chat_id, symbol: str, kind: str, price: float = None):
+        self.alert_id = alert_id
+        self.chat_id = chat_id
+        self.symbol = symbol
+        self.kind = kind
+        self.price = price
+
+    def to_dict(self) -> dict:
+        return {"symbol": self.symbol, "kind": self.kind, "price": self.price}
+
+    def describe(self) -> str:
+        if self.kind == CROSS_VWAP:
+            return f"#{self.alert_id} {self.symbol} crosses 24h VWAP"
+        return f"#{self.alert_id} {self.symbol} {'>=' if self.kind == ABOVE else '<='} {self.price:,.8g}"
+
+
+class ThresholdIndex:
+    """Pending one-shot thresholds of one symbol and direction, sorted so that
+    the thresholds a price move crosses are always at the end of the list.
+
+    Keys are stored ascending (thresholds for "below", negated thresholds for
+    "above"); a tick bisects once and pops the crossed tail, so firing k
+    alerts costs O(log n + k) and a tick that crosses nothing costs one
+    comparison, however many alerts are waiting.
+    """
+
+    __slots__ = ("sign", "keys", "alerts")
+
+    def __init__(self, kind: str):
+        self.sign = -1.0 if kind == ABOVE else 1.0
+        self.keys = []
+        self.alerts = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, alert: Alert):
+        key = self.sign * alert.price
+        index = bisect_right(self.keys, key)
+        self.keys.insert(index, key)
+        self.alerts.insert(index, alert)
+
+    def remove(self, alert: Alert) -> bool:
+        key = self.sign * alert.price
+        for index in range(bisect_left(self.keys, key), bisect_right(self.keys, key)):
+            if self.alerts[index] is alert:
+                del self.keys[index]
+                del self.alerts[index]
+                return True
+        return False
+
+    def pop_crossed(self, price: float) -> list:
+        """Remove and return the alerts whose threshold `price` has reached."""
+        keys = self.keys
+        key = self.sign * price
+        if not keys or keys[-1] < key:
+            return []
+        index = bisect_left(keys, key)
+        fired = self.alerts[index:]
+        del keys[index:]
+        del self.alerts[index:]
+        return fired
+
+
+class VwapCrossWatch:
+    """VWAP-cross alerts of one symbol: one side state shared by every chat.
+
+    The side only flips once the price is `hysteresis_bps` beyond the VWAP,
+    so a price hovering at the VWAP does not fire on every tick.
+    """
+
+    __slots__ = ("alerts", "side")
+
+    def __init__(self):
+        self.alerts = {}  # alert_id -> Alert
+        self.side = None  # +1 above the VWAP, -1 below
+
+    def check(self, price: float, vwap: float, hysteresis_bps: float):
+        """Return +1/-1 if this price crossed the VWAP, else None."""
+        band = vwap * hysteresis_bps / 10_000
+        if price > vwap + band:
+            side = 1
+        elif price < vwap - band:
+            side = -1
+        else:
+            return None
+        previous, self.side = self.side, side
+        return side if previous is not None and previous != side else None
+
+
+class AlertEngine:
+    """Price alerts evaluated on every BBO and trade tick.
+
+    Alerts are indexed per symbol: one-shot thresholds in two ThresholdIndex
+    lists (rising and falling) and VWAP-cross alerts in one VwapCrossWatch.
+    A tick therefore only touches the alerts it actually triggers, and the
+    per-tick cost stays flat with hundreds of thousands of alerts waiting.
+    Fired alerts are handed to `notify(chat_id, key, text)` (the
+    NotificationService debounce/quiet-hours path) keyed by alert id, so
+    several alerts of one chat fired within one debounce window are sent
+    together in one message.
+    """
+
+    def __init__(self, bbo_store, notify, vwap_provider=None, on_fired=None, hysteresis_bps: float = 2.0):
+        """
+        Args:
+            bbo_store (BboStore): Source of the latest quotes (a ShmFeedReader in split mode).
+            notify: Function notify(chat_id, key, text) queueing a notification.
+            vwap_provider: Optional function symbol -> 24h VWAP (or None).
+            on_fired: Optional function chat_id -> None, called after one-shot
+                alerts of the chat fired (e.g. to persist the remaining ones).
+            hysteresis_bps (float): Distance from the VWAP that counts as a cross.
+        """
+        self.bbo_store = bbo_store
+        self.notify = notify
+        self.vwap_provider = vwap_provider
+        self.on_fired = on_fired
+        self.hysteresis_bps = hysteresis_bps
+        self._ids = itertools.count(1)
+        self._thresholds = {}  # symbol -> {ABOVE: ThresholdIndex, BELOW: ThresholdIndex}
+        self._vwap_watches = {}  # symbol -> VwapCrossWatch
+        self._by_chat = {}  # chat_id -> {alert_id: Alert}
+
+    # --- alert management ----------------------------------------------
+
+    def add(self, chat_id, symbol: str, kind: str, price: float = None) -> Alert:
+        """
+        Add an alert, or return the chat's identical existing one.
+
+        Raises:
+            ValueError: For an unknown kind or a missing, non-finite or non-positive threshold.
+        """
+        if kind not in (ABOVE, BELOW, CROSS_VWAP):
+            raise ValueError(f"Unknown alert kind: {kind}")
+        if kind != CROSS_VWAP and not (price is not None and math.isfinite(price) and price > 0):
+            raise ValueError("Alert price must be a positive number")
+        alerts = self._by_chat.setdefault(chat_id, {})
+        for alert in alerts.values():
+            if (alert.symbol, alert.kind, alert.price) == (symbol, kind, price):
+                return alert
+        alert = Alert(next(self._ids), chat_id, symbol, kind, price)
+        alerts[alert.alert_id] = alert
+        if kind == CROSS_VWAP:
+            watch = self._vwap_watches.get(symbol)
+            if watch is None:
+                watch = self._vwap_watches[symbol] = VwapCrossWatch()
+            watch.alerts[alert.alert_id] = alert
+        else:
+            indexes = self._thresholds.get(symbol)
+            if indexes is None:
+                indexes = self._thresholds[symbol] = {ABOVE: ThresholdIndex(ABOVE), BELOW: ThresholdIndex(BELOW)}
+            indexes[kind].add(alert)
+        return alert
+
+    def remove(self, chat_id, alert_id: int) -> bool:
+        alert = self._by_chat.get(chat_id, {}).pop(alert_id, None)
+        if alert is None:
+            return False
+        if alert.kind == CROSS_VWAP:
+            watch = self._vwap_watches.get(alert.symbol)
+            if watch is not None:
+                watch.alerts.pop(alert_id, None)
+                if not watch.alerts:
+                    del self._vwap_watches[alert.symbol]
+        else:
+            self._thresholds[alert.symbol][alert.kind].remove(alert)
+        if not self._by_chat[chat_id]:
+            del self._by_chat[chat_id]
+        return True
+
+    def remove_chat(self, chat_id) -> int:
+        """Drop all alerts of a chat; returns how many there were."""
+        alert_ids = list(self._by_chat.get(chat_id, {}))
+        for alert_id in alert_ids:
+            self.remove(chat_id, alert_id)
+        return len(alert_ids)
+
+    def count(self, chat_id) -> int:
+        return len(self._by_chat.get(chat_id, ()))
+
+    def has_alerts(self, symbol: str) -> bool:
+        """True while any chat has an alert on `symbol`."""
+        indexes = self._thresholds.get(symbol)
+        return symbol in self._vwap_watches or (
+            indexes is not None and bool(len(indexes[ABOVE]) or len(indexes[BELOW])))
+
+    def get_alerts(self, chat_id) -> list:
+        return sorted(self._by_chat.get(chat_id, {}).values(), key=lambda alert: alert.alert_id)
+
+    def export_alerts(self, chat_id) -> list:
+        """The chat's alerts in their persisted form."""
+        return [alert.to_dict() for alert in self.get_alerts(chat_id)]
+
+    def __len__(self):
+        return sum(len(alerts) for alerts in self._by_chat.values())
+
+    # --- tick processing -----------------------------------------------
+
+    def on_bbo(self, bbo_data: dict):
+        """WebSocket 'bbo' handler: check the symbol's alerts against the mid price."""
+        symbol = bbo_data.get("s")
+        if symbol not in self._thresholds and symbol not in self._vwap_watches:
+            return
+        quote = self.bbo_store.get(symbol)
+        if quote is None or quote.bid_price <= 0 or quote.ask_price <= 0:
+            return
+        self.on_price(symbol, quote.mid, "mid")
+
+    def on_trade(self, trade: dict):
+        """WebSocket 'trade' handler: check the symbol's alerts against the trade price."""
+        symbol = trade.get("s")
+        if symbol not in self._thresholds and symbol not in self._vwap_watches:
+            return
+        price = float(trade.get("p") or 0)
+        if price > 0:
+            self.on_price(symbol, price, "trade")
+
+    def on_price(self, symbol: str, price: float, source: str = "price"):
+        """Fire the alerts of `symbol` that `price` triggers."""
+        indexes = self._thresholds.get(symbol)
+        if indexes is not None:
+            fired = indexes[ABOVE].pop_crossed(price) + indexes[BELOW].pop_crossed(price)
+            if fired:
+                self._fire_thresholds(fired, price, source)
+
+        watch = self._vwap_watches.get(symbol)
+        if watch is not None and self.vwap_provider is not None:
+            vwap = self.vwap_provider(symbol)
+            side = watch.check(price, vwap, self.hysteresis_bps) if vwap else None
+            if side is not None:
+                direction = "above" if side > 0 else "below"
+                ALERTS_FIRED.inc(CROSS_VWAP, len(watch.alerts))
+                text = f"Alert: {symbol} {source} {price:,.8g} crossed {direction} the 24h VWAP {vwap:,.8g}"
+                for alert in watch.alerts.values():
+                    self.notify(alert.chat_id, ("alert", alert.alert_id), text)
+
+    def _fire_thresholds(self, fired: list, price: float, source: str):
+        chats = set()
+        for alert in fired:
+            chat_alerts = self._by_chat.get(alert.chat_id)
+            if chat_alerts is not None:
+                chat_alerts.pop(alert.alert_id, None)
+                if not chat_alerts:
+                    del self._by_chat[alert.chat_id]
+            ALERTS_FIRED.inc(alert.kind)
+            self.notify(alert.chat_id, ("alert", alert.alert_id),
+                        f"Alert: {alert.symbol} {source} {price:,.8g} reached "
+                        f"{'>=' if alert.kind == ABOVE else '<='} {alert.price:,.8g}")
+            chats.add(alert.chat_id)
+        if self.on_fired is not None:
+            for chat_id in chats:
+                try:
+                    self.on_fired(chat_id)
+                except Exception as e:
+                    logger.error(f"Alert on_fired callback failed for chat {chat_id}: {e}")
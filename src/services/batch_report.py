@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from services.kline_engine import summarize_many
+from services.market_history import market_history
+from services.trade_vwap import trade_vwap
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = metrics.histogram("stage_seconds", "Time spent per processing stage", "stage")
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+BATCH_TIMEFRAMES = ("24h", "7d", "30d")
+
+
+def format_price(value: float) -> str:
+    """Compact price with precision matched to its magnitude."""
+    if value is None:
+        return "n/a"
+    if abs(value) >= 1000:
+        return f"{value:,.0f}"
+    if abs(value) >= 1:
+        return f"{value:,.2f}"
+    return f"{value:.4g}"
+
+
+def _pct(value: float, reference: float) -> str:
+    return f"{(value - reference) / reference * 100:+.1f}%" if reference else "n/a"
+
+
+async def build_batch_report(symbols, live_vwap=trade_vwap) -> list:
+    """
+    Build a compact VWAP table for a whole watchlist.
+
+    The series of every symbol are fetched concurrently (each from its cached
+    history, so normally one incremental request per symbol) and all windows
+    of all symbols are summarized in one summarize_many() pass. The last
+    price is the close of the current bar, so no ticker requests are needed.
+
+    Args:
+        symbols (list): The watchlist, e.g. ["BTCUSD", "ETHUSD", ...].
+        live_vwap: Source of trade-stream VWAPs, preferred for the 24h column.
+
+    Returns:
+        list: HTML message texts, split to fit Telegram's message size limit.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    with STAGE_SECONDS.time("batch_market_data"):
+        results = await asyncio.gather(
+            *(market_history.get_windows(symbol, BATCH_TIMEFRAMES) for symbol in symbols),
+            return_exceptions=True)
+
+    windows, failed = {}, []
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            logger.error(f"Batch report: failed to fetch {symbol}: {result}")
+            failed.append(symbol)
+            continue
+        for name, series in result.items():
+            windows[(symbol, name)] = (series, None)
+
+    with STAGE_SECONDS.time("batch_math"):
+        stats = summarize_many(windows)
+
+    header = f"{'Pair':<9}{'Last':>10}{'VWAP 24h':>10}{'vs':>7}{'VWAP 7d':>10}{'VWAP 30d':>10}"
+    rows = []
+    for symbol in symbols:
+        if symbol in failed:
+            rows.append(f"{symbol:<9}{'n/a':>10}")
+            continue
+        last = stats[(symbol, "24h")]["last_close"]
+        vwap_24h = live_vwap.vwap(symbol, "24h")
+        if vwap_24h is None:
+            vwap_24h = stats[(symbol, "24h")]["vwap"]
+        rows.append(f"{symbol:<9}{format_price(last):>10}{format_price(vwap_24h):>10}{_pct(last, vwap_24h):>7}"
+                    f"{format_price(stats[(symbol, '7d')]['vwap']):>10}{format_price(stats[(symbol, '30d')]['vwap']):>10}")
+
+    # One <pre> table per message, repeating the header on every page
+    messages, page = [], [header]
+    budget = TELEGRAM_MESSAGE_LIMIT - len("<pre></pre>") - 64
+    for row in rows:
+        if sum(len(line) + 1 for line in page) + len(row) + 1 > budget:
+            messages.append(page)
+            page = [header]
+        page.append(row)
+    messages.append(page)
+    return [f"<pre>{chr(10).join(page)}</pre>" for page in messages]
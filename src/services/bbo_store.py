@@ -0,0 +1,191 @@
+import threading
+import time
+from array import array
+from typing import NamedTuple
+import numpy as np
+
+
+class Quote(NamedTuple):
+    """Immutable best bid/offer for one symbol."""
+
+    symbol: str
+    bid_price: float
+    bid_quantity: float
+    ask_price: float
+    ask_quantity: float
+    timestamp: int
+
+    @property
+    def mid(self) -> float:
+        return (self.bid_price + self.ask_price) / 2
+
+    @property
+    def spread(self) -> float:
+        return self.ask_price - self.bid_price
+
+    def as_dict(self) -> dict:
+        return {
+            "bid_price": self.bid_price,
+            "bid_quantity": self.bid_quantity,
+            "ask_price": self.ask_price,
+            "ask_quantity": self.ask_quantity,
+            "timestamp": self.timestamp,
+        }
+
+
+class SymbolBook:
+    """Latest quote and a fixed-size history ring for one symbol.
+
+    Bid, ask, sizes and timestamps are kept in preallocated array('d') rings,
+    so memory per symbol is fixed. A single writer updates the rings under a
+    sequence counter (seqlock): the counter is odd while a write is in
+    progress, and readers retry if it was odd or changed while they read.
+    Readers therefore never block the writer and never see a torn quote.
+    """
+
+    __slots__ = ("symbol", "capacity", "_seq", "_head", "_count",
+                 "_bid", "_bid_size", "_ask", "_ask_size", "_time")
+
+    def __init__(self, symbol: str, capacity: int):
+        self.symbol = symbol
+        self.capacity = capacity
+        self._seq = 0
+        self._head = 0  # index of the next write
+        self._count = 0
+        zeros = bytes(8 * capacity)
+        self._bid = array("d", zeros)
+        self._bid_size = array("d", zeros)
+        self._ask = array("d", zeros)
+        self._ask_size = array("d", zeros)
+        self._time = array("d", zeros)
+
+    def update(self, bid: float, bid_size: float, ask: float, ask_size: float, timestamp: float):
+        self._seq += 1  # odd: write in progress
+        i = self._head
+        self._bid[i] = bid
+        self._bid_size[i] = bid_size
+        self._ask[i] = ask
+        self._ask_size[i] = ask_size
+        self._time[i] = timestamp
+        self._head = (i + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+        self._seq += 1  # even: consistent again
+
+    def latest(self):
+        """Return the latest Quote, or None before the first update."""
+        while True:
+            seq = self._seq
+            if seq & 1:
+                time.sleep(0)  # let the writer finish
+                continue
+            if self._count == 0:
+                return None
+            i = (self._head - 1) % self.capacity
+            quote = Quote(self.symbol, self._bid[i], self._bid_size[i], self._ask[i],
+                          self._ask_size[i], int(self._time[i]))
+            if self._seq == seq:
+                return quote
+            time.sleep(0)
+
+    def history(self, last: int = None) -> dict:
+        """Return copies of the most recent `last` entries (oldest first) as numpy arrays."""
+        while True:
+            seq = self._seq
+            if seq & 1:
+                time.sleep(0)  # let the writer finish
+                continue
+            n = self._count if last is None else min(last, self._count)
+            start = (self._head - n) % self.capacity
+            columns = {}
+            for name, ring in (("bid", self._bid), ("bid_size", self._bid_size), ("ask", self._ask),
+                               ("ask_size", self._ask_size), ("time", self._time)):
+                view = np.frombuffer(ring, dtype=np.float64)
+                if start + n <= self.capacity:
+                    columns[name] = view[start:start + n].copy()
+                else:
+                    columns[name] = np.concatenate((view[start:], view[:start + n - self.capacity]))
+            if self._seq == seq:
+                return columns
+            time.sleep(0)
+
+
+class BboStore:
+    """Per-symbol BBO state shared between the WebSocket writer and readers.
+
+    The symbol table is copy-on-write: adding a symbol replaces the dict,
+    so readers on other threads can iterate a stable table without locks.
+    """
+
+    def __init__(self, history_size: int = 1024):
+        self.history_size = history_size
+        self._books = {}
+        self._lock = threading.Lock()  # only taken when a new symbol appears
+
+    def _book(self, symbol: str) -> SymbolBook:
+        book = self._books.get(symbol)
+        if book is None:
+            with self._lock:
+                book = self._books.get(symbol)
+                if book is None:
+                    book = SymbolBook(symbol, self.history_size)
+                    books = dict(self._books)
+                    books[symbol] = book
+                    self._books = books
+        return book
+
+    def update(self, symbol: str, bid, bid_size, ask, ask_size, timestamp):
+        """Record a BBO tick. Values may be numeric strings as sent by the exchange."""
+        self._book(symbol).update(float(bid or 0), float(bid_size or 0), float(ask or 0),
+                                  float(ask_size or 0), float(timestamp or 0))
+
+    def get(self, symbol: str):
+        book = self._books.get(symbol)
+        return book.latest() if book is not None else None
+
+    def snapshot(self) -> dict:
+        """Return {symbol: Quote} of the latest quotes; the Quotes are immutable."""
+        quotes = {}
+        for symbol, book in self._books.items():
+            quote = book.latest()
+            if quote is not None:
+                quotes[symbol] = quote
+        return quotes
+
+    def symbols(self) -> list:
+        return list(self._books)
+
+    def spread_stats(self, symbol: str, last: int = None) -> dict:
+        """
+        Spread and mid statistics over a symbol's recent quote history.
+
+        Args:
+            symbol (str): The trading pair symbol.
+            last (int): Number of most recent ticks to use (default: whole ring).
+
+        Returns:
+            dict: Tick count, mean/min/max spread, mean spread in bps and
+            mean/min/max mid, or None if the symbol has no quotes.
+        """
+        book = self._books.get(symbol)
+        if book is None:
+            return None
+        history = book.history(last)
+        if len(history["bid"]) == 0:
+            return None
+        spread = history["ask"] - history["bid"]
+        mid = (history["ask"] + history["bid"]) / 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            spread_bps = np.where(mid > 0, spread / mid * 10_000, 0)
+        return {
+            "ticks": len(spread),
+            "spread_mean": float(spread.mean()),
+            "spread_min": float(spread.min()),
+            "spread_max": float(spread.max()),
+            "spread_bps_mean": float(spread_bps.mean()),
+            "mid_mean": float(mid.mean()),
+            "mid_min": float(mid.min()),
+            "mid_max": float(mid.max()),
+            "first_time": int(history["time"][0]),
+            "last_time": int(history["time"][-1]),
+        }
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from utils.metrics import metrics
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_SEND = metrics.histogram("telegram_send_seconds", "Telegram sendMessage latency")
+TELEGRAM_SENDS = metrics.counter("telegram_sends_total", "Telegram sends by outcome", "outcome")
+
+
+class Broadcaster:
+    """Concurrent, rate-limited fan-out of Telegram messages.
+
+    Sends run concurrently up to `max_concurrency`, gated by a global token
+    bucket (Telegram allows about 30 messages/second per bot) and a per-chat
+    bucket (about 1 message/second per chat). A RetryAfter pauses the global
+    bucket for the requested time and the message is retried; chats that
+    blocked the bot or no longer exist are reported to `on_blocked` so they
+    can be pruned from the subscriber list.
+    """
+
+    PRUNE_INTERVAL = 60.0  # seconds between sweeps of idle per-chat buckets
+
+    def __init__(self, bot, max_concurrency: int = 20, global_rate: float = 30,
+                 per_chat_rate: float = 1, max_retries: int = 3, on_blocked=None):
+        self.bot = bot
+        self.max_retries = max_retries
+        self.on_blocked = on_blocked
+        self.per_chat_rate = per_chat_rate
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_buckets = {}
+        self._pruned_at = time.monotonic()
+        self.waiting = 0  # sends queued behind the concurrency limit
+        # Metrics
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.pruned = 0
+        self.send_latencies = deque(maxlen=1000)  # seconds per successful send
+        self.last_fanout = None  # summary of the most recent broadcast()
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+        return bucket
+
+    def _prune_idle_buckets(self):
+        now = self._pruned_at = time.monotonic()
+        for chat_id in [c for c, bucket in self._chat_buckets.items() if bucket.idle(now)]:
+            del self._chat_buckets[chat_id]
+
+    async def send(self, chat_id, text: str, **kwargs) -> bool:
+        """
+        Send one message, honouring rate limits and retrying transient errors.
+
+        Returns:
+            bool: True if the message was delivered.
+        """
+        if time.monotonic() - self._pruned_at >= self.PRUNE_INTERVAL:
+            # Single sends (alerts, digests) never reach broadcast()'s sweep
+            self._prune_idle_buckets()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            chat_bucket = self._chat_bucket(chat_id)
+            for attempt in range(self.max_retries + 1):
+                await chat_bucket.acquire()
+                await self._global_bucket.acquire()
+                started = time.monotonic()
+                try:
+                    await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                    latency = time.monotonic() - started
+                    self.send_latencies.append(latency)
+                    TELEGRAM_SEND.observe(latency)
+                    TELEGRAM_SENDS.inc("sent")
+                    self.sent += 1
+                    return True
+                except RetryAfter as e:
+                    # Flood control applies to the whole bot: back off globally
+                    logger.warning(f"Flood control, retrying chat_id {chat_id} in {e.retry_after}s")
+                    self._global_bucket.pause(float(e.retry_after))
+                    TELEGRAM_SENDS.inc("retry_after")
+                    self.retried += 1
+                except Forbidden as e:
+                    await self._blocked(chat_id, e)
+                    return False
+                except BadRequest as e:
+                    if "chat not found" in str(e).lower():
+                        await self._blocked(chat_id, e)
+                    else:
+                        logger.error(f"Failed to send message to chat_id {chat_id}: {e}")
+                        TELEGRAM_SENDS.inc("failed")
+                        self.failed += 1
+                    return False
+                except (TimedOut, NetworkError) as e:
+                    logger.warning(f"Transient error sending to chat_id {chat_id}: {e}")
+                    TELEGRAM_SENDS.inc("retry_network")
+                    self.retried += 1
+                    await asyncio.sleep(min(2 ** attempt, 30))
+                except Exception as e:
+                    logger.error(f"Failed to send message to chat_id {chat_id}: {e}")
+                    TELEGRAM_SENDS.inc("failed")
+                    self.failed += 1
+                    return False
+            logger.error(f"Giving up on chat_id {chat_id} after {self.max_retries} retries")
+            TELEGRAM_SENDS.inc("failed")
+            self.failed += 1
+            return False
+        finally:
+            self._semaphore.release()
+
+    async def _blocked(self, chat_id, error):
+        logger.info(f"Pruning chat_id {chat_id}: {error}")
+        TELEGRAM_SENDS.inc("blocked")
+        self.pruned += 1
+        self._chat_buckets.pop(chat_id, None)
+        if self.on_blocked is not None:
+            result = self.on_blocked(chat_id)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def broadcast(self, chat_ids, text: str, **kwargs) -> dict:
+        """
+        Send the same message to many chats concurrently.
+
+        Returns:
+            dict: Fan-out summary with recipients, delivered count and duration.
+        """
+        chat_ids = list(chat_ids)
+        started = time.monotonic()
+        results = await asyncio.gather(*(self.send(chat_id, text, **kwargs) for chat_id in chat_ids))
+        self._prune_idle_buckets()
+        self.last_fanout = {
+            "recipients": len(chat_ids),
+            "delivered": sum(1 for delivered in results if delivered),
+            "seconds": time.monotonic() - started,
+        }
+        logger.info(f"Broadcast delivered to {self.last_fanout['delivered']}/{len(chat_ids)} chats "
+                    f"in {self.last_fanout['seconds']:.2f}s")
+        return self.last_fanout
+
+    def metrics(self) -> dict:
+        latencies = sorted(self.send_latencies)
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "pruned": self.pruned,
+            "send_latency_p50": percentile(0.5),
+            "send_latency_p99": percentile(0.99),
+            "last_fanout": self.last_fanout,
+        }
@@ -1,12 +1,43 @@
+import asyncio
+import time
+from collections import deque
+import aiohttp
+import numpy as np
 import requests
 import logging
+from urllib.parse import urlsplit
+from services.kline_series import INTERVAL_MS, KlineSeries
+from services.request_coalescer import RequestCoalescer
+from services.request_scheduler import request_priority, request_scheduler
+from utils.json_codec import loads
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+REST_LATENCY = metrics.histogram("rest_request_seconds", "Hashkey REST request latency by endpoint", "endpoint")
+REST_PARSE = metrics.histogram("rest_parse_seconds", "Hashkey REST JSON decode time by endpoint", "endpoint")
+REST_ERRORS = metrics.counter("rest_errors_total", "Failed Hashkey REST requests by endpoint", "endpoint")
+STAGE_SECONDS = metrics.histogram("stage_seconds", "Time spent per processing stage", "stage")
+
 class HashkeyAPI:
 
     BASE_URL = "https://api-pro.hashkey.com"
 
+    # Async client settings: one pooled session is shared by every coroutine
+    REQUEST_TIMEOUT = 10  # seconds, applied per request
+    POOL_SIZE = 20  # max simultaneous connections to the exchange
+    KEEPALIVE_TIMEOUT = 30  # seconds an idle connection is kept open
+
+    # Kline backfill: long ranges are split into pages fetched concurrently
+    MAX_KLINE_LIMIT = 1000  # Hashkey's maximum bars per /quote/v1/klines request
+    BACKFILL_CONCURRENCY = 4  # pages in flight at once
+
+    # Identical concurrent GETs share one request; results are reused briefly
+    COALESCE_TTL = 1.0  # seconds
+
+    _session = None
+    _coalescer = RequestCoalescer(ttl=COALESCE_TTL)
+
     def __init__(self, api_key, api_secret):
         self.api_key = api_key
         self.api_secret = api_secret
@@ -27,7 +58,124 @@ class HashkeyAPI:
             return response.json()
         else:
             response.raise_for_status()
-    
+
+    @classmethod
+    async def get_session(cls) -> aiohttp.ClientSession:
+        """Return the shared aiohttp session, creating it on first use.
+
+        The session must be created inside a running event loop, so it is
+        built lazily by the first async call rather than at import time.
+        """
+        if cls._session is None or cls._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=cls.POOL_SIZE, keepalive_timeout=cls.KEEPALIVE_TIMEOUT)
+            cls._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=cls.REQUEST_TIMEOUT))
+        return cls._session
+
+    @classmethod
+    async def close_session(cls) -> None:
+        """Close the shared aiohttp session and release its pooled connections."""
+        if cls._session is not None and not cls._session.closed:
+            await cls._session.close()
+        cls._session = None
+
+    @staticmethod
+    async def _get_json_async(endpoint: str, params: dict, timeout: float = None):
+        """GET an endpoint through the shared session and return the decoded JSON.
+
+        Concurrent calls with the same endpoint and params are coalesced into a
+        single request, and the decoded result is reused for COALESCE_TTL
+        seconds. Callers must treat the returned JSON as read-only. The request
+        itself goes through the shared RequestScheduler (rate limit, priority
+        lane of the calling task, retries and circuit breaking).
+        """
+        key = (endpoint, tuple(sorted(params.items())))
+        path = urlsplit(endpoint).path
+        return await HashkeyAPI._coalescer.fetch(
+            key, lambda: request_scheduler.run(
+                path, lambda: HashkeyAPI._fetch_json_async(endpoint, params, timeout)))
+
+    @staticmethod
+    async def _fetch_json_async(endpoint: str, params: dict, timeout: float = None):
+        session = await HashkeyAPI.get_session()
+        request_timeout = aiohttp.ClientTimeout(
+            total=timeout if timeout is not None else HashkeyAPI.REQUEST_TIMEOUT)
+        path = urlsplit(endpoint).path
+        try:
+            with REST_LATENCY.time(path):
+                async with session.get(endpoint, params=params, timeout=request_timeout) as response:
+                    response.raise_for_status()
+                    body = await response.read()
+        except Exception:
+            REST_ERRORS.inc(path)
+            raise
+        with REST_PARSE.time(path):
+            return loads(body)
+
+    @staticmethod
+    def _parse_ticker(data) -> dict:
+        # If the response is a list, extract the first element
+        if isinstance(data, list) and len(data) > 0:
+            data = data[0]  # Extract the first element
+
+        # Extract relevant data from the parsed response
+        price_change_data = {
+            "timestamp": int(data.get("t", 0)),
+            "symbol": data.get("s", ""),
+            "last_price": float(data.get("c", 0)),
+            "high_price": float(data.get("h", 0)),
+            "low_price": float(data.get("l", 0)),
+            "opening_price": float(data.get("o", 0)),
+            "bid_price": float(data.get("b", 0)),
+            "ask_price": float(data.get("a", 0)),
+            "base_volume": float(data.get("v", 0)),
+            "quote_volume": float(data.get("qv", 0))
+        }
+        return price_change_data
+
+    @staticmethod
+    def _empty_klines(symbol: str, interval: str, series: KlineSeries) -> bool:
+        if len(series) == 0:
+            logger.error(f"No Kline data available for {symbol} ({interval}).")
+            return True
+        return False
+
+    @staticmethod
+    def _klines_params(symbol: str, interval: str, limit: int,
+                       start_time: int = None, end_time: int = None) -> dict:
+        params = {"symbol": symbol, "interval": interval, "limit": limit}
+        if start_time is not None:
+            params["startTime"] = int(start_time)
+        if end_time is not None:
+            params["endTime"] = int(end_time)
+        return params
+
+    @staticmethod
+    def get_klines(symbol: str, interval: str = "3m", limit: int = 480,
+                   start_time: int = None, end_time: int = None) -> KlineSeries:
+        """
+        Fetch Kline bars once and parse them into a KlineSeries.
+
+        Args:
+            symbol (str): The trading pair symbol (e.g., "ETHUSDT").
+            interval (str): The interval for Kline data (e.g., "1m", "5m", "1h").
+            limit (int): The number of Kline bars to fetch (max 1000).
+            start_time (int): Optional open time in ms of the first bar to return.
+            end_time (int): Optional open time in ms of the last bar to return.
+
+        Returns:
+            KlineSeries: The parsed bars, shared by every aggregation on them.
+        """
+        endpoint = f"{HashkeyAPI.BASE_URL}/quote/v1/klines"
+        params = HashkeyAPI._klines_params(symbol, interval, limit, start_time, end_time)
+        response = requests.get(endpoint, params=params)
+        response.raise_for_status()
+        series = KlineSeries.from_klines(symbol, interval, response.json())
+        HashkeyAPI._empty_klines(symbol, interval, series)
+        return series
+
     @staticmethod
     def get_vwap(symbol: str, interval: str = "3m", limit: int = 480) -> float:
         """
@@ -41,28 +189,7 @@ class HashkeyAPI:
         Returns:
             float: The calculated VWAP value.
         """
-        # Fetch Kline data using the specified interval and limit
-        endpoint = f"{HashkeyAPI.BASE_URL}/quote/v1/klines"
-        params = {"symbol": symbol, "interval": interval, "limit": limit}
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        kline_data = response.json()
-
-        # Ensure Kline data is available
-        if not kline_data or len(kline_data) == 0:
-            logger.error("No Kline data available for VWAP calculation.")
-            return 0
-
-        # Calculate VWAP using Kline data
-        total_volume = 0
-        total_price_volume = 0
-        for kline in kline_data:
-            price = float(kline[4])  # Close price
-            volume = float(kline[5])  # Base asset volume
-            total_volume += volume
-            total_price_volume += price * volume
-
-        return total_price_volume / total_volume if total_volume > 0 else 0
+        return HashkeyAPI.get_klines(symbol, interval, limit).vwap()
     
     @staticmethod
     def get_twap(symbol: str, interval: str = "3m", limit: int = 480) -> float:
@@ -79,27 +206,7 @@ class HashkeyAPI:
         Returns:
             float: The calculated TWAP value.
         """
-        endpoint = f"{HashkeyAPI.BASE_URL}/quote/v1/klines"
-        params = {"symbol": symbol, "interval": interval, "limit": limit}
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        kline_data = response.json()
-
-        if not kline_data or len(kline_data) == 0:
-            logger.error("No Kline data available for TWAP calculation.")
-            return 0
-
-        total_price = 0.0
-        count = 0
-        for kline in kline_data:
-            try:
-                price = float(kline[4])  # Close price
-            except (IndexError, TypeError, ValueError):
-                continue
-            total_price += price
-            count += 1
-
-        return total_price / count if count > 0 else 0
+        return HashkeyAPI.get_klines(symbol, interval, limit).twap()
 
     @staticmethod
     def get_24hr_ticker_price_change(symbol: str) -> dict:
@@ -111,22 +218,104 @@ class HashkeyAPI:
         
         # Parse the JSON response
         data = response.json()
-        
-        # If the response is a list, extract the first element
-        if isinstance(data, list) and len(data) > 0:
-            data = data[0]  # Extract the first element
-        
-        # Extract relevant data from the parsed response
-        price_change_data = {
-            "timestamp": int(data.get("t", 0)),
-            "symbol": data.get("s", ""),
-            "last_price": float(data.get("c", 0)),
-            "high_price": float(data.get("h", 0)),
-            "low_price": float(data.get("l", 0)),
-            "opening_price": float(data.get("o", 0)),
-            "bid_price": float(data.get("b", 0)),
-            "ask_price": float(data.get("a", 0)),
-            "base_volume": float(data.get("v", 0)),
-            "quote_volume": float(data.get("qv", 0))
-        }
-        return price_change_data
+        return HashkeyAPI._parse_ticker(data)
+
+    @staticmethod
+    async def get_klines_async(symbol: str, interval: str = "3m", limit: int = 480,
+                               start_time: int = None, end_time: int = None) -> KlineSeries:
+        """Non-blocking variant of get_klines using the shared aiohttp session."""
+        endpoint = f"{HashkeyAPI.BASE_URL}/quote/v1/klines"
+        params = HashkeyAPI._klines_params(symbol, interval, limit, start_time, end_time)
+        kline_data = await HashkeyAPI._get_json_async(endpoint, params)
+        with STAGE_SECONDS.time("kline_parse"):
+            series = KlineSeries.from_klines(symbol, interval, kline_data)
+        HashkeyAPI._empty_klines(symbol, interval, series)
+        return series
+
+    @staticmethod
+    async def iter_kline_pages(symbol: str, interval: str, start_time: int, end_time: int = None,
+                               concurrency: int = None, priority: int = None):
+        """
+        Yield every bar opened in [start_time, end_time] as KlineSeries pages in time order.
+
+        The range is split into startTime/endTime pages of at most
+        MAX_KLINE_LIMIT bars. Up to `concurrency` pages are fetched ahead of
+        the consumer, so memory stays bounded by a few pages however long the
+        range is. Pages are deduplicated by open time, also across page
+        boundaries.
+
+        Args:
+            symbol (str): The trading pair symbol (e.g., "BTCUSD").
+            interval (str): The bar interval (e.g., "1m", "3m", "1h").
+            start_time (int): First open time in milliseconds.
+            end_time (int): Last open time in milliseconds (default: now).
+            concurrency (int): Pages in flight (default: BACKFILL_CONCURRENCY).
+            priority (int): Request scheduler lane for the page requests
+                (default: the caller's lane).
+        """
+        interval_ms = INTERVAL_MS[interval]
+        end_time = int(end_time if end_time is not None else time.time() * 1000)
+        first = -(-int(start_time) // interval_ms) * interval_ms
+        page_ms = HashkeyAPI.MAX_KLINE_LIMIT * interval_ms
+        page_starts = iter(range(first, end_time + 1, page_ms))
+        concurrency = max(1, concurrency or HashkeyAPI.BACKFILL_CONCURRENCY)
+
+        def fetch(page_start: int) -> asyncio.Task:
+            # The task copies the context, and with it the scheduler lane, when created
+            token = request_priority.set(priority) if priority is not None else None
+            try:
+                return asyncio.ensure_future(HashkeyAPI.get_klines_async(
+                    symbol, interval, limit=HashkeyAPI.MAX_KLINE_LIMIT, start_time=page_start,
+                    end_time=min(end_time, page_start + page_ms - interval_ms)))
+            finally:
+                if token is not None:
+                    request_priority.reset(token)
+
+        pending = deque()
+        last_open_time = -np.inf
+        try:
+            for page_start in page_starts:
+                pending.append(fetch(page_start))
+                if len(pending) >= concurrency:
+                    break
+            while pending:
+                page = await pending.popleft()
+                next_start = next(page_starts, None)
+                if next_start is not None:
+                    pending.append(fetch(next_start))
+                page = page.deduplicated().since(last_open_time + 1)
+                if len(page):
+                    last_open_time = page.open_times[-1]
+                    yield page
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    async def backfill_klines(symbol: str, interval: str, start_time: int, end_time: int = None,
+                              concurrency: int = None, priority: int = None) -> KlineSeries:
+        """Fetch an arbitrary time range of bars with concurrent paginated requests."""
+        pages = [page.to_matrix() async for page in HashkeyAPI.iter_kline_pages(
+            symbol, interval, start_time, end_time, concurrency, priority)]
+        matrix = np.concatenate(pages) if pages else ()
+        return KlineSeries.from_matrix(symbol, interval, matrix)
+
+    @staticmethod
+    async def get_vwap_async(symbol: str, interval: str = "3m", limit: int = 480) -> float:
+        """Non-blocking variant of get_vwap using the shared aiohttp session."""
+        series = await HashkeyAPI.get_klines_async(symbol, interval, limit)
+        return series.vwap()
+
+    @staticmethod
+    async def get_twap_async(symbol: str, interval: str = "3m", limit: int = 480) -> float:
+        """Non-blocking variant of get_twap using the shared aiohttp session."""
+        series = await HashkeyAPI.get_klines_async(symbol, interval, limit)
+        return series.twap()
+
+    @staticmethod
+    async def get_24hr_ticker_price_change_async(symbol: str) -> dict:
+        """Non-blocking variant of get_24hr_ticker_price_change."""
+        endpoint = f"{HashkeyAPI.BASE_URL}/quote/v1/ticker/24hr"
+        params = {"symbol": symbol}
+        data = await HashkeyAPI._get_json_async(endpoint, params)
+        return HashkeyAPI._parse_ticker(data)
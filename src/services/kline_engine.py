@@ -0,0 +1,93 @@
+import logging
+import numpy as np
+from services.kline_series import KlineSeries
+
+logger = logging.getLogger(__name__)
+
+# Statistics produced for every (symbol, window) by the aggregation engine
+STAT_FIELDS = (
+    "bars", "vwap", "twap", "typical_vwap", "high", "low", "range", "range_pct",
+    "volume", "mean_volume", "max_volume", "first_open", "last_close",
+)
+
+
+def summarize(series: KlineSeries, bars: int = None) -> dict:
+    """
+    Compute the window statistics for a single series.
+
+    Args:
+        series (KlineSeries): The parsed Kline bars.
+        bars (int): Optional number of most recent bars to aggregate.
+
+    Returns:
+        dict: One value per entry of STAT_FIELDS.
+    """
+    return summarize_many({None: (series, bars)})[None]
+
+
+def summarize_many(windows: dict) -> dict:
+    """
+    Compute window statistics for many symbols and windows in one batched pass.
+
+    Every window is laid out as a row of a padded (windows x bars) float64
+    matrix with zero weight on padding, so all statistics are a handful of
+    vectorized reductions regardless of how many pairs are in the report.
+
+    Args:
+        windows (dict): Maps any hashable key (e.g. (symbol, "7d")) to a
+            (KlineSeries, bars) tuple. `bars` may be None for the whole series.
+
+    Returns:
+        dict: Maps each key to a dict with one value per entry of STAT_FIELDS.
+    """
+    keys = list(windows)
+    if not keys:
+        return {}
+
+    tails = []
+    for key in keys:
+        series, bars = windows[key]
+        tails.append(series if bars is None else series.tail(bars))
+    lengths = np.array([len(tail) for tail in tails], dtype=np.int64)
+    width = max(1, int(lengths.max()))
+
+    # Right-align each window so the most recent bar is in the last column
+    closes = np.zeros((len(keys), width))
+    highs = np.full((len(keys), width), -np.inf)
+    lows = np.full((len(keys), width), np.inf)
+    volumes = np.zeros((len(keys), width))
+    opens = np.zeros(len(keys))
+    for row, tail in enumerate(tails):
+        n = len(tail)
+        if n == 0:
+            continue
+        closes[row, width - n:] = tail.closes
+        highs[row, width - n:] = tail.highs
+        lows[row, width - n:] = tail.lows
+        volumes[row, width - n:] = tail.volumes
+        opens[row] = tail.opens[0]
+    valid = np.arange(width) >= (width - lengths)[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total_volume = volumes.sum(axis=1)
+        typical = np.where(valid, (highs + lows + closes) / 3, 0)
+        vwap = np.where(total_volume > 0, (closes * volumes).sum(axis=1) / total_volume, 0)
+        typical_vwap = np.where(total_volume > 0, (typical * volumes).sum(axis=1) / total_volume, 0)
+        twap = np.where(lengths > 0, closes.sum(axis=1) / lengths, 0)
+        high = np.where(lengths > 0, highs.max(axis=1), 0)
+        low = np.where(lengths > 0, lows.min(axis=1), 0)
+        price_range = high - low
+        range_pct = np.where(low > 0, price_range / low * 100, 0)
+        mean_volume = np.where(lengths > 0, total_volume / lengths, 0)
+        max_volume = volumes.max(axis=1)
+        last_close = closes[:, -1]
+
+    columns = (lengths, vwap, twap, typical_vwap, high, low, price_range, range_pct,
+               total_volume, mean_volume, max_volume, opens, last_close)
+    results = {}
+    for row, key in enumerate(keys):
+        stats = {field: float(column[row]) for field, column in zip(STAT_FIELDS, columns)}
+        stats["bars"] = int(lengths[row])
+        results[key] = stats
+    return results
+
@@ -0,0 +1,137 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bar length in milliseconds for the Kline intervals supported by Hashkey
+INTERVAL_MS = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 60 * 60_000,
+    "2h": 2 * 60 * 60_000,
+    "4h": 4 * 60 * 60_000,
+    "6h": 6 * 60 * 60_000,
+    "8h": 8 * 60 * 60_000,
+    "12h": 12 * 60 * 60_000,
+    "1d": 24 * 60 * 60_000,
+    "1w": 7 * 24 * 60 * 60_000,
+}
+
+
+class KlineSeries:
+    """Parsed Kline bars for one (symbol, interval, limit) fetch.
+
+    The raw exchange payload is parsed once into contiguous float64 columns
+    so that VWAP, TWAP, high/low and volume can all be computed as vectorized
+    reductions over the same in-memory series.
+    """
+
+    # Column positions in a Hashkey Kline row
+    OPEN_TIME = 0
+    OPEN = 1
+    HIGH = 2
+    LOW = 3
+    CLOSE = 4
+    VOLUME = 5
+    COLUMNS = 6
+
+    def __init__(self, symbol: str, interval: str, open_times=(), opens=(),
+                 highs=(), lows=(), closes=(), volumes=()):
+        self.symbol = symbol
+        self.interval = interval
+        self.open_times = np.ascontiguousarray(open_times, dtype=np.float64)
+        self.opens = np.ascontiguousarray(opens, dtype=np.float64)
+        self.highs = np.ascontiguousarray(highs, dtype=np.float64)
+        self.lows = np.ascontiguousarray(lows, dtype=np.float64)
+        self.closes = np.ascontiguousarray(closes, dtype=np.float64)
+        self.volumes = np.ascontiguousarray(volumes, dtype=np.float64)
+
+    @classmethod
+    def from_matrix(cls, symbol: str, interval: str, matrix: np.ndarray) -> "KlineSeries":
+        """Build a series from an (n, 6) float64 array of time/OHLC/volume rows."""
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, cls.COLUMNS)
+        return cls(symbol, interval, *(matrix[:, column] for column in range(cls.COLUMNS)))
+
+    @classmethod
+    def from_klines(cls, symbol: str, interval: str, kline_data: list) -> "KlineSeries":
+        """
+        Build a series from the JSON rows returned by /quote/v1/klines.
+
+        Args:
+            symbol (str): The trading pair symbol (e.g., "ETHUSDT").
+            interval (str): The interval of the bars (e.g., "1m", "5m", "1h").
+            kline_data (list): Kline rows as returned by the exchange.
+
+        Returns:
+            KlineSeries: The parsed series. Malformed rows are skipped.
+        """
+        if not kline_data:
+            return cls(symbol, interval)
+        try:
+            # Fast path: numpy converts the numeric strings of every row in one call
+            matrix = np.array([kline[:cls.COLUMNS] for kline in kline_data], dtype=np.float64)
+        except (IndexError, TypeError, ValueError):
+            matrix = np.array(cls._valid_rows(kline_data), dtype=np.float64)
+        return cls.from_matrix(symbol, interval, matrix)
+
+    @classmethod
+    def _valid_rows(cls, kline_data: list) -> list:
+        rows = []
+        for kline in kline_data:
+            try:
+                row = [float(value) for value in kline[:cls.COLUMNS]]
+            except (TypeError, ValueError):
+                continue
+            if len(row) == cls.COLUMNS:
+                rows.append(row)
+        return rows
+
+    def to_matrix(self) -> np.ndarray:
+        """Return the bars as an (n, 6) float64 array of time/OHLC/volume rows."""
+        return np.column_stack((self.open_times, self.opens, self.highs,
+                                self.lows, self.closes, self.volumes))
+
+    def __len__(self):
+        return len(self.closes)
+
+    def tail(self, bars: int) -> "KlineSeries":
+        """Return a view of the last `bars` bars (no copy)."""
+        start = max(0, len(self) - bars)
+        return KlineSeries(self.symbol, self.interval, self.open_times[start:], self.opens[start:],
+                           self.highs[start:], self.lows[start:], self.closes[start:],
+                           self.volumes[start:])
+
+    def since(self, open_time: float) -> "KlineSeries":
+        """Return a view of the bars opened at or after `open_time` (no copy)."""
+        start = int(np.searchsorted(self.open_times, open_time, side="left"))
+        return self.tail(len(self) - start)
+
+    def deduplicated(self) -> "KlineSeries":
+        """Return the bars sorted by open time with one bar per open time (the last one seen)."""
+        if len(self) < 2 or np.all(np.diff(self.open_times) > 0):
+            return self
+        # np.unique keeps the first occurrence; reverse so the latest copy wins
+        reversed_times = self.open_times[::-1]
+        _, first = np.unique(reversed_times, return_index=True)
+        return KlineSeries.from_matrix(self.symbol, self.interval, self.to_matrix()[len(self) - 1 - first])
+
+    def vwap(self) -> float:
+        """Volume-weighted average of close prices (0 when there is no volume)."""
+        total_volume = self.volumes.sum()
+        return float(np.dot(self.closes, self.volumes) / total_volume) if total_volume > 0 else 0
+
+    def twap(self) -> float:
+        """Time-weighted average of close prices (uniform bars: simple mean)."""
+        return float(self.closes.mean()) if len(self) else 0
+
+    def high(self) -> float:
+        return float(self.highs.max()) if len(self) else 0
+
+    def low(self) -> float:
+        return float(self.lows.min()) if len(self) else 0
+
+    def volume(self) -> float:
+        return float(self.volumes.sum())
@@ -0,0 +1,115 @@
+import logging
+import os
+import time
+import numpy as np
+from services.kline_series import INTERVAL_MS, KlineSeries
+
+logger = logging.getLogger(__name__)
+
+
+class KlineStore:
+    """Append-only on-disk store of closed Kline bars per (symbol, interval).
+
+    Each file is a flat log of little-endian float64 records of six columns
+    (open time, open, high, low, close, volume). Loading memory-maps the file,
+    so a warm restart reads bars back without any parsing. Only closed bars
+    are written; the still-forming bar is always refetched from the exchange.
+    """
+
+    RECORD_DTYPE = np.dtype("<f8")
+    RECORD_SIZE = KlineSeries.COLUMNS * RECORD_DTYPE.itemsize
+
+    def __init__(self, data_dir: str, max_bars: int = None):
+        """
+        Args:
+            data_dir (str): Directory holding the kline files (created if missing).
+            max_bars (int): Bars to retain per file; older bars are dropped on
+                compaction, which runs when a file grows past twice this size.
+        """
+        self.data_dir = data_dir
+        self.max_bars = max_bars
+        self._last_saved = {}
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.data_dir, f"{symbol}_{interval}.f64")
+
+    def _map(self, path: str):
+        """Memory-map a kline file as an (n, 6) array, dropping a torn last record."""
+        size = os.path.getsize(path)
+        usable = size - size % self.RECORD_SIZE
+        if usable != size:
+            logger.warning(f"Truncating partial record at the end of {path}")
+            with open(path, "r+b") as f:
+                f.truncate(usable)
+        if usable == 0:
+            return np.empty((0, KlineSeries.COLUMNS))
+        return np.memmap(path, dtype=self.RECORD_DTYPE, mode="r").reshape(-1, KlineSeries.COLUMNS)
+
+    def load(self, symbol: str, interval: str, bars: int = None) -> KlineSeries:
+        """
+        Load the most recent persisted bars for a symbol.
+
+        Args:
+            symbol (str): The trading pair symbol (e.g., "BTCUSD").
+            interval (str): The interval of the bars (e.g., "3m").
+            bars (int): Optional number of most recent bars to return.
+
+        Returns:
+            KlineSeries: The stored bars (empty when nothing has been saved).
+        """
+        path = self._path(symbol, interval)
+        if not os.path.exists(path):
+            return KlineSeries(symbol, interval)
+        records = self._map(path)
+        if len(records):
+            self._last_saved[(symbol, interval)] = float(records[-1, KlineSeries.OPEN_TIME])
+        if bars is not None:
+            records = records[-bars:]
+        logger.info(f"Loaded {len(records)} {interval} bars for {symbol} from {path}")
+        return KlineSeries.from_matrix(symbol, interval, records)
+
+    def append(self, series: KlineSeries, now_ms: int = None) -> int:
+        """
+        Append the closed bars of a series that are newer than the last saved bar.
+
+        Returns:
+            int: The number of bars written.
+        """
+        if len(series) == 0:
+            return 0
+        key = (series.symbol, series.interval)
+        path = self._path(*key)
+        if key not in self._last_saved and os.path.exists(path):
+            records = self._map(path)
+            if len(records):
+                self._last_saved[key] = float(records[-1, KlineSeries.OPEN_TIME])
+
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        closed_before = now_ms - INTERVAL_MS[series.interval]
+        rows = series.to_matrix()
+        keep = rows[:, KlineSeries.OPEN_TIME] <= closed_before
+        if key in self._last_saved:
+            keep &= rows[:, KlineSeries.OPEN_TIME] > self._last_saved[key]
+        rows = rows[keep]
+        if len(rows) == 0:
+            return 0
+
+        with open(path, "ab") as f:
+            f.write(np.ascontiguousarray(rows, dtype=self.RECORD_DTYPE).tobytes())
+        self._last_saved[key] = float(rows[-1, KlineSeries.OPEN_TIME])
+
+        if self.max_bars and os.path.getsize(path) > 2 * self.max_bars * self.RECORD_SIZE:
+            self._compact(path)
+        return len(rows)
+
+    def _compact(self, path: str):
+        """Rewrite a file keeping only its most recent max_bars records."""
+        records = np.array(self._map(path)[-self.max_bars:])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(records.astype(self.RECORD_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        logger.info(f"Compacted {path} to {len(records)} bars")
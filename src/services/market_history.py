@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+import numpy as np
+from services.hashkey_api import HashkeyAPI
+from services.kline_series import INTERVAL_MS, KlineSeries
+from services.resampler import resample, window_bounds, window_span_ms
+
+logger = logging.getLogger(__name__)
+
+
+class SymbolHistory:
+    """Contiguous float64 history of base-interval bars for one symbol.
+
+    Bars live in a preallocated column-major buffer twice the capacity. New
+    bars are appended at the end and the buffer is compacted only when it
+    fills up, so appends are amortized O(new bars) and every column of the
+    history is a contiguous slice that can be handed out without copying.
+    """
+
+    def __init__(self, symbol: str, interval: str, capacity: int):
+        self.symbol = symbol
+        self.interval = interval
+        self.capacity = capacity
+        self._buffer = np.zeros((KlineSeries.COLUMNS, 2 * capacity))
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def last_open_time(self):
+        return self._buffer[KlineSeries.OPEN_TIME, self._end - 1] if len(self) else None
+
+    def merge(self, series: KlineSeries) -> int:
+        """
+        Merge freshly fetched bars, which must be sorted by open time.
+
+        Bars older than the last stored bar are dropped and a bar with the same
+        open time replaces the stored (still forming) bar.
+
+        Returns:
+            int: The number of bars appended or replaced.
+        """
+        if len(series) == 0:
+            return 0
+        bars = series.to_matrix()
+        last_open_time = self.last_open_time
+        if last_open_time is not None:
+            bars = bars[bars[:, KlineSeries.OPEN_TIME] >= last_open_time]
+            if len(bars) and bars[0, KlineSeries.OPEN_TIME] == last_open_time:
+                self._end -= 1
+        bars = bars[-self.capacity:]
+        n = len(bars)
+        if n == 0:
+            return 0
+
+        if self._end + n > self._buffer.shape[1]:
+            # Compact: move the bars that stay in the window to the front
+            keep = min(len(self), self.capacity - n)
+            self._buffer[:, :keep] = self._buffer[:, self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        self._buffer[:, self._end:self._end + n] = bars.T
+        self._end += n
+        self._start = max(self._start, self._end - self.capacity)
+        return n
+
+    def series(self) -> KlineSeries:
+        """Return the stored bars as a KlineSeries backed by views of the buffer."""
+        return KlineSeries(self.symbol, self.interval,
+                           *self._buffer[:, self._start:self._end])
+
+
+class MarketHistory:
+    """One high-resolution bar history per symbol, from which every report
+    timeframe is derived locally by slicing and resampling.
+
+    After the history is seeded, a full multi-timeframe report needs at most
+    one incremental REST call (the bars closed since the last refresh), and
+    the 24h/7d/30d figures are all computed from the same underlying bars.
+    """
+
+    MAX_LIMIT = HashkeyAPI.MAX_KLINE_LIMIT
+
+    def __init__(self, base_interval: str = "3m", timeframes=("24h", "7d", "30d")):
+        self.base_interval = base_interval
+        self.timeframes = tuple(timeframes)
+        self._base_ms = INTERVAL_MS[base_interval]
+        now_ms = int(time.time() * 1000)
+        span_ms = max(window_span_ms(name, now_ms) for name in self.timeframes)
+        if "ytd" in self.timeframes:
+            span_ms = max(span_ms, 366 * 24 * 60 * 60_000)
+        self.capacity = span_ms // self._base_ms + 1
+        self.store = None
+        self._histories = {}
+        self._locks = {}
+
+    def attach_store(self, store):
+        """Persist closed base bars to a KlineStore and warm-start from it."""
+        store.max_bars = store.max_bars or self.capacity
+        self.store = store
+
+    def _lock(self, symbol: str) -> asyncio.Lock:
+        lock = self._locks.get(symbol)
+        if lock is None:
+            lock = self._locks[symbol] = asyncio.Lock()
+        return lock
+
+    async def _fetch_range(self, symbol: str, start_ms: int, end_ms: int) -> KlineSeries:
+        """Fetch every base bar opened in [start_ms, end_ms] with a concurrent paginated backfill."""
+        return await HashkeyAPI.backfill_klines(symbol, self.base_interval, start_ms, end_ms)
+
+    async def refresh(self, symbol: str) -> SymbolHistory:
+        """
+        Bring a symbol's base history up to date and return it.
+
+        The first call seeds the whole history, from the attached store when
+        one is available so only the gap since shutdown is backfilled; later
+        calls fetch only the bars from the last stored open time onwards
+        (normally a single request).
+        """
+        async with self._lock(symbol):
+            history = self._histories.get(symbol)
+            seeding = history is None
+            if seeding:
+                history = SymbolHistory(symbol, self.base_interval, self.capacity)
+                if self.store is not None:
+                    stored = await asyncio.to_thread(
+                        self.store.load, symbol, self.base_interval, self.capacity)
+                    history.merge(stored)
+
+            now_ms = int(time.time() * 1000)
+            current_bar = now_ms // self._base_ms * self._base_ms
+            start_ms = current_bar - (self.capacity - 1) * self._base_ms
+            if len(history):
+                start_ms = max(start_ms, int(history.last_open_time))
+            missing = (current_bar - start_ms) // self._base_ms + 1
+
+            if missing <= self.MAX_LIMIT:
+                series = await HashkeyAPI.get_klines_async(
+                    symbol, self.base_interval, limit=missing, start_time=start_ms)
+            else:
+                series = await self._fetch_range(symbol, start_ms, current_bar)
+            merged = history.merge(series)
+            if seeding:
+                # Kept only once the first fetch succeeds, so a bad symbol leaves nothing behind
+                self._histories[symbol] = history
+            if self.store is not None and merged:
+                await asyncio.to_thread(self.store.append, series)
+            logger.debug(f"Market history {symbol}: merged {merged} {self.base_interval} bars")
+            return history
+
+    async def get_windows(self, symbol: str, names=None) -> dict:
+        """
+        Return the bars of each requested report timeframe for a symbol.
+
+        Args:
+            symbol (str): The trading pair symbol (e.g., "BTCUSD").
+            names (iterable): Keys of REPORT_TIMEFRAMES; defaults to the
+                timeframes this history was sized for.
+
+        Returns:
+            dict: Maps each timeframe name to a KlineSeries at its bar interval.
+        """
+        history = await self.refresh(symbol)
+        base = history.series()
+        now_ms = int(time.time() * 1000)
+        windows = {}
+        for name in names or self.timeframes:
+            interval, start_ms = window_bounds(name, now_ms)
+            bars = base.since(start_ms)
+            if INTERVAL_MS[interval] > self._base_ms:
+                bars = resample(bars, interval)
+            windows[name] = bars
+        return windows
+
+
+# Shared history used by the handlers
+market_history = MarketHistory()
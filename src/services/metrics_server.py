@@ -0,0 +1,46 @@
+import logging
+from aiohttp import web
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsServer:
+    """Small aiohttp server on the bot's event loop exposing /metrics.
+
+    Serves the shared registry in the Prometheus text format. `app` is a
+    regular aiohttp Application, so other internal endpoints can be added to
+    it before start().
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9108, registry=metrics):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self.app = web.Application()
+        self.app.router.add_get("/metrics", self._metrics)
+        self._runner = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.registry.render(), content_type="text/plain",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None
+
+    async def start(self):
+        runner = web.AppRunner(self.app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+        except OSError:
+            await runner.cleanup()
+            raise
+        self._runner = runner
+        logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MidMoveRule:
+    """Fire when the mid price moves more than `bps` basis points from the
+    mid at which this chat was last notified."""
+
+    kind = "move"
+
+    def __init__(self, bps: float, symbol: str = None):
+        self.bps = float(bps)
+        self.symbol = symbol
+        self._reference = {}  # symbol -> mid at the last notification
+
+    def check(self, symbol: str, mid: float, vwap: float = None):
+        reference = self._reference.get(symbol)
+        if reference is None:
+            self._reference[symbol] = mid
+            return None
+        move_bps = (mid - reference) / reference * 10_000 if reference else 0
+        if abs(move_bps) < self.bps:
+            return None
+        self._reference[symbol] = mid
+        return f"{symbol} mid {mid:,.2f} moved {move_bps:+.0f} bps"
+
+    def to_dict(self) -> dict:
+        return {"type": self.kind, "bps": self.bps, "symbol": self.symbol}
+
+    def describe(self) -> str:
+        return f"mid move > {self.bps:g} bps on {self.symbol or 'all symbols'}"
+
+
+class VwapCrossRule:
+    """Fire when the mid price crosses the symbol's 24h VWAP."""
+
+    kind = "vwap"
+
+    def __init__(self, symbol: str = None):
+        self.symbol = symbol
+        self._side = {}  # symbol -> +1 above VWAP, -1 below
+
+    def check(self, symbol: str, mid: float, vwap: float = None):
+        if not vwap:
+            return None
+        side = 1 if mid >= vwap else -1
+        previous = self._side.get(symbol)
+        self._side[symbol] = side
+        if previous is None or previous == side:
+            return None
+        direction = "above" if side > 0 else "below"
+        return f"{symbol} mid {mid:,.2f} crossed {direction} 24h VWAP {vwap:,.2f}"
+
+    def to_dict(self) -> dict:
+        return {"type": self.kind, "symbol": self.symbol}
+
+    def describe(self) -> str:
+        return f"24h VWAP cross on {self.symbol or 'all symbols'}"
+
+
+RULE_TYPES = {MidMoveRule.kind: MidMoveRule, VwapCrossRule.kind: VwapCrossRule}
+
+
+def rule_from_dict(data: dict):
+    """Rebuild a rule from its persisted to_dict() form."""
+    data = dict(data)
+    rule_type = RULE_TYPES[data.pop("type")]
+    return rule_type(**data)
+
+
+def _signature(rule) -> tuple:
+    """Rules with equal signatures fire identically and can share one instance."""
+    return tuple(sorted(rule.to_dict().items()))
+
+
+class NotificationService:
+    """Event-driven notifications fed directly by WebSocket BBO updates.
+
+    Each tick is evaluated only against the rules watching that symbol (or
+    all symbols). Chats with identical rules share one evaluated instance, so
+    a tick costs one check per distinct rule rather than per subscriber (all
+    chats on the default rule are a single check), and a chat joining such a
+    group starts from the group's reference mid. Fired events are fanned out
+    to the group's chats and coalesced per chat: the first
+    event opens a debounce window, later events for the same (symbol, rule)
+    replace earlier ones, and one combined message is sent when the window
+    closes.
+    """
+
+    def __init__(self, bbo_store, send, vwap_provider=None, debounce_seconds: float = 2.0,
+                 default_move_bps: float = 50, is_quiet=None):
+        """
+        Args:
+            bbo_store (BboStore): Source of the latest quotes.
+            send: Coroutine function send(chat_id, text) delivering a message.
+            vwap_provider: Optional function symbol -> 24h VWAP (or None).
+            debounce_seconds (float): Window over which a chat's events are coalesced.
+            default_move_bps (float): Move threshold for subscribers without rules.
+            is_quiet: Optional function chat_id -> bool; events for a chat in
+                its quiet hours are dropped.
+        """
+        self.bbo_store = bbo_store
+        self.send = send
+        self.vwap_provider = vwap_provider
+        self.debounce_seconds = debounce_seconds
+        self.default_move_bps = default_move_bps
+        self.is_quiet = is_quiet
+        self._rules = {}  # chat_id -> [rule, ...]
+        self._watchers = {}  # symbol (None = all) -> {rule signature: (shared rule, {chat_id, ...})}
+        self._pending = {}  # chat_id -> {(symbol, kind): text}
+        self._flush_tasks = set()
+
+    # --- rule management -----------------------------------------------
+
+    def set_rules(self, chat_id, rules):
+        """Replace a chat's rules (an empty list removes the chat)."""
+        self.remove_chat(chat_id)
+        if not rules:
+            return
+        self._rules[chat_id] = list(rules)
+        for rule in rules:
+            groups = self._watchers.setdefault(rule.symbol, {})
+            signature = _signature(rule)
+            group = groups.get(signature)
+            if group is None:
+                group = groups[signature] = (rule_from_dict(rule.to_dict()), set())
+            group[1].add(chat_id)
+
+    def add_rule(self, chat_id, rule):
+        self.set_rules(chat_id, self._rules.get(chat_id, []) + [rule])
+
+    def remove_chat(self, chat_id):
+        for rule in self._rules.pop(chat_id, []):
+            groups = self._watchers.get(rule.symbol)
+            group = groups.get(_signature(rule)) if groups is not None else None
+            if group is None:
+                continue
+            group[1].discard(chat_id)
+            if not group[1]:
+                del groups[_signature(rule)]
+                if not groups:
+                    del self._watchers[rule.symbol]
+        self._pending.pop(chat_id, None)
+
+    def get_rules(self, chat_id) -> list:
+        return list(self._rules.get(chat_id, []))
+
+    def default_rules(self) -> list:
+        return [MidMoveRule(self.default_move_bps)]
+
+    def export_rules(self) -> dict:
+        """Return {chat_id: [rule dict, ...]} for persistence."""
+        return {chat_id: [rule.to_dict() for rule in rules] for chat_id, rules in self._rules.items()}
+
+    def pending(self) -> int:
+        """Number of chats with a debounced notification waiting to be sent."""
+        return len(self._pending)
+
+    # --- tick processing -----------------------------------------------
+
+    def on_bbo(self, bbo_data: dict):
+        """WebSocket 'bbo' handler: evaluate the rules watching this symbol."""
+        symbol = bbo_data.get("s")
+        if not symbol or not self._watchers:
+            return
+        quote = self.bbo_store.get(symbol)
+        if quote is None or quote.bid_price <= 0 or quote.ask_price <= 0:
+            return
+        mid = quote.mid
+        vwap = None
+        for groups in (self._watchers.get(symbol), self._watchers.get(None)):
+            if not groups:
+                continue
+            for rule, chat_ids in groups.values():
+                if rule.kind == VwapCrossRule.kind and vwap is None and self.vwap_provider:
+                    vwap = self.vwap_provider(symbol)
+                text = rule.check(symbol, mid, vwap)
+                if text:
+                    for chat_id in chat_ids:
+                        self._enqueue(chat_id, (symbol, rule.kind), text)
+
+    def notify(self, chat_id, key, text: str):
+        """Queue a message from another event source (e.g. price alerts) for a chat.
+
+        Goes through the same per-chat debounce and quiet hours as rule
+        events; a later message with the same `key` in one window replaces
+        the earlier one.
+        """
+        self._enqueue(chat_id, key, text)
+
+    def _enqueue(self, chat_id, key, text: str):
+        pending = self._pending.get(chat_id)
+        if pending is None:
+            pending = self._pending[chat_id] = {}
+            task = asyncio.ensure_future(self._flush_later(chat_id))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+        pending[key] = text
+
+    async def _flush_later(self, chat_id):
+        await asyncio.sleep(self.debounce_seconds)
+        pending = self._pending.pop(chat_id, None)
+        if not pending or (self.is_quiet is not None and self.is_quiet(chat_id)):
+            return
+        try:
+            await self.send(chat_id, "\n".join(pending.values()))
+        except Exception as e:
+            logger.error(f"Failed to send notification to chat_id {chat_id}: {e}")
+
+    async def stop(self):
+        for task in list(self._flush_tasks):
+            task.cancel()
+        await asyncio.gather(*self._flush_tasks, return_exceptions=True)
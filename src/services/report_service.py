@@ -0,0 +1,302 @@
+import asyncio
+import logging
+import re
+import time
+from services.hashkey_api import HashkeyAPI
+from services.kline_engine import summarize_many
+from services.market_history import market_history
+from services.request_scheduler import BACKGROUND, request_priority
+from services.trade_vwap import trade_vwap
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPORT_SYMBOLS = ("BTCUSD", "ETHUSD")
+SYMBOL_PATTERN = re.compile(r"^[A-Z0-9]{2,20}$")
+
+
+def report_symbols(configured=None) -> list:
+    """The hot report symbols: the defaults plus REPORTS.symbols from config.json.
+
+    Shared by the bot and the split-mode ingestion process, so both stream
+    and publish the same symbols.
+    """
+    return list(dict.fromkeys(list(DEFAULT_REPORT_SYMBOLS) + list(configured or [])))
+
+
+STAGE_SECONDS = metrics.histogram("stage_seconds", "Time spent per processing stage", "stage")
+REPORT_REBUILDS = metrics.counter("report_rebuilds_total", "VWAP report rebuilds by trigger", "trigger")
+
+
+async def build_vwap_report(symbol: str, live_vwap=trade_vwap) -> tuple:
+    """Fetch market data for a symbol and render the VWAP report body.
+
+    `live_vwap` is the source of trade-stream VWAPs (a TradeVwapEngine, or a
+    ShmFeedReader in split mode).
+
+    Returns:
+        tuple: (report text, dict of the key figures behind it).
+    """
+    # Derive every timeframe from the symbol's cached base history (at most
+    # one incremental kline request) while the ticker is fetched alongside.
+    with STAGE_SECONDS.time("market_data"):
+        windows, price_change_data = await asyncio.gather(
+            market_history.get_windows(symbol, ("24h", "7d", "30d")),
+            HashkeyAPI.get_24hr_ticker_price_change_async(symbol),
+        )
+    with STAGE_SECONDS.time("vwap_math"):
+        stats = summarize_many({name: (series, None) for name, series in windows.items()})
+    # Prefer the exact trade-weighted VWAP once the trade stream covers 24h
+    streamed_vwap = live_vwap.vwap(symbol, "24h")
+    vwap_24hr = streamed_vwap if streamed_vwap is not None else stats["24h"]["vwap"]
+    vwap_7d = stats["7d"]["vwap"]
+    twap_7d = stats["7d"]["twap"]
+    vwap_30d = stats["30d"]["vwap"]
+    twap_30d = stats["30d"]["twap"]
+    vwap_rounded = round(vwap_24hr)
+    vwap_7d_rounded = round(vwap_7d)
+    twap_7d_rounded = round(twap_7d)
+    vwap_30d_rounded = round(vwap_30d)
+    twap_30d_rounded = round(twap_30d)
+
+    timestamp = price_change_data["timestamp"]
+    last_price = round(price_change_data["last_price"])
+    high_price = round(price_change_data["high_price"])
+    low_price = round(price_change_data["low_price"])
+    opening_price = round(price_change_data["opening_price"])
+    bid_price = round(price_change_data["bid_price"])
+    ask_price = round(price_change_data["ask_price"])
+    base_volume = round(price_change_data["base_volume"])
+    quote_volume = round(price_change_data["quote_volume"])
+
+    # Calculate VWAP position within High and Low
+    vwap_within_range = ((vwap_24hr - low_price) / (high_price -
+                         low_price)) * 100 if high_price > low_price else 0
+    vwap_within_range_rounded = round(vwap_within_range, 2)
+
+    # Calculate Last Price position within High and Low
+    last_price_within_range = (
+        (last_price - low_price) / (high_price - low_price)) * 100 if high_price > low_price else 0
+    last_price_within_range_rounded = round(last_price_within_range, 2)
+
+    # Ensure bar_length is valid
+    bar_length = max(1, 20)  # Length of the progress bar
+
+    # Calculate VWAP and Last Price positions
+    vwap_filled_length = max(0, min(int((vwap_within_range / 100) * bar_length), bar_length - 1))
+    last_price_filled_length = max(0, min(int((last_price_within_range / 100) * bar_length), bar_length - 1))
+
+    # Initialize progress bar
+    progress_bar = ["-"] * bar_length
+
+    # Handle overlap
+    if vwap_filled_length == last_price_filled_length:
+        if vwap_within_range == last_price_within_range:
+            progress_bar[vwap_filled_length] = "VL"  # Equal position
+        elif vwap_within_range > last_price_within_range:
+            progress_bar[vwap_filled_length] = "LV"  # VWAP is larger
+        else:
+            progress_bar[vwap_filled_length] = "VL"  # Last Price is larger
+    else:
+        if vwap_filled_length < bar_length:
+            progress_bar[vwap_filled_length] = "V"  # Mark VWAP position
+        if last_price_filled_length < bar_length:
+            progress_bar[last_price_filled_length] = "L"  # Mark Last Price position
+
+    progress_bar = "".join(progress_bar)
+
+    logger.info(f"VWAP fetched and rounded: {vwap_rounded}")
+    logger.info(
+        f"24-hour ticker price change data fetched: {price_change_data}")
+
+    figures = {"vwap_24h": vwap_24hr, "vwap_7d": vwap_7d, "vwap_30d": vwap_30d,
+               "last_price": price_change_data["last_price"]}
+    return (
+        f"The 24-hour prices for {symbol}:\n"
+        f"{'VWAP':<10}: {vwap_rounded:>7,}\n"
+        f"{'Last':<10}: {last_price:>7,}\n"
+        f"{'High':<10}: {high_price:>7,}\n"
+        f"{'Low':<10}: {low_price:>7,}\n"
+        f"{'Opening':<10}: {opening_price:>7,}\n"
+        f"{'Bid':<10}: {bid_price:>7,}\n"
+        f"{'Ask':<10}: {ask_price:>7,}\n"
+        f"{'VWAP %':<10}: {vwap_within_range_rounded:>6,}%\n"
+        f"{'Last %':<10}: {last_price_within_range_rounded:>6,}%\n"
+        f"{'Position':<10}: [{progress_bar}]\n"
+        f"Other timeframes:\n"
+        f"{'VWAP 7d':<10}: {vwap_7d_rounded:>7,}\n"
+        f"{'TWAP 7d':<10}: {twap_7d_rounded:>7,} ({(((twap_7d - vwap_7d) / vwap_7d) * 100) if vwap_7d else 0:+.1f}%)\n"
+        f"{'VWAP 30d':<10}: {vwap_30d_rounded:>7,}\n"
+        f"{'TWAP 30d':<10}: {twap_30d_rounded:>7,} ({(((twap_30d - vwap_30d) / vwap_30d) * 100) if vwap_30d else 0:+.1f}%)\n"
+    ), figures
+
+
+class VwapReport:
+    """A rendered VWAP report, the figures behind it and when it was built."""
+
+    def __init__(self, symbol: str, text: str, figures: dict = None, built_at: float = None,
+                 live_vwap=trade_vwap):
+        self.symbol = symbol
+        self.live_vwap = live_vwap
+        self.text = text
+        self.figures = figures or {}
+        self.built_at = built_at if built_at is not None else time.time()
+
+    def age(self, now: float = None) -> float:
+        return (now if now is not None else time.time()) - self.built_at
+
+    def render(self, now: float = None) -> str:
+        """Return the report as HTML with the live trade-stream VWAPs and its age appended."""
+        live = self.live_vwap.render(self.symbol, now)
+        return f"<pre>{self.text}{live}{'Updated':<10}: {int(self.age(now))}s ago\n</pre>"
+
+
+class ReportService:
+    """Keeps a rendered VWAP report per hot symbol, refreshed in the background.
+
+    A scheduler task rebuilds every hot report shortly after each bar close,
+    so button presses are answered from memory. A report is only rebuilt on
+    request when it is older than `max_age` (e.g. the scheduler fell behind,
+    or the symbol is not in the hot list).
+
+    The "ALL" watchlist defaults to the hot symbols. Watchlist symbols outside
+    the hot list have their market history seeded in the background after
+    the first refresh. A cold symbol needs 30 days of 3m bars (15 pages), so
+    an ALL request made before seeding finishes waits for those pages.
+    """
+
+    SETTLE_SECONDS = 2  # wait after a bar close so the exchange has the closed bar
+
+    def __init__(self, symbols=DEFAULT_REPORT_SYMBOLS, refresh_seconds: int = 180, max_age: float = None,
+                 watchlist=None):
+        self.symbols = list(symbols)
+        self._watchlist = list(watchlist) if watchlist else None  # None: follow the hot symbols
+        self.refresh_seconds = refresh_seconds
+        self.max_age = max_age if max_age is not None else 2 * refresh_seconds
+        self.live_vwap = trade_vwap  # source of trade-stream VWAPs
+        self._reports = {}
+        self._locks = {}
+        self._task = None
+
+    @property
+    def watchlist(self) -> list:
+        """Pairs of the "ALL" batch report."""
+        return self._watchlist if self._watchlist is not None else self.symbols
+
+    def known_symbol(self, symbol: str) -> bool:
+        """True for a well-formed hot or watchlist symbol, the pairs users may query."""
+        return bool(SYMBOL_PATTERN.match(symbol)) and (symbol in self.symbols or symbol in self.watchlist)
+
+    def configure(self, symbols=None, refresh_seconds: int = None, max_age: float = None,
+                  watchlist=None):
+        """Apply settings from config.json; unset values keep their defaults."""
+        if symbols:
+            self.symbols = report_symbols(symbols)
+        if watchlist:
+            self._watchlist = list(dict.fromkeys(watchlist))
+        if refresh_seconds:
+            self.refresh_seconds = refresh_seconds
+        self.max_age = max_age if max_age is not None else 2 * self.refresh_seconds
+
+    def _lock(self, symbol: str) -> asyncio.Lock:
+        lock = self._locks.get(symbol)
+        if lock is None:
+            lock = self._locks[symbol] = asyncio.Lock()
+        return lock
+
+    async def _rebuild(self, symbol: str) -> VwapReport:
+        text, figures = await build_vwap_report(symbol, self.live_vwap)
+        report = VwapReport(symbol, text, figures, live_vwap=self.live_vwap)
+        self._reports[symbol] = report
+        return report
+
+    async def refresh(self, symbol: str) -> VwapReport:
+        """Rebuild and store the report for a symbol."""
+        async with self._lock(symbol):
+            REPORT_REBUILDS.inc("scheduled")
+            return await self._rebuild(symbol)
+
+    async def get_report(self, symbol: str) -> VwapReport:
+        """Return the cached report for a symbol, rebuilding it only if stale."""
+        report = self._reports.get(symbol)
+        if report is not None and report.age() <= self.max_age:
+            return report
+        async with self._lock(symbol):
+            # Another caller may have refreshed it while we waited for the lock
+            report = self._reports.get(symbol)
+            if report is not None and report.age() <= self.max_age:
+                return report
+            REPORT_REBUILDS.inc("on_demand")
+            return await self._rebuild(symbol)
+
+    def latest_figure(self, symbol: str, name: str):
+        """Return a figure (e.g. "vwap_24h") from the last report built, or None.
+
+        The 24h VWAP comes straight from the trade stream when it is available.
+        """
+        if name == "vwap_24h":
+            streamed_vwap = self.live_vwap.vwap(symbol, "24h")
+            if streamed_vwap is not None:
+                return streamed_vwap
+        report = self._reports.get(symbol)
+        return report.figures.get(name) if report is not None else None
+
+    def _seconds_to_next_refresh(self, now: float = None) -> float:
+        now = now if now is not None else time.time()
+        next_close = (now // self.refresh_seconds + 1) * self.refresh_seconds
+        return next_close + self.SETTLE_SECONDS - now
+
+    async def _seed_watchlist(self):
+        """Seed the market history of watchlist symbols that are not refreshed as hot reports."""
+        cold = [symbol for symbol in self.watchlist if symbol not in self.symbols]
+        if not cold:
+            return
+        started = time.monotonic()
+        results = await asyncio.gather(*(market_history.refresh(symbol) for symbol in cold),
+                                       return_exceptions=True)
+        for symbol, result in zip(cold, results):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to seed market history for {symbol}: {result}")
+        logger.info(f"Seeded market history of {len(cold)} watchlist symbols "
+                    f"in {time.monotonic() - started:.1f}s")
+
+    async def run(self):
+        """Refresh every hot report, then again after each bar close."""
+        # Scheduled refreshes yield to interactive requests at the REST scheduler
+        request_priority.set(BACKGROUND)
+        seeding = None
+        try:
+            while True:
+                results = await asyncio.gather(
+                    *(self.refresh(symbol) for symbol in self.symbols), return_exceptions=True)
+                for symbol, result in zip(self.symbols, results):
+                    if isinstance(result, Exception):
+                        logger.error(f"Failed to refresh VWAP report for {symbol}: {result}")
+                if seeding is None:
+                    seeding = asyncio.create_task(self._seed_watchlist(), name="watchlist_seed")
+                await asyncio.sleep(self._seconds_to_next_refresh())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if seeding is not None:
+                seeding.cancel()
+                await asyncio.gather(seeding, return_exceptions=True)
+            logger.info("Report scheduler stopped.")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="report_scheduler")
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Shared report service used by the handlers
+report_service = ReportService()
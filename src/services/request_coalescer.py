@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCoalescer:
+    """Singleflight layer with a short TTL micro-cache.
+
+    Concurrent callers asking for the same key await one shared in-flight
+    future instead of each issuing its own request, and a result stays
+    cached for `ttl` seconds so bursts of identical lookups (several chats
+    pressing the same button) hit the exchange once.
+    """
+
+    def __init__(self, ttl: float = 1.0, max_entries: int = 1024):
+        """
+        Args:
+            ttl (float): Seconds a successful result is reused. 0 disables caching
+                while still coalescing concurrent calls.
+            max_entries (int): Upper bound on cached results.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._inflight = {}
+        self._cache = {}
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    async def fetch(self, key, factory):
+        """
+        Return the result for `key`, calling `factory()` only if no fresh cached
+        result or in-flight call exists.
+
+        Args:
+            key: Hashable identity of the request, e.g. (endpoint, params).
+            factory: Zero-argument coroutine function performing the request.
+
+        Returns:
+            The (shared) result of the request. Errors are not cached and are
+            raised to every caller waiting on the failed call.
+        """
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+
+        future = self._inflight.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.ensure_future(self._run(key, factory))
+            self._inflight[key] = future
+        else:
+            self.coalesced += 1
+        # Shield so one cancelled caller does not cancel the request for the others
+        return await asyncio.shield(future)
+
+    async def _run(self, key, factory):
+        try:
+            result = await factory()
+            if self.ttl > 0:
+                self._store(key, result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key, result):
+        now = time.monotonic()
+        if len(self._cache) >= self.max_entries:
+            for stale_key in [k for k, (expires, _) in self._cache.items() if expires <= now]:
+                del self._cache[stale_key]
+            while len(self._cache) >= self.max_entries:
+                # Dicts keep insertion order: drop the oldest entry
+                del self._cache[next(iter(self._cache))]
+        self._cache.pop(key, None)
+        self._cache[key] = (now + self.ttl, result)
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,238 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import random
+import time
+import aiohttp
+from utils.metrics import metrics
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: lower runs first
+INTERACTIVE = 0  # a user is waiting for the answer (/vwap, buttons)
+BACKGROUND = 1  # scheduled report refreshes
+BACKFILL = 2  # bulk history downloads
+
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", BACKFILL: "backfill"}
+
+# Priority of the REST calls made by the current task; background jobs set
+# their own lane once at the top of their task.
+request_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+# Request weights per endpoint path (Hashkey counts weight per IP per minute)
+ENDPOINT_WEIGHTS = {
+    "/quote/v1/klines": 1,
+    "/quote/v1/ticker/24hr": 1,
+}
+
+SCHEDULER_RETRIES = metrics.counter("rest_retries_total", "Hashkey REST retries by endpoint", "endpoint")
+BREAKER_OPENS = metrics.counter("rest_circuit_opens_total", "Circuit breaker trips by endpoint", "endpoint")
+QUEUE_WAIT = metrics.histogram("rest_queue_wait_seconds", "Time spent waiting for rate-limit tokens by lane", "lane")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Per-endpoint breaker: opens after `threshold` consecutive failures,
+    lets one trial request through after `cooldown` seconds, and closes
+    again when that request succeeds."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def allow(self, now: float) -> bool:
+        if self.opened_at is None:
+            return True
+        if now - self.opened_at >= self.cooldown and not self._trial_running:
+            self._trial_running = True  # half-open: one trial request
+            return True
+        return False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def abandon(self):
+        """The half-open trial request was cancelled: let the next request be the trial."""
+        self._trial_running = False
+
+    def failure(self, now: float) -> bool:
+        """Record a failure; returns True if this tripped the breaker."""
+        self.failures += 1
+        tripped = self._trial_running or (self.opened_at is None and self.failures >= self.threshold)
+        self._trial_running = False
+        if tripped:
+            self.opened_at = now
+        return tripped
+
+
+class RequestScheduler:
+    """Central gate for Hashkey REST calls.
+
+    Requests take weighted tokens from one shared bucket sized to the
+    exchange's limit. When tokens run short, waiting requests are released
+    strictly by priority lane (interactive before background before
+    backfill) and then in arrival order. 429 and 5xx responses, timeouts
+    and connection errors are retried with jittered exponential backoff,
+    and an endpoint that keeps failing is short-circuited for a while.
+    """
+
+    def __init__(self, rate: float = 20.0, burst: float = 40.0, weights: dict = None,
+                 max_retries: int = 3, base_delay: float = 0.25, max_delay: float = 8.0,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 30.0):
+        """
+        Args:
+            rate (float): Weight per second (Hashkey: 1200 per minute per IP).
+            burst (float): Bucket capacity.
+            weights (dict): Endpoint path -> request weight (default 1).
+            max_retries (int): Retries after the first attempt.
+            base_delay (float): First backoff delay in seconds; doubles per retry.
+            max_delay (float): Backoff ceiling in seconds.
+            breaker_threshold (int): Consecutive failures that open an endpoint's breaker.
+            breaker_cooldown (float): Seconds before a trial request is let through.
+        """
+        self.weights = dict(ENDPOINT_WEIGHTS if weights is None else weights)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self._bucket = TokenBucket(rate, capacity=burst)
+        self._waiters = []  # heap of (priority, seq, weight, future)
+        self._sequence = itertools.count()
+        self._dispatcher = None
+        self._breakers = {}
+
+    def configure(self, rate: float = None, burst: float = None, weights: dict = None):
+        """Apply settings from config.json; unset values keep their defaults."""
+        if rate:
+            self._bucket.rate = rate
+        if burst:
+            self._bucket.capacity = burst
+        if weights:
+            self.weights.update(weights)
+
+    # --- rate limiting -------------------------------------------------
+
+    async def _acquire(self, weight: float, priority: int):
+        if not self._waiters and self._bucket.try_acquire(weight) == 0:
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), weight, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="rest_scheduler")
+        started = time.monotonic()
+        await future
+        QUEUE_WAIT.observe(time.monotonic() - started, PRIORITY_NAMES.get(priority, str(priority)))
+
+    async def _dispatch(self):
+        """Hand out tokens to waiters, highest priority first."""
+        while self._waiters:
+            _, _, weight, future = self._waiters[0]
+            if future.done():  # the caller was cancelled
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._bucket.try_acquire(weight)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+    def waiting(self) -> dict:
+        """Number of requests waiting for tokens per lane."""
+        counts = {}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                lane = PRIORITY_NAMES.get(priority, str(priority))
+                counts[lane] = counts.get(lane, 0) + 1
+        return counts
+
+    # --- retries and circuit breaking ----------------------------------
+
+    def _breaker(self, endpoint: str) -> CircuitBreaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown)
+        return breaker
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 429 or error.status >= 500
+        return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = None
+        if isinstance(error, aiohttp.ClientResponseError) and error.headers:
+            try:
+                retry_after = float(error.headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                pass
+        if retry_after is not None:
+            # The exchange told us to back off: stop every lane, not just this request
+            self._bucket.pause(retry_after)
+            return retry_after
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(delay / 2, delay)  # jitter
+
+    async def run(self, endpoint: str, factory, priority: int = None):
+        """
+        Run `factory()` (a coroutine function performing one request) under
+        the rate limit, retry policy and circuit breaker of `endpoint`.
+
+        Args:
+            endpoint (str): Endpoint path, e.g. "/quote/v1/klines".
+            factory: Zero-argument coroutine function making the request.
+            priority (int): Lane; defaults to the request_priority of the caller.
+
+        Raises:
+            CircuitOpenError: If the endpoint's breaker is open.
+        """
+        priority = request_priority.get() if priority is None else priority
+        weight = self.weights.get(endpoint, 1)
+        breaker = self._breaker(endpoint)
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow(time.monotonic()):
+                raise CircuitOpenError(f"Circuit open for {endpoint}; retry in a few seconds")
+            trial = breaker.opened_at is not None
+            try:
+                await self._acquire(weight, priority)
+                result = await factory()
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    # Cancelled (e.g. the caller timed out): neither a success nor a
+                    # failure, but a trial must not keep the breaker open for good
+                    if trial:
+                        breaker.abandon()
+                    raise
+                if not self._retryable(e):
+                    breaker.success()  # the endpoint answered; the request itself was bad
+                    raise
+                if breaker.failure(time.monotonic()):
+                    BREAKER_OPENS.inc(endpoint)
+                    logger.error(f"Circuit opened for {endpoint} after {breaker.failures} failures: {e}")
+                    raise
+                if attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                SCHEDULER_RETRIES.inc(endpoint)
+                logger.warning(f"Retrying {endpoint} in {delay:.2f}s after: {e}")
+                await asyncio.sleep(delay)
+            else:
+                breaker.success()
+                return result
+
+
+# Shared scheduler for every Hashkey REST call
+request_scheduler = RequestScheduler()
@@ -0,0 +1,76 @@
+import datetime
+import numpy as np
+from services.kline_series import INTERVAL_MS, KlineSeries
+
+DAY_MS = 24 * 60 * 60_000
+
+# Report timeframes: name -> (bar interval, number of bars). A window covers
+# the current (still forming) bar plus the preceding bars of that interval,
+# matching the kline `limit` the report used to request directly.
+REPORT_TIMEFRAMES = {
+    "24h": ("3m", 480),
+    "7d": ("15m", 672),
+    "30d": ("1h", 720),
+    "90d": ("4h", 540),
+    "ytd": ("1d", None),  # from 1 January UTC of the current year
+}
+
+
+def window_bounds(name: str, now_ms: int) -> tuple:
+    """
+    Resolve a report timeframe into its bar interval and first bar open time.
+
+    Args:
+        name (str): A key of REPORT_TIMEFRAMES (e.g., "7d").
+        now_ms (int): The current time in milliseconds.
+
+    Returns:
+        tuple: (interval, start_ms) of the window.
+    """
+    interval, bars = REPORT_TIMEFRAMES[name]
+    interval_ms = INTERVAL_MS[interval]
+    if bars is None:
+        now = datetime.datetime.fromtimestamp(now_ms / 1000, tz=datetime.timezone.utc)
+        year_start = datetime.datetime(now.year, 1, 1, tzinfo=datetime.timezone.utc)
+        return interval, int(year_start.timestamp() * 1000)
+    current_bar = now_ms // interval_ms * interval_ms
+    return interval, current_bar - (bars - 1) * interval_ms
+
+
+def window_span_ms(name: str, now_ms: int) -> int:
+    """Milliseconds of base history needed to build a timeframe at `now_ms`."""
+    interval, start_ms = window_bounds(name, now_ms)
+    return now_ms - start_ms + INTERVAL_MS[interval]
+
+
+def resample(series: KlineSeries, interval: str) -> KlineSeries:
+    """
+    Aggregate bars into a coarser interval (e.g. 3m bars into 1h bars).
+
+    Bars are grouped by the coarser bucket their open time falls in; each
+    bucket keeps the first open, highest high, lowest low, last close and
+    summed volume. The input must be sorted by open time.
+
+    Args:
+        series (KlineSeries): The finer-grained source bars.
+        interval (str): The target interval (e.g., "15m", "1h").
+
+    Returns:
+        KlineSeries: The resampled bars.
+    """
+    target_ms = INTERVAL_MS[interval]
+    if len(series) == 0:
+        return KlineSeries(series.symbol, interval)
+
+    buckets = np.floor_divide(series.open_times, target_ms)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(series)] - 1
+    return KlineSeries(
+        series.symbol, interval,
+        buckets[starts] * target_ms,
+        series.opens[starts],
+        np.maximum.reduceat(series.highs, starts),
+        np.minimum.reduceat(series.lows, starts),
+        series.closes[ends],
+        np.add.reduceat(series.volumes, starts),
+    )
@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from services.bbo_store import Quote
+from services.trade_vwap import render_live_vwap
+
+logger = logging.getLogger(__name__)
+
+# Segment layout, version 1 (all values little-endian):
+#   header   HEADER_SIZE bytes: magic, version, slots, fields, symbol count, heartbeat
+#   symbols  slots x SYMBOL_SIZE bytes, NUL-padded ASCII
+#   seq      slots x int64 per-slot sequence counters (odd while a slot is written)
+#   values   slots x len(FIELDS) float64
+MAGIC = b"HKFEED\0\0"
+LAYOUT_VERSION = 1
+HEADER = struct.Struct("<8sIIII d")  # magic, version, slots, fields, symbol count, heartbeat
+HEADER_SIZE = 64
+SYMBOL_SIZE = 16
+FIELDS = ("bid", "bid_size", "ask", "ask_size", "timestamp",
+          "vwap_1h", "vwap_24h", "vwap_session", "updated_at")
+FIELD = {name: i for i, name in enumerate(FIELDS)}
+_COUNT_OFFSET = 20
+_HEARTBEAT_OFFSET = 24
+
+
+def _segment_size(slots: int) -> int:
+    return HEADER_SIZE + slots * (SYMBOL_SIZE + 8 + 8 * len(FIELDS))
+
+
+class _Segment:
+    """Typed views over a shared-memory feed segment."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, slots: int):
+        self.shm = shm
+        self.slots = slots
+        symbols_end = HEADER_SIZE + slots * SYMBOL_SIZE
+        seq_end = symbols_end + slots * 8
+        self.seq = shm.buf[symbols_end:seq_end].cast("q")
+        self.values = shm.buf[seq_end:seq_end + slots * 8 * len(FIELDS)].cast("d")
+        # Zero-copy numpy view of the same values, one row per slot
+        self.matrix = np.frombuffer(shm.buf, dtype=np.float64, count=slots * len(FIELDS),
+                                    offset=seq_end).reshape(slots, len(FIELDS))
+
+    def symbol(self, slot: int) -> str:
+        start = HEADER_SIZE + slot * SYMBOL_SIZE
+        return bytes(self.shm.buf[start:start + SYMBOL_SIZE]).rstrip(b"\0").decode("ascii")
+
+    def symbol_count(self) -> int:
+        return struct.unpack_from("<I", self.shm.buf, _COUNT_OFFSET)[0]
+
+    def release(self):
+        # Views must be released before the mapping can be closed
+        self.matrix = None
+        self.seq.release()
+        self.values.release()
+
+
+class ShmFeedWriter:
+    """Publishes latest quotes and rolling VWAPs into a shared-memory segment.
+
+    Used by the ingestion process (see ingest.py). Each symbol owns a fixed
+    slot; a slot is written under its own sequence counter (a seqlock, as in
+    BboStore) so readers in other processes never see a torn record. The
+    header heartbeat tells readers whether the ingestion process is alive.
+    """
+
+    def __init__(self, name: str, slots: int = 64):
+        self.name = name
+        self.slots = slots
+        size = _segment_size(slots)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from an ingestion process that did not shut down cleanly
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, LAYOUT_VERSION, slots, len(FIELDS), 0, time.time())
+        self._segment = _Segment(shm, slots)
+        self._slots = {}  # symbol -> slot
+
+    def _slot(self, symbol: str) -> int:
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = len(self._slots)
+            if slot >= self.slots:
+                raise ValueError(f"Shared-memory feed is full ({self.slots} symbols)")
+            encoded = symbol.encode("ascii")[:SYMBOL_SIZE]
+            start = HEADER_SIZE + slot * SYMBOL_SIZE
+            self._segment.shm.buf[start:start + len(encoded)] = encoded
+            self._slots[symbol] = slot
+            # Publish the name before the count so readers never see an empty slot
+            struct.pack_into("<I", self._segment.shm.buf, _COUNT_OFFSET, len(self._slots))
+        return slot
+
+    def _write(self, symbol: str, updates):
+        slot = self._slot(symbol)
+        seq, values = self._segment.seq, self._segment.values
+        base = slot * len(FIELDS)
+        seq[slot] += 1  # odd: write in progress
+        for field, value in updates:
+            values[base + field] = value
+        values[base + FIELD["updated_at"]] = time.time()
+        seq[slot] += 1  # even: consistent again
+
+    def publish_quote(self, quote: Quote):
+        self._write(quote.symbol, (
+            (FIELD["bid"], quote.bid_price), (FIELD["bid_size"], quote.bid_quantity),
+            (FIELD["ask"], quote.ask_price), (FIELD["ask_size"], quote.ask_quantity),
+            (FIELD["timestamp"], quote.timestamp)))
+
+    def publish_vwaps(self, symbol: str, stats: dict):
+        """Publish TradeVwapEngine.stats(); windows without full coverage are NaN."""
+        nan = float("nan")
+        self._write(symbol, (
+            (FIELD["vwap_1h"], stats.get("1h", {}).get("vwap", nan)),
+            (FIELD["vwap_24h"], stats.get("24h", {}).get("vwap", nan)),
+            (FIELD["vwap_session"], stats.get("session", {}).get("vwap", nan))))
+
+    def heartbeat(self):
+        struct.pack_into("<d", self._segment.shm.buf, _HEARTBEAT_OFFSET, time.time())
+
+    def close(self, unlink: bool = True):
+        shm = self._segment.shm
+        self._segment.release()
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+class ShmFeedReader:
+    """Read side of the shared-memory feed, used by the bot in split mode.
+
+    Offers the read interface of BboStore (get, snapshot, symbols) and of
+    TradeVwapEngine (vwap, stats, render), so the handlers, notifications
+    and reports work unchanged on top of it. The segment is attached lazily
+    and re-attached if the ingestion process restarts.
+
+    When the heartbeat stops, the reader detaches and only re-attaches once
+    a segment with a newer heartbeat appears (the ingestion process came
+    back or recreated the segment), probing with exponential backoff.
+    """
+
+    RETRY_MIN_DELAY = 0.5
+    RETRY_MAX_DELAY = 30.0
+
+    VWAP_FIELDS = {"1h": FIELD["vwap_1h"], "24h": FIELD["vwap_24h"], "session": FIELD["vwap_session"]}
+
+    def __init__(self, name: str, stale_after: float = 10.0):
+        self.name = name
+        self.stale_after = stale_after
+        self._segment = None
+        self._slots = {}  # symbol -> slot
+        self._seen = {}  # slot -> sequence at the last poll_changes()
+        self._dead_heartbeat = None  # heartbeat of the segment last detached as stale
+        self._retry_at = 0.0
+        self._retry_delay = self.RETRY_MIN_DELAY
+
+    # --- attachment ----------------------------------------------------
+
+    def attach(self) -> bool:
+        """Attach to the segment if it exists and has a compatible layout."""
+        if self._segment is not None:
+            return True
+        if self._dead_heartbeat is not None and time.monotonic() < self._retry_at:
+            return False
+        try:
+            shm = shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            self._backoff()
+            return False
+        # The reader must never unlink the segment owned by the ingestion process
+        resource_tracker.unregister(shm._name, "shared_memory")
+        magic, version, slots, fields, _, heartbeat = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION or fields != len(FIELDS):
+            shm.close()
+            logger.error(f"Shared-memory feed {self.name} has an incompatible layout (version {version})")
+            return False
+        if self._dead_heartbeat is not None:
+            if heartbeat <= self._dead_heartbeat:
+                # Still the segment of the stopped ingestion process
+                shm.close()
+                self._backoff()
+                return False
+            logger.info(f"Shared-memory feed {self.name} is alive again")
+            self._dead_heartbeat = None
+            self._retry_delay = self.RETRY_MIN_DELAY
+        self._segment = _Segment(shm, slots)
+        self._slots = {}
+        self._seen = {}
+        logger.info(f"Attached to shared-memory feed {self.name} ({slots} slots)")
+        return True
+
+    def _backoff(self):
+        if self._dead_heartbeat is None:
+            return
+        self._retry_at = time.monotonic() + self._retry_delay
+        self._retry_delay = min(2 * self._retry_delay, self.RETRY_MAX_DELAY)
+
+    def _mark_dead(self):
+        """Detach from a segment whose heartbeat stopped; re-attach only once it advances."""
+        self._dead_heartbeat = struct.unpack_from("<d", self._segment.shm.buf, _HEARTBEAT_OFFSET)[0]
+        self._retry_delay = self.RETRY_MIN_DELAY
+        self.detach()
+        self._backoff()
+
+    def detach(self):
+        if self._segment is not None:
+            shm = self._segment.shm
+            self._segment.release()
+            shm.close()
+            self._segment = None
+
+    def heartbeat_age(self) -> float:
+        if self._segment is None:
+            return float("inf")
+        return time.time() - struct.unpack_from("<d", self._segment.shm.buf, _HEARTBEAT_OFFSET)[0]
+
+    def alive(self) -> bool:
+        return self.heartbeat_age() <= self.stale_after
+
+    def _refresh_slots(self):
+        count = self._segment.symbol_count()
+        for slot in range(len(self._slots), count):
+            self._slots[self._segment.symbol(slot)] = slot
+
+    def _read(self, symbol: str):
+        """Return a consistent copy of a symbol's row, or None."""
+        if self._segment is None and not self.attach():
+            return None
+        slot = self._slots.get(symbol)
+        if slot is None:
+            self._refresh_slots()
+            slot = self._slots.get(symbol)
+            if slot is None:
+                return None
+        seq, matrix = self._segment.seq, self._segment.matrix
+        while True:
+            before = seq[slot]
+            if before & 1:
+                time.sleep(0)
+                continue
+            row = matrix[slot].copy()
+            if seq[slot] == before:
+                return row
+            time.sleep(0)
+
+    # --- BboStore interface --------------------------------------------
+
+    def get(self, symbol: str):
+        row = self._read(symbol)
+        if row is None or row[FIELD["timestamp"]] == 0:
+            return None
+        return Quote(symbol, float(row[FIELD["bid"]]), float(row[FIELD["bid_size"]]),
+                     float(row[FIELD["ask"]]), float(row[FIELD["ask_size"]]), int(row[FIELD["timestamp"]]))
+
+    def symbols(self) -> list:
+        if self._segment is None and not self.attach():
+            return []
+        self._refresh_slots()
+        return list(self._slots)
+
+    def snapshot(self) -> dict:
+        quotes = {}
+        for symbol in self.symbols():
+            quote = self.get(symbol)
+            if quote is not None:
+                quotes[symbol] = quote
+        return quotes
+
+    # --- TradeVwapEngine interface -------------------------------------
+
+    def vwap(self, symbol: str, window: str = "24h", now: float = None):
+        if not self.alive():
+            return None
+        row = self._read(symbol)
+        if row is None:
+            return None
+        value = row[self.VWAP_FIELDS[window]]
+        return None if np.isnan(value) else float(value)
+
+    def stats(self, symbol: str, now: float = None) -> dict:
+        stats = {}
+        for window in self.VWAP_FIELDS:
+            vwap = self.vwap(symbol, window, now)
+            if vwap is not None:
+                stats[window] = {"vwap": vwap}
+        return stats
+
+    def render(self, symbol: str, now: float = None) -> str:
+        return render_live_vwap(self.stats(symbol, now))
+
+    # --- change notification -------------------------------------------
+
+    def poll_changes(self) -> list:
+        """Return the symbols whose slot changed since the previous call."""
+        if self._segment is None and not self.attach():
+            return []
+        self._refresh_slots()
+        seq = self._segment.seq
+        changed = []
+        for symbol, slot in self._slots.items():
+            current = seq[slot]
+            if current != self._seen.get(slot) and not current & 1:
+                self._seen[slot] = current
+                changed.append(symbol)
+        return changed
+
+    async def watch(self, callback, interval: float = 0.05):
+        """Call `callback({"s": symbol})` for every changed symbol, like a "bbo" handler."""
+        try:
+            while True:
+                for symbol in self.poll_changes():
+                    try:
+                        callback({"s": symbol})
+                    except Exception as e:
+                        logger.error(f"Feed watcher callback failed for {symbol}: {e}")
+                if self._segment is not None and self.heartbeat_age() > 3 * self.stale_after:
+                    # The ingestion process is gone; wait for its next heartbeat or segment
+                    logger.warning(f"Shared-memory feed {self.name} is stale; waiting for the ingestion process")
+                    self._mark_dead()
+                await asyncio.sleep(interval)
+        finally:
+            self.detach()
@@ -0,0 +1,239 @@
+import asyncio
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionStore:
+    """Subscribed chats and their preferences, persisted through a journal.
+
+    In memory the store is a dict of chat_id -> preferences, so membership
+    checks and updates are O(1). Every change is appended to an in-memory
+    buffer and returns immediately; a background flusher writes all buffered
+    changes to an append-only JSON-lines journal in one write (group commit)
+    off the event loop. When the journal grows past `compact_every` entries
+    it is folded into a snapshot file and truncated, which keeps startup
+    (snapshot + journal replay) bounded.
+
+    Preferences are plain JSON data, e.g.
+    {"rules": [...], "symbols": ["BTCUSD"], "quiet_hours": [22, 7]}.
+    """
+
+    SNAPSHOT_FILE = "subscriptions.json"
+    JOURNAL_FILE = "subscriptions.journal"
+
+    def __init__(self, data_dir: str, flush_interval: float = 0.5, compact_every: int = 100_000):
+        self.data_dir = data_dir
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self._snapshot_path = os.path.join(data_dir, self.SNAPSHOT_FILE)
+        self._journal_path = os.path.join(data_dir, self.JOURNAL_FILE)
+        self._chats = {}
+        self._buffer = []
+        self._journal_entries = 0
+        self._wakeup = None
+        self._stopping = False
+        self._task = None
+
+    # --- queries -------------------------------------------------------
+
+    def __contains__(self, chat_id) -> bool:
+        return chat_id in self._chats
+
+    def __len__(self):
+        return len(self._chats)
+
+    def chats(self) -> list:
+        return list(self._chats)
+
+    def buffered(self) -> int:
+        """Number of changes waiting for the next journal flush."""
+        return len(self._buffer)
+
+    def get_prefs(self, chat_id) -> dict:
+        return dict(self._chats.get(chat_id) or {})
+
+    def is_quiet(self, chat_id, now: float = None) -> bool:
+        """True if the chat's quiet hours [start, end) (UTC hours) include `now`."""
+        quiet_hours = (self._chats.get(chat_id) or {}).get("quiet_hours")
+        if not quiet_hours:
+            return False
+        start, end = quiet_hours
+        hour = time.gmtime(now if now is not None else time.time()).tm_hour
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    # --- mutations -----------------------------------------------------
+
+    def subscribe(self, chat_id, prefs: dict = None) -> bool:
+        """Add a chat. Returns False if it was already subscribed."""
+        if chat_id in self._chats:
+            return False
+        self._chats[chat_id] = dict(prefs or {})
+        self._append({"op": "sub", "chat": chat_id, "prefs": self._chats[chat_id]})
+        return True
+
+    def unsubscribe(self, chat_id) -> bool:
+        """Remove a chat. Returns False if it was not subscribed."""
+        if chat_id not in self._chats:
+            return False
+        del self._chats[chat_id]
+        self._append({"op": "unsub", "chat": chat_id})
+        return True
+
+    def update_prefs(self, chat_id, **prefs):
+        """Merge preferences into a subscribed chat's prefs (None removes a key)."""
+        current = self._chats.get(chat_id)
+        if current is None:
+            raise KeyError(chat_id)
+        for key, value in prefs.items():
+            if value is None:
+                current.pop(key, None)
+            else:
+                current[key] = value
+        self._append({"op": "prefs", "chat": chat_id, "prefs": dict(current)})
+
+    def _append(self, entry: dict):
+        self._buffer.append(json.dumps(entry, separators=(",", ":")))
+        if self._wakeup is not None and len(self._buffer) >= 1000:
+            self._wakeup.set()
+
+    # --- persistence ---------------------------------------------------
+
+    def _apply(self, entry: dict):
+        op, chat_id = entry.get("op"), entry.get("chat")
+        if op == "sub" or op == "prefs":
+            self._chats[chat_id] = dict(entry.get("prefs") or {})
+        elif op == "unsub":
+            self._chats.pop(chat_id, None)
+
+    def load(self) -> int:
+        """
+        Load the snapshot and replay the journal.
+
+        Returns:
+            int: The number of subscribed chats.
+        """
+        started = time.monotonic()
+        self._chats = {}
+        try:
+            with open(self._snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            self._chats = {int(chat_id): prefs for chat_id, prefs in snapshot.get("chats", {}).items()}
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            logger.error(f"Subscription snapshot is corrupted, starting from the journal only: {e}")
+
+        self._journal_entries = 0
+        try:
+            with open(self._journal_path, "rb") as f:
+                journal = f.read()
+        except FileNotFoundError:
+            journal = b""
+        end = journal.rfind(b"\n") + 1
+        if end < len(journal):
+            # A torn final line from a crash mid-write: cut it off so the
+            # next append starts on a line of its own instead of being glued to it
+            logger.warning("Dropping torn last line of the subscription journal.")
+            with open(self._journal_path, "r+b") as f:
+                f.truncate(end)
+        for line in journal[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (json.JSONDecodeError, ValueError):
+                logger.warning("Skipping unreadable subscription journal entry.")
+                continue
+            self._journal_entries += 1
+
+        logger.info(f"Loaded {len(self._chats)} subscriptions ({self._journal_entries} journal entries) "
+                    f"in {time.monotonic() - started:.3f}s")
+        return len(self._chats)
+
+    def exists(self) -> bool:
+        """True once a snapshot or journal has been written, even if no chats are left in it."""
+        return os.path.exists(self._snapshot_path) or os.path.exists(self._journal_path)
+
+    def flush_now(self):
+        """Write buffered changes synchronously, for use before the event loop runs."""
+        if self._buffer:
+            lines, self._buffer = self._buffer, []
+            self._write_lines(lines)
+            self._journal_entries += len(lines)
+
+    def _write_lines(self, lines: list):
+        os.makedirs(self.data_dir, exist_ok=True)
+        with open(self._journal_path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_snapshot(self, chats: dict):
+        os.makedirs(self.data_dir, exist_ok=True)
+        tmp_path = f"{self._snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"chats": chats}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._snapshot_path)
+        # Entries already folded into the snapshot; replaying any that are
+        # rewritten later is harmless because every operation is idempotent.
+        open(self._journal_path, "w").close()
+
+    async def flush(self):
+        """Write all buffered changes in one journal append, compacting if due."""
+        if self._buffer:
+            lines, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self._write_lines, lines)
+            except BaseException:
+                # Keep the changes buffered so the next flush retries them
+                self._buffer = lines + self._buffer
+                raise
+            self._journal_entries += len(lines)
+        if self._journal_entries >= self.compact_every:
+            await self.compact()
+
+    async def compact(self):
+        """Fold the journal into a fresh snapshot."""
+        chats = {str(chat_id): dict(prefs) for chat_id, prefs in self._chats.items()}
+        await asyncio.to_thread(self._write_snapshot, chats)
+        self._journal_entries = 0
+        logger.info(f"Compacted subscription journal into a snapshot of {len(chats)} chats")
+
+    async def run(self):
+        """Background flusher: group-commit buffered changes every flush_interval."""
+        self._wakeup = asyncio.Event()
+        try:
+            while not self._stopping:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await self.flush()
+                except OSError as e:
+                    logger.error(f"Failed to flush subscription journal: {e}")
+        finally:
+            self._wakeup = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self.run(), name="subscription_flusher")
+        return self._task
+
+    async def stop(self):
+        """Stop the flusher and write anything still buffered."""
+        if self._task is not None:
+            # Not cancelled: a cancelled flush or compaction would leave its
+            # write running in a thread, racing the final flush below
+            self._stopping = True
+            if self._wakeup is not None:
+                self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
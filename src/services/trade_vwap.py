@@ -0,0 +1,215 @@
+import time
+from array import array
+
+# Rolling windows: name -> (window length in seconds, bucket width in seconds)
+ROLLING_WINDOWS = {
+    "1h": (3_600, 10),
+    "24h": (86_400, 60),
+}
+
+
+class RollingVwap:
+    """Trade-weighted running sums over a rolling window.
+
+    Trades are added to time buckets held in a fixed ring; the running sums
+    are updated on every trade and expired buckets are subtracted as the
+    window moves, so each trade costs O(1) regardless of trade rate. The
+    window edge has the resolution of one bucket.
+    """
+
+    __slots__ = ("window", "bucket_width", "size", "_pv", "_v", "_n", "_bucket",
+                 "_head", "pv", "volume", "trades")
+
+    def __init__(self, window: int, bucket_width: int):
+        self.window = window
+        self.bucket_width = bucket_width
+        self.size = window // bucket_width
+        zeros = bytes(8 * self.size)
+        self._pv = array("d", zeros)
+        self._v = array("d", zeros)
+        self._n = array("q", zeros)
+        self._bucket = array("q", [-1]) * self.size  # absolute bucket number held in each slot
+        self._head = None  # absolute bucket number of the newest bucket
+        self.pv = 0.0
+        self.volume = 0.0
+        self.trades = 0
+
+    def _advance(self, bucket: int):
+        """Move the head to `bucket`, expiring every bucket that left the window."""
+        if self._head is None:
+            self._head = bucket
+            return
+        if bucket - self._head >= self.size:
+            # The whole ring expired
+            for i in range(self.size):
+                self._pv[i] = self._v[i] = 0.0
+                self._n[i] = 0
+            self.pv = self.volume = 0.0
+            self.trades = 0
+        else:
+            for b in range(self._head + 1, bucket + 1):
+                i = b % self.size
+                if self._bucket[i] >= 0:
+                    self.pv -= self._pv[i]
+                    self.volume -= self._v[i]
+                    self.trades -= self._n[i]
+                    self._pv[i] = self._v[i] = 0.0
+                    self._n[i] = 0
+            if self.trades == 0:
+                # Drop the rounding residue left by the subtractions
+                self.pv = self.volume = 0.0
+        self._head = bucket
+
+    def add(self, price: float, quantity: float, timestamp: float):
+        """Add a trade; `timestamp` is in seconds. Late trades go to their own bucket."""
+        bucket = int(timestamp // self.bucket_width)
+        if self._head is None or bucket > self._head:
+            self._advance(bucket)
+        elif bucket <= self._head - self.size:
+            return  # older than the window
+        i = bucket % self.size
+        self._bucket[i] = bucket
+        self._pv[i] += price * quantity
+        self._v[i] += quantity
+        self._n[i] += 1
+        self.pv += price * quantity
+        self.volume += quantity
+        self.trades += 1
+
+    def expire(self, now: float):
+        """Drop buckets that are older than the window at time `now` (seconds)."""
+        bucket = int(now // self.bucket_width)
+        if self._head is not None and bucket > self._head:
+            self._advance(bucket)
+
+    def vwap(self):
+        return self.pv / self.volume if self.volume > 0 else None
+
+
+class SymbolTradeVwap:
+    """Rolling and session-anchored VWAP state for one symbol."""
+
+    __slots__ = ("rolling", "session_start", "session_pv", "session_volume",
+                 "session_trades", "covered_since", "last_price", "last_trade_at")
+
+    def __init__(self, covered_since: float):
+        self.rolling = {name: RollingVwap(window, width) for name, (window, width) in ROLLING_WINDOWS.items()}
+        self.session_start = None
+        self.session_pv = 0.0
+        self.session_volume = 0.0
+        self.session_trades = 0
+        self.covered_since = covered_since  # trades are complete from this time on
+        self.last_price = None
+        self.last_trade_at = None
+
+
+class TradeVwapEngine:
+    """Exact, tick-fresh VWAPs computed from the public trade stream.
+
+    Fed by the WebSocket client's "trade" handler. Keeps 1h and 24h rolling
+    windows (see RollingVwap) and a session-anchored VWAP that restarts at
+    `session_hour` UTC each day. A window is only reported once the stream
+    has covered all of it; after a reconnect coverage restarts, since trades
+    during the gap were missed. Callers fall back to kline-based figures
+    until then.
+    """
+
+    def __init__(self, session_hour: int = 0):
+        self.session_hour = session_hour
+        self._symbols = {}
+        self._connected_at = time.time()
+
+    def _session_start(self, timestamp: float) -> float:
+        offset = self.session_hour * 3_600
+        return (timestamp - offset) // 86_400 * 86_400 + offset
+
+    def on_trade(self, trade: dict):
+        """WebSocket 'trade' handler; `trade` has s (symbol), p, q and t (ms)."""
+        symbol = trade.get("s")
+        if not symbol:
+            return
+        price = float(trade.get("p") or 0)
+        quantity = float(trade.get("q") or 0)
+        if price <= 0 or quantity <= 0:
+            return
+        timestamp = float(trade.get("t") or time.time() * 1000) / 1000
+        state = self._symbols.get(symbol)
+        if state is None:
+            state = self._symbols[symbol] = SymbolTradeVwap(self._connected_at)
+        for window in state.rolling.values():
+            window.add(price, quantity, timestamp)
+        session_start = self._session_start(timestamp)
+        if session_start != state.session_start:
+            if state.session_start is not None and session_start < state.session_start:
+                return  # late trade from the previous session
+            state.session_start = session_start
+            state.session_pv = state.session_volume = 0.0
+            state.session_trades = 0
+        state.session_pv += price * quantity
+        state.session_volume += quantity
+        state.session_trades += 1
+        state.last_price = price
+        state.last_trade_at = timestamp
+
+    def reset_coverage(self):
+        """Mark every window as incomplete from now on, e.g. after a reconnect."""
+        self._connected_at = time.time()
+        for state in self._symbols.values():
+            state.covered_since = self._connected_at
+
+    def vwap(self, symbol: str, window: str = "24h", now: float = None):
+        """
+        Return the streamed VWAP for a window ("1h", "24h" or "session").
+
+        Returns:
+            float: The VWAP, or None if the symbol has no trades in the window
+            or the stream has not yet covered the whole window.
+        """
+        now = now if now is not None else time.time()
+        state = self._symbols.get(symbol)
+        if state is None:
+            return None
+        if window == "session":
+            if state.session_start is None or state.session_start != self._session_start(now):
+                return None
+            if state.covered_since > state.session_start or state.session_volume <= 0:
+                return None
+            return state.session_pv / state.session_volume
+        rolling = state.rolling[window]
+        if state.covered_since > now - rolling.window:
+            return None
+        rolling.expire(now)
+        return rolling.vwap()
+
+    def stats(self, symbol: str, now: float = None) -> dict:
+        """Return {window: {"vwap", "volume", "trades"}} for the windows with full coverage."""
+        now = now if now is not None else time.time()
+        state = self._symbols.get(symbol)
+        if state is None:
+            return {}
+        stats = {}
+        for name, rolling in state.rolling.items():
+            vwap = self.vwap(symbol, name, now)
+            if vwap is not None:
+                stats[name] = {"vwap": vwap, "volume": rolling.volume, "trades": rolling.trades}
+        vwap = self.vwap(symbol, "session", now)
+        if vwap is not None:
+            stats["session"] = {"vwap": vwap, "volume": state.session_volume, "trades": state.session_trades}
+        return stats
+
+    def render(self, symbol: str, now: float = None) -> str:
+        """Report lines for the streamed VWAPs that are available, or ""."""
+        return render_live_vwap(self.stats(symbol, now))
+
+
+def render_live_vwap(stats: dict) -> str:
+    """Format {window: {"vwap": ...}} as report lines, or "" if there are none."""
+    labels = (("1h", "VWAP 1h*"), ("24h", "VWAP 24h*"), ("session", "VWAP sess*"))
+    lines = [f"{label:<10}: {round(stats[name]['vwap']):>7,}\n" for name, label in labels if name in stats]
+    if not lines:
+        return ""
+    return "Live (trade stream):\n" + "".join(lines)
+
+
+# Shared engine fed by the WebSocket client
+trade_vwap = TradeVwapEngine()
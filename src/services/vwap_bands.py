@@ -0,0 +1,472 @@
+import logging
+import math
+import time
+from collections import deque
+import numpy as np
+from services.batch_report import format_price
+from services.kline_series import INTERVAL_MS
+from services.market_history import market_history
+
+logger = logging.getLogger(__name__)
+
+# Rolling band windows: name -> length in milliseconds
+BAND_WINDOWS = {
+    "24h": 24 * 60 * 60_000,
+    "7d": 7 * 24 * 60 * 60_000,
+}
+BAND_SIGMAS = (1, 2)
+PROFILE_ROWS = 12
+VALUE_AREA = 0.7  # share of volume in the value area around the point of control
+
+
+class WeightedMoments:
+    """Volume-weighted mean and variance with O(1) updates.
+
+    Uses the weighted form of Welford's method (West, 1979), which stays
+    accurate where the textbook sum-of-squares formula cancels badly (prices
+    in the tens of thousands, spreads of a few dollars). Observations can be
+    removed again, and two sets of moments can be merged (Chan et al.), so
+    rolling windows and partial results combine without revisiting bars.
+    """
+
+    __slots__ = ("weight", "mean", "m2")
+
+    def __init__(self, weight: float = 0.0, mean: float = 0.0, m2: float = 0.0):
+        self.weight = weight
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def of(cls, prices: np.ndarray, weights: np.ndarray) -> "WeightedMoments":
+        """Moments of a whole array in one vectorized two-pass computation."""
+        weight = float(weights.sum()) if len(weights) else 0.0
+        if weight <= 0:
+            return cls()
+        mean = float(np.dot(prices, weights)) / weight
+        return cls(weight, mean, float(np.dot(weights, (prices - mean) ** 2)))
+
+    def add(self, price: float, weight: float):
+        if weight <= 0:
+            return
+        self.weight += weight
+        delta = price - self.mean
+        self.mean += delta * weight / self.weight
+        self.m2 += weight * delta * (price - self.mean)
+
+    def remove(self, price: float, weight: float):
+        """Undo add(price, weight)."""
+        if weight <= 0:
+            return
+        remaining = self.weight - weight
+        if remaining <= self.weight * 1e-12:
+            self.weight = self.mean = self.m2 = 0.0
+            return
+        delta = price - self.mean
+        self.mean -= delta * weight / remaining
+        self.m2 = max(0.0, self.m2 - weight * delta * (price - self.mean))
+        self.weight = remaining
+
+    def merge(self, other: "WeightedMoments"):
+        if other.weight <= 0:
+            return
+        weight = self.weight + other.weight
+        delta = other.mean - self.mean
+        self.mean += delta * other.weight / weight
+        self.m2 += other.m2 + delta * delta * self.weight * other.weight / weight
+        self.weight = weight
+
+    def copy(self) -> "WeightedMoments":
+        return WeightedMoments(self.weight, self.mean, self.m2)
+
+    @property
+    def vwap(self):
+        return self.mean if self.weight > 0 else None
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / self.weight) if self.weight > 0 else 0.0
+
+
+class VolumeProfile:
+    """Traded volume per fixed-size price bucket."""
+
+    __slots__ = ("bucket_size", "volumes")
+
+    def __init__(self, bucket_size: float):
+        self.bucket_size = bucket_size
+        self.volumes = {}  # bucket number -> volume
+
+    def add(self, price: float, volume: float):
+        bucket = math.floor(price / self.bucket_size)
+        self.volumes[bucket] = self.volumes.get(bucket, 0.0) + volume
+
+    def remove(self, price: float, volume: float):
+        bucket = math.floor(price / self.bucket_size)
+        remaining = self.volumes.get(bucket, 0.0) - volume
+        if remaining > 1e-12:
+            self.volumes[bucket] = remaining
+        else:
+            self.volumes.pop(bucket, None)
+
+    def add_many(self, prices: np.ndarray, volumes: np.ndarray):
+        if not len(prices):
+            return
+        buckets, index = np.unique(np.floor(prices / self.bucket_size).astype(np.int64), return_inverse=True)
+        for bucket, volume in zip(buckets.tolist(), np.bincount(index, weights=volumes).tolist()):
+            self.volumes[bucket] = self.volumes.get(bucket, 0.0) + volume
+
+    def point_of_control(self):
+        """Lower edge of the bucket with the most volume, or None."""
+        if not self.volumes:
+            return None
+        return max(self.volumes, key=self.volumes.get) * self.bucket_size
+
+    def value_area(self, share: float = VALUE_AREA):
+        """(low, high) price range around the point of control holding `share` of the volume."""
+        if not self.volumes:
+            return None
+        buckets = sorted(self.volumes)
+        volumes = [self.volumes[bucket] for bucket in buckets]
+        low = high = volumes.index(max(volumes))
+        covered, target = volumes[low], share * sum(volumes)
+        while covered < target and (low > 0 or high < len(buckets) - 1):
+            below = volumes[low - 1] if low > 0 else -1.0
+            above = volumes[high + 1] if high < len(buckets) - 1 else -1.0
+            if above >= below:
+                high += 1
+                covered += above
+            else:
+                low -= 1
+                covered += below
+        return buckets[low] * self.bucket_size, (buckets[high] + 1) * self.bucket_size
+
+    def rows(self, count: int = PROFILE_ROWS) -> list:
+        """Volume regrouped into at most `count` rows, as (row low price, volume), highest price first."""
+        if not self.volumes:
+            return []
+        first, last = min(self.volumes), max(self.volumes)
+        per_row = max(1, math.ceil((last - first + 1) / count))
+        grouped = {}
+        for bucket, volume in self.volumes.items():
+            row = (bucket - first) // per_row
+            grouped[row] = grouped.get(row, 0.0) + volume
+        return [((first + row * per_row) * self.bucket_size, grouped.get(row, 0.0))
+                for row in range((last - first) // per_row, -1, -1)]
+
+
+class BandWindow:
+    """Moments and volume profile of the bars since an anchor, or of a rolling window.
+
+    A rolling window (`length` set) keeps its bars in a deque and removes
+    them as they leave the window; an anchored window only ever adds.
+    """
+
+    RESEED_EVERY = 50_000  # removals after which a rolling window is recomputed from its bars
+
+    def __init__(self, label: str, anchor_ms: float, bucket_size: float, length: int = None):
+        self.label = label
+        self.anchor_ms = anchor_ms
+        self.length = length
+        self.moments = WeightedMoments()
+        self.profile = VolumeProfile(bucket_size)
+        self._bars = deque() if length else None
+        self._removals = 0
+
+    def seed(self, open_times: np.ndarray, prices: np.ndarray, volumes: np.ndarray):
+        """Start from a block of historical bars (vectorized)."""
+        self.moments = WeightedMoments.of(prices, volumes)
+        self.profile.volumes.clear()
+        self.profile.add_many(prices, volumes)
+        if self._bars is not None:
+            self._bars = deque(zip(open_times.tolist(), prices.tolist(), volumes.tolist()))
+
+    def add(self, open_time: float, price: float, volume: float):
+        self.moments.add(price, volume)
+        self.profile.add(price, volume)
+        if self._bars is not None:
+            self._bars.append((open_time, price, volume))
+
+    def expire(self, now_ms: float):
+        """Drop bars that left a rolling window."""
+        if self._bars is None:
+            return
+        self.anchor_ms = now_ms - self.length
+        while self._bars and self._bars[0][0] < self.anchor_ms:
+            _, price, volume = self._bars.popleft()
+            self.moments.remove(price, volume)
+            self.profile.remove(price, volume)
+            self._removals += 1
+        if self._removals >= self.RESEED_EVERY:
+            # Bound the rounding drift of repeated removals
+            bars = np.array(self._bars, dtype=np.float64).reshape(-1, 3)
+            self.seed(bars[:, 0], bars[:, 1], bars[:, 2])
+            self._removals = 0
+
+
+class SymbolBands:
+    """Band state of one symbol: rolling windows, the session and user anchors."""
+
+    def __init__(self, symbol: str, bucket_size: float):
+        self.symbol = symbol
+        self.bucket_size = bucket_size
+        self.watermark = None  # open time of the last bar applied
+        self.rolling = {}
+        self.session = None
+        self.anchors = {}  # key -> BandWindow
+        self.pending = {}  # bar open time -> WeightedMoments of trades in bars not applied yet
+        self.last_price = None
+
+
+def profile_bucket_size(price: float) -> float:
+    """A round bucket size of roughly 0.1% of `price` (1, 2 or 5 times a power of ten)."""
+    if not price or price <= 0:
+        return 1.0
+    target = price * 0.001
+    power = 10 ** math.floor(math.log10(target))
+    return next(step * power for step in (1, 2, 5, 10) if step * power >= target)
+
+
+class VwapBandEngine:
+    """Incremental VWAP bands, anchored VWAPs and volume profiles.
+
+    State is built once per symbol from the bars of the shared market
+    history and then updated as bars close: every new bar is one O(1)
+    Welford update per window or anchor, so bands never require a pass over
+    the window and a symbol can carry many anchors. Trades from the stream
+    between bar closes are collected per bar in one shared accumulator (O(1)
+    per trade however many anchors there are) and merged in at query time;
+    the kline bar replaces them once it closes.
+
+    Bars contribute their typical price (high + low + close) / 3; σ is the
+    volume-weighted standard deviation of price around the VWAP.
+    """
+
+    PENDING_BARS = 2  # the forming bar and the last closed one, until its kline is fetched
+
+    def __init__(self, history=market_history, session_hour: int = 0, windows: dict = None):
+        self.history = history
+        self.session_hour = session_hour
+        self.windows = dict(BAND_WINDOWS if windows is None else windows)
+        self._symbols = {}
+
+    @property
+    def _base_ms(self) -> int:
+        return INTERVAL_MS[self.history.base_interval]
+
+    def _session_start(self, timestamp_ms: float) -> float:
+        day, offset = 86_400_000, self.session_hour * 3_600_000
+        return (timestamp_ms - offset) // day * day + offset
+
+    async def _bars(self, symbol: str, now_ms: float) -> tuple:
+        """Refresh the symbol's history; return its closed bars as
+        (open_times, typical prices, volumes) and the last close."""
+        series = (await self.history.refresh(symbol)).series()
+        closed = int(np.searchsorted(series.open_times, now_ms - self._base_ms, side="right"))
+        typical = (series.highs[:closed] + series.lows[:closed] + series.closes[:closed]) / 3
+        last_price = float(series.closes[-1]) if len(series) else None
+        return series.open_times[:closed], typical, series.volumes[:closed], last_price
+
+    async def sync(self, symbol: str, now: float = None) -> SymbolBands:
+        """Apply the bars closed since the last call (seeding the symbol on first use)."""
+        now_ms = (now if now is not None else time.time()) * 1000
+        return self._update(symbol, await self._bars(symbol, now_ms), now_ms)
+
+    def _update(self, symbol: str, bars: tuple, now_ms: float) -> SymbolBands:
+        open_times, prices, volumes, last_price = bars
+        state = self._symbols.get(symbol)
+        if state is None:
+            state = self._symbol(symbol, open_times, prices, volumes, last_price, now_ms)
+        else:
+            start = 0 if state.watermark is None else int(
+                np.searchsorted(open_times, state.watermark, side="right"))
+            for open_time, price, volume in zip(open_times[start:].tolist(), prices[start:].tolist(),
+                                                volumes[start:].tolist()):
+                self._apply(state, open_time, price, volume)
+            if len(open_times):
+                state.watermark = float(open_times[-1])
+        for window in state.rolling.values():
+            window.expire(now_ms)
+        if self._session_start(now_ms) > state.session.anchor_ms:
+            state.session = BandWindow("session", self._session_start(now_ms), state.bucket_size)
+        self._prune_pending(state)
+        if last_price is not None:
+            state.last_price = last_price
+        return state
+
+    def _symbol(self, symbol, open_times, prices, volumes, last_price, now_ms) -> SymbolBands:
+        state = self._symbols[symbol] = SymbolBands(symbol, profile_bucket_size(last_price))
+        for name, length in self.windows.items():
+            window = state.rolling[name] = BandWindow(name, now_ms - length, state.bucket_size, length)
+            start = int(np.searchsorted(open_times, now_ms - length, side="left"))
+            window.seed(open_times[start:], prices[start:], volumes[start:])
+        session_start = self._session_start(now_ms)
+        state.session = BandWindow("session", session_start, state.bucket_size)
+        start = int(np.searchsorted(open_times, session_start, side="left"))
+        state.session.seed(open_times[start:], prices[start:], volumes[start:])
+        state.watermark = float(open_times[-1]) if len(open_times) else None
+        return state
+
+    def _apply(self, state: SymbolBands, open_time: float, price: float, volume: float):
+        """One closed bar: O(1) per window and anchor."""
+        for window in state.rolling.values():
+            window.add(open_time, price, volume)
+        session_start = self._session_start(open_time)
+        if session_start > state.session.anchor_ms:
+            state.session = BandWindow("session", session_start, state.bucket_size)
+        state.session.add(open_time, price, volume)
+        for anchor in state.anchors.values():
+            if open_time >= anchor.anchor_ms:
+                anchor.add(open_time, price, volume)
+
+    def _prune_pending(self, state: SymbolBands, bar: float = None):
+        """Drop pending bars that closed bars replaced, and with a new `bar` those
+        too old to outlive the next sync, so an unqueried symbol does not grow them."""
+        oldest = state.watermark if state.watermark is not None else -math.inf
+        if bar is not None:
+            oldest = max(oldest, bar - self.PENDING_BARS * self._base_ms)
+        for stale in [stale for stale in state.pending if stale <= oldest]:
+            del state.pending[stale]
+
+    def on_trade(self, trade: dict):
+        """WebSocket 'trade' handler: live contribution of the bar that is still forming."""
+        state = self._symbols.get(trade.get("s"))
+        if state is None:
+            return
+        price = float(trade.get("p") or 0)
+        quantity = float(trade.get("q") or 0)
+        if price <= 0 or quantity <= 0:
+            return
+        timestamp = float(trade.get("t") or time.time() * 1000)
+        bar = timestamp // self._base_ms * self._base_ms
+        if state.watermark is not None and bar <= state.watermark:
+            return
+        moments = state.pending.get(bar)
+        if moments is None:
+            self._prune_pending(state, bar)
+            moments = state.pending[bar] = WeightedMoments()
+        moments.add(price, quantity)
+        state.last_price = price
+
+    # --- anchors -------------------------------------------------------
+
+    async def add_anchor(self, symbol: str, key, anchor_ms: float, label: str = None,
+                         now: float = None) -> BandWindow:
+        """
+        Anchor a VWAP at `anchor_ms` (epoch milliseconds) and seed it from history.
+
+        Args:
+            symbol (str): The trading pair symbol (e.g., "BTCUSD").
+            key: Any hashable identifying the anchor, e.g. (chat_id, label).
+            anchor_ms (float): Anchor time; must lie within the stored history.
+            label (str): Display name; defaults to the anchor time.
+
+        Raises:
+            ValueError: If the anchor is in the future or older than the history.
+        """
+        now = now if now is not None else time.time()
+        if anchor_ms > now * 1000:
+            raise ValueError("Anchor time is in the future")
+        bars = await self._bars(symbol, now * 1000)
+        state = self._update(symbol, bars, now * 1000)
+        open_times, prices, volumes, _ = bars
+        oldest = now * 1000 - self.history.capacity * self._base_ms
+        if len(open_times) == 0 or anchor_ms < max(oldest, float(open_times[0])):
+            days = self.history.capacity * self._base_ms / 86_400_000
+            raise ValueError(f"Anchor time must be within the last {days:.0f} days")
+        if label is None:
+            label = time.strftime("%m-%d %H:%M", time.gmtime(anchor_ms / 1000))
+        anchor = BandWindow(label, anchor_ms, state.bucket_size)
+        start = int(np.searchsorted(open_times, anchor_ms, side="left"))
+        end = int(np.searchsorted(open_times, state.watermark, side="right")) if state.watermark is not None else 0
+        anchor.seed(open_times[start:end], prices[start:end], volumes[start:end])
+        state.anchors[key] = anchor
+        return anchor
+
+    def remove_anchor(self, symbol: str, key) -> bool:
+        state = self._symbols.get(symbol)
+        return state is not None and state.anchors.pop(key, None) is not None
+
+    def anchors(self, symbol: str, keys=None) -> dict:
+        """Anchors of a symbol, optionally limited to the keys matching `keys(key)`."""
+        state = self._symbols.get(symbol)
+        if state is None:
+            return {}
+        return {key: anchor for key, anchor in state.anchors.items() if keys is None or keys(key)}
+
+    def count_anchors(self, keys) -> int:
+        """Number of anchors, across all symbols, whose key matches `keys(key)`."""
+        return sum(1 for state in self._symbols.values() for key in state.anchors if keys(key))
+
+    # --- queries -------------------------------------------------------
+
+    def _live(self, state: SymbolBands, window: BandWindow) -> WeightedMoments:
+        """The window's moments with the trades of bars that have not closed yet."""
+        if not state.pending:
+            return window.moments
+        moments = window.moments.copy()
+        for bar, pending in state.pending.items():
+            if bar >= window.anchor_ms:
+                moments.merge(pending)
+        return moments
+
+    def bands(self, symbol: str, keys=None) -> dict:
+        """
+        Return the current bands of a symbol's windows.
+
+        Args:
+            symbol (str): The trading pair symbol; must have been synced.
+            keys: Optional filter for the anchors to include (see anchors()).
+
+        Returns:
+            dict: Maps "24h", "7d", "session" and each anchor label to a dict with
+            "vwap", "std", "volume", "bands" ({k: (low, high)}) and "profile".
+        """
+        state = self._symbols.get(symbol)
+        if state is None:
+            return {}
+        windows = list(state.rolling.values()) + [state.session] + list(self.anchors(symbol, keys).values())
+        result = {}
+        for window in windows:
+            moments = self._live(state, window)
+            if moments.vwap is None:
+                continue
+            std = moments.std
+            result[window.label] = {
+                "vwap": moments.vwap, "std": std, "volume": moments.weight,
+                "bands": {k: (moments.vwap - k * std, moments.vwap + k * std) for k in BAND_SIGMAS},
+                "profile": window.profile,
+            }
+        return result
+
+    def render(self, symbol: str, keys=None, profile_window: str = "24h") -> str:
+        """Band view of a symbol as report text (for a <pre> block)."""
+        state = self._symbols.get(symbol)
+        bands = self.bands(symbol, keys)
+        if state is None or not bands:
+            return f"No band data for {symbol} yet.\n"
+        last = state.last_price
+        lines = [f"VWAP bands for {symbol}", f"{'Last':<10}: {format_price(last):>9}"]
+        for label, band in bands.items():
+            z = (last - band["vwap"]) / band["std"] if last is not None and band["std"] > 0 else 0
+            lines.append(f"{label[:10]:<10}: {format_price(band['vwap']):>9}  σ {format_price(band['std'])}"
+                         f"  last {z:+.1f}σ")
+            for k, (low, high) in band["bands"].items():
+                lines.append(f"{f'±{k}σ':<10}: {format_price(low):>9} - {format_price(high)}")
+
+        profile = bands.get(profile_window, {}).get("profile")
+        rows = profile.rows() if profile is not None else []
+        if rows:
+            peak = max(volume for _, volume in rows) or 1
+            poc = profile.point_of_control()
+            value_low, value_high = profile.value_area()
+            lines.append(f"Volume profile {profile_window}:")
+            row_size = rows[0][0] - rows[1][0] if len(rows) > 1 else profile.bucket_size
+            for low, volume in rows:
+                marker = " POC" if low <= poc < low + row_size else ""
+                lines.append(f"{format_price(low):>9} {'█' * round(volume / peak * 12):<12}{marker}".rstrip())
+            lines.append(f"Value area: {format_price(value_low)} - {format_price(value_high)}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared band engine used by the handlers
+vwap_bands = VwapBandEngine()
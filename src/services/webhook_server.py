@@ -0,0 +1,96 @@
+import hmac
+import logging
+from aiohttp import web
+from telegram import Update
+from utils.json_codec import loads
+from utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_UPDATES = metrics.counter("webhook_updates_total", "Webhook requests by outcome", "outcome")
+STAGE_SECONDS = metrics.histogram("stage_seconds", "Time spent per processing stage", "stage")
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Receives Telegram updates over HTTP and feeds them to the Application.
+
+    Routes are added to an existing aiohttp Application (the MetricsServer
+    app), so updates, /metrics and the /healthz and /readyz probes share one
+    server on the bot's event loop. The server speaks plain HTTP: TLS is
+    terminated by the reverse proxy or load balancer in front of it, which
+    should only forward `path`.
+
+    Each request is parsed in its own aiohttp task and only put on the
+    Application's update queue, so Telegram gets its 200 immediately; the
+    Application dispatches queued updates concurrently (see
+    ApplicationBuilder.concurrent_updates).
+    """
+
+    def __init__(self, application, path: str = "/telegram", secret_token: str = None):
+        """
+        Args:
+            application (telegram.ext.Application): The bot application.
+            path (str): URL path Telegram posts updates to.
+            secret_token (str): Expected X-Telegram-Bot-Api-Secret-Token header;
+                requests without it are rejected. None disables the check.
+        """
+        self.application = application
+        self.path = path
+        self.secret_token = secret_token
+        self.webhook_set = False  # set_webhook succeeded (or is managed elsewhere)
+        self.draining = False  # shutting down: report not ready so the balancer moves away
+        self._checks = {}
+
+    def register(self, app: web.Application):
+        app.router.add_post(self.path, self._update)
+        app.router.add_get("/healthz", self._health)
+        app.router.add_get("/readyz", self._ready)
+
+    def add_check(self, name: str, check):
+        """Add a readiness check: `check()` returns True when this part of the bot is ready."""
+        self._checks[name] = check
+
+    async def _update(self, request: web.Request) -> web.Response:
+        if self.secret_token is not None and not hmac.compare_digest(
+                request.headers.get(SECRET_HEADER, ""), self.secret_token):
+            WEBHOOK_UPDATES.inc("forbidden")
+            return web.Response(status=403)
+        if not self.application.running:
+            WEBHOOK_UPDATES.inc("unavailable")
+            return web.Response(status=503)  # Telegram retries later
+        with STAGE_SECONDS.time("webhook_parse"):
+            try:
+                update = Update.de_json(loads(await request.read()), self.application.bot)
+            except Exception as e:
+                WEBHOOK_UPDATES.inc("invalid")
+                logger.warning(f"Rejected malformed webhook update: {e}")
+                return web.Response(status=400)
+        if update is None:
+            WEBHOOK_UPDATES.inc("invalid")
+            return web.Response(status=400)
+        await self.application.update_queue.put(update)
+        WEBHOOK_UPDATES.inc("accepted")
+        return web.Response()
+
+    async def _health(self, request: web.Request) -> web.Response:
+        """Liveness: the event loop is serving requests."""
+        return web.json_response({"status": "ok", "update_queue": self.application.update_queue.qsize()})
+
+    def readiness(self) -> dict:
+        checks = {"application": self.application.running, "webhook": self.webhook_set,
+                  "accepting": not self.draining}
+        for name, check in self._checks.items():
+            try:
+                checks[name] = bool(check())
+            except Exception as e:
+                logger.error(f"Readiness check {name} failed: {e}")
+                checks[name] = False
+        return checks
+
+    async def _ready(self, request: web.Request) -> web.Response:
+        """Readiness: the instance can take updates from the load balancer."""
+        checks = self.readiness()
+        ready = all(checks.values())
+        return web.json_response({"ready": ready, "checks": checks}, status=200 if ready else 503)
@@ -1,121 +1,230 @@
-import hashlib
-import hmac
+import asyncio
 import json
-import time
-import websocket
 import logging
-import threading
+import random
+import time
+import aiohttp
+from services.bbo_store import BboStore
+from utils.json_codec import loads
+from utils.metrics import metrics
+
+WS_MESSAGES = metrics.counter("ws_messages_total", "WebSocket messages received by topic", "topic")
+WS_LAG = metrics.histogram("ws_lag_seconds", "Receive time minus exchange timestamp by topic", "topic")
+WS_HANDLER_ERRORS = metrics.counter("ws_handler_errors_total", "WebSocket handler failures by topic", "topic")
+WS_RECONNECTS = metrics.counter("ws_reconnects_total", "WebSocket reconnect attempts")
 
 
 class WebSocketClient:
-    def __init__(self):
+    """asyncio-native client for the Hashkey public quote stream.
+
+    Runs on the bot's event loop and multiplexes any number of
+    (topic, symbol) subscriptions (bbo, trade, depth, kline_1m, ...) over one
+    connection. Subscribe frames are sent as one burst on (re)connect, the
+    JSON ping/pong keepalive runs as a task on the same loop, and the
+    connection is re-established with exponential backoff and resubscribed
+    after a drop.
+    """
+
+    STREAM_URL = "wss://stream-pro.hashkey.com/quote/ws/v2"
+    PING_INTERVAL = 5  # seconds between keepalive pings
+    PONG_TIMEOUT = 20  # reconnect if no pong (or any message) within this many seconds
+    RECONNECT_MIN_DELAY = 1
+    RECONNECT_MAX_DELAY = 60
+
+    def __init__(self, subscriptions=(), stream_url: str = None):
         self._logger = logging.getLogger(__name__)
+        self.stream_url = stream_url or self.STREAM_URL
+        self._subscriptions = dict.fromkeys(subscriptions)  # ordered set of (topic, symbol)
+        self._handlers = {"bbo": [self._store_bbo]}
+        self._connect_callbacks = []
+        self._session = None
         self._ws = None
-        self._ping_thread = None
-        self._bbo_data = {}
-
-    def _on_message(self, ws, message):
-        self._logger.info(f"Received message: {message}")
-        data = json.loads(message)
-        if "pong" in data:
-            # Received a pong message from the server
-            self._logger.info("Received pong message")
-        # Handle the received market data here
-        elif data.get("topic") == "bbo" and "data" in data:
-            # Handle the received BBO data here
-            bbo_data = data["data"]
-            symbol = bbo_data.get("s")
-            if symbol:
-                self._bbo_data[symbol] = {
-                    "bid_price": bbo_data.get("b"),
-                    "bid_quantity": bbo_data.get("bz"),
-                    "ask_price": bbo_data.get("a"),
-                    "ask_quantity": bbo_data.get("az"),
-                    "timestamp": bbo_data.get("t"),
-                }
-                self._logger.info(
-                    f"Stored BBO Data for {symbol}: {self._bbo_data[symbol]}")
+        self._running = False
+        self._last_message_at = 0.0
+        self.bbo_store = BboStore()
+        self._debug = self._logger.isEnabledFor(logging.DEBUG)
+
+    # --- subscriptions -------------------------------------------------
+
+    def add_handler(self, topic: str, callback):
+        """Call `callback(data)` with the `data` payload of every `topic` message."""
+        self._handlers.setdefault(topic, []).append(callback)
+
+    def add_connect_handler(self, callback):
+        """Call `callback()` after every (re)connect, e.g. to reset state that missed the gap."""
+        self._connect_callbacks.append(callback)
+
+    @staticmethod
+    def _frame(topic: str, symbol: str, event: str) -> str:
+        return json.dumps({"topic": topic, "event": event, "params": {"symbol": symbol}})
+
+    async def _send_frames(self, frames):
+        if self._ws is None or self._ws.closed:
+            return
+        # Frames are serialized up front and written back to back in one burst
+        for frame in frames:
+            await self._ws.send_str(frame)
+
+    def add_subscriptions(self, topic: str, symbols) -> list:
+        """Register subscriptions to be sent on the next (re)connect."""
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        new = [(topic, symbol) for symbol in symbols if (topic, symbol) not in self._subscriptions]
+        self._subscriptions.update(dict.fromkeys(new))
+        return new
+
+    async def subscribe(self, topic: str, symbols):
+        """Subscribe to a topic for one or more symbols; kept across reconnects."""
+        new = self.add_subscriptions(topic, symbols)
+        await self._send_frames([self._frame(topic, symbol, "sub") for topic, symbol in new])
+
+    async def unsubscribe(self, topic: str = None, symbols=None):
+        """Unsubscribe from a topic (all topics if None) for some or all symbols."""
+        if isinstance(symbols, str):
+            symbols = [symbols]
+        removed = [(t, s) for t, s in self._subscriptions
+                   if (topic is None or t == topic) and (symbols is None or s in symbols)]
+        for key in removed:
+            del self._subscriptions[key]
+        if removed:
+            self._logger.info(f"Unsubscribe topics: {removed}")
+        await self._send_frames([self._frame(t, s, "cancel") for t, s in removed])
+
+    def get_subscriptions(self) -> list:
+        return list(self._subscriptions)
+
+    # --- message handling ----------------------------------------------
+
+    def _store_bbo(self, bbo_data: dict):
+        symbol = bbo_data.get("s")
+        if symbol:
+            self.bbo_store.update(symbol, bbo_data.get("b"), bbo_data.get("bz"), bbo_data.get("a"),
+                                  bbo_data.get("az"), bbo_data.get("t"))
+
+    def _on_message(self, message: str):
+        # Hot path: decode once, dispatch on topic, and only pay for log
+        # formatting when debug logging is actually enabled.
+        data = loads(message)
+        if self._debug:
+            self._logger.debug("Received message: %s", message, extra={"topic": "ws_raw"})
+        topic = data.get("topic")
+        WS_MESSAGES.inc(topic)
+        handlers = self._handlers.get(topic)
+        if handlers is None:
+            if "pong" in data:
+                # Received a pong message from the server
+                self._logger.debug("Received pong message")
+            return
+        payload = data.get("data")
+        if payload is None:
+            return
+        # Trade updates carry the symbol on the frame rather than on each item
+        symbol = data.get("symbol")
+        received_ms = time.time() * 1000
+        # Some topics deliver a list of updates in one frame
+        for item in payload if type(payload) is list else (payload,):
+            if symbol is not None and "s" not in item:
+                item["s"] = symbol
+            exchange_ms = item.get("t")
+            if exchange_ms:
+                WS_LAG.observe((received_ms - float(exchange_ms)) / 1000, topic)
+            for callback in handlers:
+                try:
+                    callback(item)
+                except Exception as e:
+                    WS_HANDLER_ERRORS.inc(topic)
+                    self._logger.error(f"Handler for topic {topic} failed: {e}")
 
     def get_bbo_data(self, symbol=None):
-        """Retrieve the latest BBO data for a specific symbol or all symbols."""
+        """Retrieve the latest BBO data for a specific symbol or all symbols.
+
+        Returns plain dicts built from consistent BboStore snapshots, so callers
+        on any thread get their own copy rather than live client state.
+        """
         if symbol:
-            return self._bbo_data.get(symbol)
-        return self._bbo_data
-
-    def _on_error(self, ws, error):
-        self._logger.error(f"WebSocket error: {error}")
-
-    def _on_close(self, ws):
-        self._logger.info("Connection closed")
-
-    def _on_open(self, ws):
-        self._logger.info("Subscribe topic")
-        sub = {
-            "topic": "bbo",
-            "event": "sub",
-            "params": {
-                "symbol": "ETHUSDT"
-            }
-        }
-        ws.send(json.dumps(sub))
-
-        # Start the ping thread after connecting
-        self._start_ping_thread()
-
-    def _start_ping_thread(self):
-        def send_ping():
-            while self._ws:
-                ping_message = {
-                    # Send a timestamp as the ping message
-                    "ping": int(time.time() * 1000)
-                }
-                self._ws.send(json.dumps(ping_message))
-                self._logger.info(f"Send ping message: {ping_message}")
-                time.sleep(5)
-
-        self._ping_thread = threading.Thread(target=send_ping)
-        self._ping_thread.daemon = True
-        self._ping_thread.start()
-
-    def unsubscribe(self):
-        if self._ws:
-            self._logger.info("Unsubscribe topic")
-            unsub = {
-                "topic": "bbo",
-                "event": "sub",
-                "params": {
-                    "symbol": "ETHUSDT"
-                }
-            }
-            self._ws.send(json.dumps(unsub))
+            quote = self.bbo_store.get(symbol)
+            return quote.as_dict() if quote else None
+        return {s: quote.as_dict() for s, quote in self.bbo_store.snapshot().items()}
 
-    def connect(self):
-        try:
-            base_url = 'wss://stream-pro.hashkey.com'
-            endpoint = 'quote/ws/v2'
-            stream_url = f"{base_url}/{endpoint}"
-            self._logger.info(stream_url)
-            self._logger.info(f"Connecting to {stream_url}")
-
-            self._ws = websocket.WebSocketApp(stream_url,
-                                            on_message=self._on_message,
-                                            on_error=self._on_error,
-                                            on_close=self._on_close)
-            self._ws.on_open = self._on_open
-            self._logger.info("WebSocket connection running...")
-            self._ws.run_forever()
-        except Exception as e:
-            self._logger.error(f"WebSocket connection failed: {e}")
+    # --- connection lifecycle ------------------------------------------
 
-    def disconnect(self):
+    async def _keepalive(self, ws):
+        while not ws.closed:
+            ping_message = {
+                # Send a timestamp as the ping message
+                "ping": int(time.time() * 1000)
+            }
+            await ws.send_str(json.dumps(ping_message))
+            self._logger.debug(f"Send ping message: {ping_message}")
+            await asyncio.sleep(self.PING_INTERVAL)
+            if time.monotonic() - self._last_message_at > self.PONG_TIMEOUT:
+                self._logger.warning("No pong received in time; reconnecting.")
+                await ws.close()
+
+    async def _run_connection(self):
+        self._logger.info(f"Connecting to {self.stream_url}")
+        async with self._session.ws_connect(self.stream_url) as ws:
+            self._ws = ws
+            self._last_message_at = time.monotonic()
+            self._debug = self._logger.isEnabledFor(logging.DEBUG)
+            self._logger.info("WebSocket connection running...")
+            await self._send_frames([self._frame(t, s, "sub") for t, s in self._subscriptions])
+            for callback in self._connect_callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    self._logger.error(f"Connect handler failed: {e}")
+            keepalive = asyncio.create_task(self._keepalive(ws), name="ws_keepalive")
+            try:
+                async for msg in ws:
+                    self._last_message_at = time.monotonic()
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        self._on_message(msg.data)
+                    elif msg.type == aiohttp.WSMsgType.ERROR:
+                        self._logger.error(f"WebSocket error: {ws.exception()}")
+                        break
+            finally:
+                keepalive.cancel()
+                self._ws = None
+                self._logger.info("Connection closed")
+
+    async def connect(self):
+        """Run the connection until disconnect(), reconnecting with backoff."""
+        self._running = True
+        delay = self.RECONNECT_MIN_DELAY
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        try:
+            while self._running:
+                connected_at = time.monotonic()
+                try:
+                    await self._run_connection()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._logger.error(f"WebSocket connection failed: {e}")
+                if not self._running:
+                    break
+                if time.monotonic() - connected_at > self.RECONNECT_MAX_DELAY:
+                    # The last connection was healthy for a while: start over
+                    delay = self.RECONNECT_MIN_DELAY
+                WS_RECONNECTS.inc()
+                sleep_for = delay * (0.5 + random.random() / 2)  # jitter
+                self._logger.info(f"Reconnecting in {sleep_for:.1f}s")
+                await asyncio.sleep(sleep_for)
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+        finally:
+            await self._close_session()
+
+    async def _close_session(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def disconnect(self):
         """Gracefully disconnect the WebSocket connection."""
-        if self._ws:
+        self._running = False
+        if self._ws is not None and not self._ws.closed:
             self._logger.info("Closing WebSocket connection...")
-            self._ws.close()  # Close the WebSocket connection
-            self._ws = None
-
-# if __name__ == '__main__':
-#     logging.basicConfig(level=logging.INFO)
-
-#     client = WebSocketClient()
-#     client.connect()
+            await self._ws.close()  # Close the WebSocket connection
+        self._ws = None
+        await self._close_session()
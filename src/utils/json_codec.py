@@ -0,0 +1,15 @@
+import json
+
+# orjson is an optional dependency: it decodes several times faster than the
+# standard library and is used automatically when installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    loads = orjson.loads
+    BACKEND = "orjson"
+else:
+    loads = json.loads
+    BACKEND = "json"
@@ -1,4 +1,50 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+
+class RateLimitFilter(logging.Filter):
+    """Sample and rate-limit log records per topic.
+
+    Records logged with ``extra={"topic": ...}`` keep one in every
+    `sample_every` records and then pass through a per-topic token bucket of
+    `rate` records per second (bursts up to `burst`). Dropped records are
+    counted and reported on the next record of that topic that gets through.
+    Records without a topic are never filtered.
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 20, sample_every: int = 1):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.sample_every = max(1, sample_every)
+        self._buckets = {}  # topic -> [tokens, last_refill, seen, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        topic = getattr(record, "topic", None)
+        if topic is None:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(topic)
+            if bucket is None:
+                bucket = self._buckets[topic] = [float(self.burst), now, 0, 0]
+            bucket[2] += 1
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[2] % self.sample_every or bucket[0] < 1:
+                bucket[3] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[3] = bucket[3], 0
+        if suppressed and isinstance(record.msg, str):
+            record.msg = f"{record.msg} [{suppressed} similar {topic} records suppressed]"
+        return True
+
 
 logger = logging.getLogger("bot_logger")
 logger.setLevel(logging.DEBUG)
@@ -12,6 +58,29 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 file_handler.setFormatter(formatter)
 stream_handler.setFormatter(formatter)
 
+# Callers only merge the message arguments (QueueHandler.prepare) and
+# enqueue the record; a background listener thread applies the formatter
+# and does the file/stderr I/O, so logging never blocks the event loop.
+log_queue = queue.SimpleQueue()
+queue_handler = logging.handlers.QueueHandler(log_queue)
+queue_handler.addFilter(RateLimitFilter())
+queue_listener = logging.handlers.QueueListener(
+    log_queue, file_handler, stream_handler, respect_handler_level=True)
+
+# Modules under services/ log through logging.getLogger(__name__); route them
+# through the same queue (and topic rate limit) at INFO, so per-message DEBUG
+# records such as the WebSocket "ws_raw" topic stay off unless enabled.
+services_logger = logging.getLogger("services")
+services_logger.setLevel(logging.INFO)
+
 if not logger.hasHandlers():
-    logger.addHandler(file_handler)
-    logger.addHandler(stream_handler)
\ No newline at end of file
+    logger.addHandler(queue_handler)
+    services_logger.addHandler(queue_handler)
+    queue_listener.start()
+    atexit.register(queue_listener.stop)
+
+
+def configure_levels(levels: dict):
+    """Set logger levels from config, e.g. {"services.websocket_service": "DEBUG"}."""
+    for name, level in (levels or {}).items():
+        logging.getLogger(name).setLevel(level.upper() if isinstance(level, str) else level)
@@ -0,0 +1,193 @@
+import time
+from bisect import bisect_left
+
+# Upper bounds (seconds) for latency histograms
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(label: str, value) -> str:
+    return f'{{{label}="{value}"}}' if label and value is not None else ""
+
+
+class Counter:
+    """Monotonic count, optionally split by one label."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, label: str = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+
+    def inc(self, label_value=None, amount: float = 1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value=None) -> float:
+        return self._values.get(label_value, 0)
+
+    def samples(self):
+        for label_value, value in self._values.items():
+            yield self.name + _labels(self.label, label_value), value
+
+    def summary(self) -> dict:
+        return {label_value: value for label_value, value in self._values.items()}
+
+
+class Gauge:
+    """Current value, either set explicitly or read from `fn()` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, label: str = None, fn=None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.fn = fn
+        self._values = {}
+
+    def set(self, value: float, label_value=None):
+        self._values[label_value] = value
+
+    def _current(self) -> dict:
+        if self.fn is None:
+            return self._values
+        value = self.fn()
+        return value if isinstance(value, dict) else {None: value}
+
+    def samples(self):
+        for label_value, value in self._current().items():
+            yield self.name + _labels(self.label, label_value), value
+
+    def summary(self) -> dict:
+        return dict(self._current())
+
+
+class Histogram:
+    """Fixed-bucket histogram, optionally split by one label.
+
+    observe() is a bisect plus three additions, cheap enough for every
+    message on the hot path.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, label: str = None, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # label value -> [bucket counts..., +Inf count], sum, count
+
+    def observe(self, value: float, label_value=None):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, label_value=None) -> "Timer":
+        return Timer(self, label_value)
+
+    def quantile(self, q: float, label_value=None) -> float:
+        """Estimate a quantile as the upper bound of the bucket containing it."""
+        series = self._series.get(label_value)
+        if series is None or series[2] == 0:
+            return None
+        rank = q * series[2]
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), series[0]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        for label_value, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = f'{self.label}="{label_value}",' if self.label and label_value is not None else ""
+                yield f'{self.name}_bucket{{{labels}le="{le}"}}', cumulative
+            yield self.name + "_sum" + _labels(self.label, label_value), total
+            yield self.name + "_count" + _labels(self.label, label_value), count
+
+    def summary(self) -> dict:
+        return {label_value: {"count": series[2],
+                              "mean": series[1] / series[2] if series[2] else None,
+                              "p50": self.quantile(0.5, label_value),
+                              "p99": self.quantile(0.99, label_value)}
+                for label_value, series in self._series.items()}
+
+
+class Timer:
+    """Context manager recording elapsed seconds into a Histogram (works around awaits)."""
+
+    __slots__ = ("histogram", "label_value", "started")
+
+    def __init__(self, histogram: Histogram, label_value=None):
+        self.histogram = histogram
+        self.label_value = label_value
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, self.label_value)
+        return False
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text exposition format."""
+
+    def __init__(self, prefix: str = "vwapbot_"):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        name = self.prefix + name
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name: str, help: str, label: str = None) -> Counter:
+        return self._register(Counter, name, help, label)
+
+    def gauge(self, name: str, help: str, label: str = None, fn=None) -> Gauge:
+        gauge = self._register(Gauge, name, help, label)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name: str, help: str, label: str = None, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help, label, buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(f"{name} {value}" for name, value in metric.samples())
+            except Exception:
+                # A gauge callback failing must not break the whole scrape
+                continue
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        """{metric name without prefix: summary} for human-readable reports."""
+        result = {}
+        for name, metric in self._metrics.items():
+            try:
+                result[name[len(self.prefix):]] = metric.summary()
+            except Exception:
+                continue
+        return result
+
+
+# Shared registry used by every instrumented module
+metrics = MetricsRegistry()
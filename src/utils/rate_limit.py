@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Token bucket rate limiter for asyncio code.
+
+    Tokens refill continuously at `rate` per second up to `capacity`.
+    `acquire()` waits until enough tokens are available; `pause()` empties the
+    bucket for a while, e.g. when the remote side asks us to back off.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens: float = 1, now: float = None) -> float:
+        """Take `tokens` if available. Returns 0 on success, else seconds to wait."""
+        now = now if now is not None else time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1):
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Refuse all tokens for `seconds` and restart from an empty bucket."""
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = self._paused_until
+
+    def idle(self, now: float = None) -> bool:
+        """True when the bucket is full again, i.e. it holds no rate state."""
+        now = now if now is not None else time.monotonic()
+        if now < self._paused_until:
+            return False
+        self._refill(now)
+        return self._tokens >= self.capacity
@@ -0,0 +1,112 @@
+import math
+
+import pytest
+
+from services.alert_engine import ABOVE, BELOW, CROSS_VWAP, OPERATORS, AlertEngine
+
+
+class Notifications:
+    def __init__(self):
+        self.sent = []
+
+    def __call__(self, chat_id, key, text):
+        self.sent.append((chat_id, key, text))
+
+
+@pytest.fixture
+def notify():
+    return Notifications()
+
+
+@pytest.fixture
+def engine(notify):
+    vwaps = {"BTCUSD": 100.0}
+    return AlertEngine(bbo_store=None, notify=notify, vwap_provider=vwaps.get, hysteresis_bps=10)
+
+
+def test_operators_are_inclusive_thresholds():
+    assert OPERATORS == {">": ABOVE, "above": ABOVE, "<": BELOW, "below": BELOW}
+
+
+def test_above_fires_once_at_the_threshold(engine, notify):
+    alert = engine.add(1, "BTCUSD", ABOVE, 100.0)
+    engine.on_price("BTCUSD", 99.99)
+    assert notify.sent == []
+    engine.on_price("BTCUSD", 100.0)
+    assert [(chat_id, key) for chat_id, key, _ in notify.sent] == [(1, ("alert", alert.alert_id))]
+    engine.on_price("BTCUSD", 101.0)
+    assert len(notify.sent) == 1
+    assert engine.count(1) == 0
+    assert not engine.has_alerts("BTCUSD")
+
+
+def test_below_fires_once_at_the_threshold(engine, notify):
+    engine.add(1, "BTCUSD", BELOW, 100.0)
+    engine.on_price("BTCUSD", 100.01)
+    assert notify.sent == []
+    engine.on_price("BTCUSD", 100.0)
+    assert len(notify.sent) == 1
+
+
+def test_a_move_fires_every_crossed_threshold_and_no_other(engine, notify):
+    for chat_id, price in enumerate((101.0, 102.0, 103.0, 110.0)):
+        engine.add(chat_id, "BTCUSD", ABOVE, price)
+    engine.add(9, "BTCUSD", BELOW, 90.0)
+    engine.on_price("BTCUSD", 103.0)
+    assert sorted(chat_id for chat_id, _, _ in notify.sent) == [0, 1, 2]
+    assert engine.count(3) == 1 and engine.count(9) == 1
+
+
+def test_matches_a_linear_scan(notify):
+    engine = AlertEngine(bbo_store=None, notify=notify)
+    thresholds = [(chat_id, ABOVE if chat_id % 2 else BELOW, 90.0 + chat_id * 0.5) for chat_id in range(40)]
+    for chat_id, kind, price in thresholds:
+        engine.add(chat_id, "BTCUSD", kind, price)
+    waiting = set(thresholds)
+    for price in (100.0, 104.0, 96.0, 108.0, 91.0, 112.0):
+        expected = {alert for alert in waiting
+                    if (alert[1] == ABOVE and price >= alert[2]) or (alert[1] == BELOW and price <= alert[2])}
+        notify.sent.clear()
+        engine.on_price("BTCUSD", price)
+        assert sorted(chat_id for chat_id, _, _ in notify.sent) == sorted(chat_id for chat_id, _, _ in expected)
+        waiting -= expected
+
+
+def test_identical_alerts_are_deduplicated(engine):
+    first = engine.add(1, "BTCUSD", ABOVE, 100.0)
+    assert engine.add(1, "BTCUSD", ABOVE, 100.0) is first
+    assert engine.count(1) == 1
+
+
+@pytest.mark.parametrize("price", [None, 0, -5.0, math.nan, math.inf])
+def test_rejects_invalid_thresholds(engine, price):
+    with pytest.raises(ValueError):
+        engine.add(1, "BTCUSD", ABOVE, price)
+
+
+def test_remove_and_remove_chat(engine, notify):
+    first = engine.add(1, "BTCUSD", ABOVE, 100.0)
+    engine.add(1, "BTCUSD", BELOW, 90.0)
+    engine.add(1, "BTCUSD", CROSS_VWAP)
+    assert engine.remove(1, first.alert_id)
+    assert not engine.remove(1, first.alert_id)
+    assert engine.remove_chat(1) == 2
+    assert not engine.has_alerts("BTCUSD")
+    engine.on_price("BTCUSD", 50.0)
+    engine.on_price("BTCUSD", 150.0)
+    assert notify.sent == []
+
+
+def test_vwap_cross_uses_hysteresis(engine, notify):
+    engine.add(1, "BTCUSD", CROSS_VWAP)
+    engine.add(2, "BTCUSD", CROSS_VWAP)
+    engine.on_price("BTCUSD", 101.0)  # first side seen: no cross yet
+    engine.on_price("BTCUSD", 99.95)  # within 10 bps of the VWAP
+    assert notify.sent == []
+    engine.on_price("BTCUSD", 99.0)
+    assert sorted(chat_id for chat_id, _, _ in notify.sent) == [1, 2]
+    engine.on_price("BTCUSD", 98.0)
+    assert len(notify.sent) == 2
+    engine.on_price("BTCUSD", 101.0)
+    assert len(notify.sent) == 4
+    assert engine.has_alerts("BTCUSD")
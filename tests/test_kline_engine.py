@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from services.kline_engine import STAT_FIELDS, summarize, summarize_many
+from services.kline_series import INTERVAL_MS, KlineSeries
+from services.resampler import resample
+
+
+def random_series(bars: int, interval: str = "3m", seed: int = 0, start_ms: int = 1_700_000_100_000) -> KlineSeries:
+    rng = np.random.default_rng(seed)
+    step = INTERVAL_MS[interval]
+    start_ms = start_ms // step * step
+    closes = 100 + np.cumsum(rng.normal(0, 1, bars))
+    opens = np.r_[100, closes[:-1]]
+    highs = np.maximum(opens, closes) + rng.uniform(0, 1, bars)
+    lows = np.minimum(opens, closes) - rng.uniform(0, 1, bars)
+    volumes = rng.uniform(0, 10, bars)
+    volumes[::7] = 0  # idle bars
+    open_times = start_ms + np.arange(bars) * step
+    return KlineSeries("BTCUSD", interval, open_times, opens, highs, lows, closes, volumes)
+
+
+def naive_resample(series: KlineSeries, interval: str) -> list:
+    """One (open_time, open, high, low, close, volume) tuple per target bucket."""
+    target_ms = INTERVAL_MS[interval]
+    buckets = {}
+    for row in series.to_matrix().tolist():
+        buckets.setdefault(row[0] // target_ms * target_ms, []).append(row)
+    return [(open_time, rows[0][1], max(r[2] for r in rows), min(r[3] for r in rows), rows[-1][4],
+             sum(r[5] for r in rows))
+            for open_time, rows in sorted(buckets.items())]
+
+
+def naive_summary(series: KlineSeries, bars: int = None) -> dict:
+    rows = series.to_matrix().tolist()
+    if bars is not None:
+        rows = rows[-bars:] if bars else []
+    if not rows:
+        return {field: 0.0 for field in STAT_FIELDS}
+    _, opens, highs, lows, closes, volumes = zip(*rows)
+    volume = sum(volumes)
+    high, low = max(highs), min(lows)
+    typical = [(h + lo + c) / 3 for h, lo, c in zip(highs, lows, closes)]
+    return {
+        "bars": len(rows),
+        "vwap": sum(c * v for c, v in zip(closes, volumes)) / volume if volume else 0.0,
+        "twap": sum(closes) / len(rows),
+        "typical_vwap": sum(t * v for t, v in zip(typical, volumes)) / volume if volume else 0.0,
+        "high": high,
+        "low": low,
+        "range": high - low,
+        "range_pct": (high - low) / low * 100 if low > 0 else 0.0,
+        "volume": volume,
+        "mean_volume": volume / len(rows),
+        "max_volume": max(volumes),
+        "first_open": opens[0],
+        "last_close": closes[-1],
+    }
+
+
+def assert_summary(actual: dict, expected: dict):
+    assert actual["bars"] == expected["bars"]
+    for field in STAT_FIELDS:
+        assert actual[field] == pytest.approx(expected[field], rel=1e-9, abs=1e-9), field
+
+
+@pytest.mark.parametrize("interval", ["15m", "1h", "4h", "1d"])
+def test_resample_matches_naive_grouping(interval):
+    series = random_series(2_000)
+    resampled = resample(series, interval)
+    assert resampled.interval == interval
+    np.testing.assert_allclose(resampled.to_matrix(), np.array(naive_resample(series, interval)))
+
+
+def test_resample_handles_gaps_and_empty_series():
+    series = random_series(200)
+    gappy = KlineSeries.from_matrix("BTCUSD", "3m", np.delete(series.to_matrix(), np.s_[30:90], axis=0))
+    np.testing.assert_allclose(resample(gappy, "1h").to_matrix(), np.array(naive_resample(gappy, "1h")))
+    assert len(resample(KlineSeries("BTCUSD", "3m"), "1h")) == 0
+
+
+def test_summarize_many_matches_naive_reference():
+    series = {seed: random_series(50 + seed * 37, seed=seed) for seed in range(5)}
+    windows = {}
+    for seed, s in series.items():
+        windows[(seed, "all")] = (s, None)
+        windows[(seed, "tail")] = (s, 20)
+        windows[(seed, "longer")] = (s, 10_000)
+    results = summarize_many(windows)
+    assert set(results) == set(windows)
+    for key, (s, bars) in windows.items():
+        assert_summary(results[key], naive_summary(s, bars))
+
+
+def test_summarize_matches_summarize_many_for_one_series():
+    series = random_series(300, interval="1h")
+    assert summarize(series, 24) == summarize_many({"x": (series, 24)})["x"]
+
+
+def test_summarize_empty_and_volumeless_windows():
+    empty = KlineSeries("BTCUSD", "3m")
+    assert_summary(summarize(empty), naive_summary(empty))
+    series = random_series(10)
+    series.volumes[:] = 0
+    stats = summarize(series)
+    assert stats["vwap"] == 0 and stats["typical_vwap"] == 0
+    assert stats["twap"] == pytest.approx(series.closes.mean())
+    assert summarize_many({}) == {}
@@ -0,0 +1,124 @@
+import asyncio
+
+import aiohttp
+import pytest
+from yarl import URL
+
+from services.request_scheduler import CircuitBreaker, CircuitOpenError, RequestScheduler
+
+ENDPOINT = "/quote/v1/klines"
+REQUEST_INFO = aiohttp.RequestInfo(URL("https://api.test" + ENDPOINT), "GET", {})
+
+
+def http_error(status: int) -> aiohttp.ClientResponseError:
+    return aiohttp.ClientResponseError(request_info=REQUEST_INFO, history=(), status=status)
+
+
+class Endpoint:
+    """Fails with the given errors in turn, then answers "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def scheduler(**kwargs) -> RequestScheduler:
+    options = {"rate": 1000, "burst": 1000, "base_delay": 0.001, "max_delay": 0.002}
+    options.update(kwargs)
+    return RequestScheduler(**options)
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, cooldown=10)
+    assert not breaker.failure(0)
+    assert not breaker.failure(0)
+    assert breaker.failure(0)
+    assert not breaker.allow(5)
+
+
+def test_breaker_half_open_trial_closes_or_reopens():
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.failure(0)
+    assert breaker.allow(10)  # the trial
+    assert not breaker.allow(10)  # only one trial at a time
+    assert breaker.failure(10)  # a failed trial reopens at once
+    assert not breaker.allow(15)
+    assert breaker.allow(20)
+    breaker.success()
+    assert breaker.opened_at is None
+    assert breaker.allow(20) and breaker.allow(20)
+
+
+def test_abandoned_trial_lets_the_next_request_through():
+    breaker = CircuitBreaker(threshold=1, cooldown=10)
+    breaker.failure(0)
+    assert breaker.allow(10)
+    breaker.abandon()
+    assert breaker.allow(10)
+
+
+def test_retries_transient_errors():
+    endpoint = Endpoint(http_error(503), http_error(429), asyncio.TimeoutError())
+    assert asyncio.run(scheduler(max_retries=3).run(ENDPOINT, endpoint)) == "ok"
+    assert endpoint.calls == 4
+
+
+def test_gives_up_after_max_retries():
+    endpoint = Endpoint(*(http_error(502) for _ in range(3)))
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(scheduler(max_retries=1).run(ENDPOINT, endpoint))
+    assert endpoint.calls == 2
+
+
+def test_client_errors_are_not_retried():
+    endpoint = Endpoint(http_error(400))
+    rest = scheduler()
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(rest.run(ENDPOINT, endpoint))
+    assert endpoint.calls == 1
+    assert rest._breaker(ENDPOINT).failures == 0
+
+
+def test_breaker_short_circuits_then_recovers():
+    rest = scheduler(max_retries=5, breaker_threshold=2, breaker_cooldown=0.05)
+    failing = Endpoint(http_error(500), http_error(500), http_error(500))
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(rest.run(ENDPOINT, failing))
+    assert failing.calls == 2  # tripped on the second failure instead of retrying on
+
+    idle = Endpoint()
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(rest.run(ENDPOINT, idle))
+    assert idle.calls == 0
+
+    async def after_cooldown():
+        await asyncio.sleep(0.06)
+        return await rest.run(ENDPOINT, idle)
+
+    assert asyncio.run(after_cooldown()) == "ok"
+    assert rest._breaker(ENDPOINT).opened_at is None
+
+
+def test_cancelled_trial_does_not_keep_the_breaker_open():
+    rest = scheduler(breaker_threshold=1, breaker_cooldown=0)
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(rest.run(ENDPOINT, Endpoint(http_error(500))))
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        task = asyncio.ensure_future(rest.run(ENDPOINT, hang))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return await rest.run(ENDPOINT, Endpoint())
+
+    assert asyncio.run(scenario()) == "ok"
@@ -0,0 +1,97 @@
+import asyncio
+import os
+
+import pytest
+
+from services.subscription_store import SubscriptionStore
+
+
+def reload(store: SubscriptionStore) -> SubscriptionStore:
+    fresh = SubscriptionStore(store.data_dir)
+    fresh.load()
+    return fresh
+
+
+def test_flush_appends_one_group_commit(tmp_path):
+    store = SubscriptionStore(str(tmp_path))
+    store.subscribe(1, {"symbols": ["BTCUSD"]})
+    store.subscribe(2)
+    store.update_prefs(2, quiet_hours=[22, 7])
+    store.unsubscribe(1)
+    assert store.buffered() == 4
+    asyncio.run(store.flush())
+    assert store.buffered() == 0
+    with open(os.path.join(tmp_path, store.JOURNAL_FILE)) as f:
+        assert len(f.readlines()) == 4
+    fresh = reload(store)
+    assert fresh.chats() == [2]
+    assert fresh.get_prefs(2) == {"quiet_hours": [22, 7]}
+
+
+def test_failed_flush_keeps_changes_buffered(tmp_path, monkeypatch):
+    store = SubscriptionStore(str(tmp_path))
+    store.subscribe(1)
+
+    def fail(lines):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(store, "_write_lines", fail)
+    with pytest.raises(OSError):
+        asyncio.run(store.flush())
+    assert store.buffered() == 1
+    monkeypatch.undo()
+    asyncio.run(store.flush())
+    assert reload(store).chats() == [1]
+
+
+def test_compact_folds_the_journal_into_a_snapshot(tmp_path):
+    store = SubscriptionStore(str(tmp_path), compact_every=3)
+    for chat_id in range(5):
+        store.subscribe(chat_id)
+    store.unsubscribe(0)
+    asyncio.run(store.flush())
+    assert os.path.getsize(os.path.join(tmp_path, store.JOURNAL_FILE)) == 0
+    assert os.path.exists(os.path.join(tmp_path, store.SNAPSHOT_FILE))
+    store.subscribe(9)
+    asyncio.run(store.flush())
+    assert sorted(reload(store).chats()) == [1, 2, 3, 4, 9]
+
+
+def test_load_drops_a_torn_last_line(tmp_path):
+    store = SubscriptionStore(str(tmp_path))
+    store.subscribe(1)
+    store.flush_now()
+    with open(os.path.join(tmp_path, store.JOURNAL_FILE), "a") as f:
+        f.write('{"op":"sub","chat":2')
+    fresh = reload(store)
+    assert fresh.chats() == [1]
+    fresh.subscribe(3)
+    fresh.flush_now()
+    assert reload(store).chats() == [1, 3]
+
+
+def test_stop_writes_everything_buffered(tmp_path):
+    async def scenario():
+        store = SubscriptionStore(str(tmp_path), flush_interval=60, compact_every=2)
+        store.start()
+        await asyncio.sleep(0)
+        for chat_id in range(3):
+            store.subscribe(chat_id)
+        await store.stop()
+        return store
+
+    store = asyncio.run(scenario())
+    assert store.buffered() == 0
+    assert store._task is None
+    assert reload(store).chats() == [0, 1, 2]
+
+
+def test_stop_right_after_start(tmp_path):
+    async def scenario():
+        store = SubscriptionStore(str(tmp_path), flush_interval=60)
+        store.start()
+        store.subscribe(1)
+        await asyncio.wait_for(store.stop(), timeout=5)
+        return store
+
+    assert reload(asyncio.run(scenario())).chats() == [1]